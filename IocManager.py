@@ -4,10 +4,10 @@ import os.path
 import argparse
 import configparser
 
-from imutils.IMConfig import get_manager_path, IOC_CONFIG_FILE, IOC_BACKUP_DIR
+from imutils.IMConfig import get_manager_path, IOC_CONFIG_FILE, IOC_BACKUP_DIR, EXPORT_VERSIONS_KEEP
 from imutils.IMFunc import operation_log, condition_parse
 from imutils.IMUtil import create_ioc, set_ioc, get_filtered_ioc, remove_ioc, execute_ioc, rename_ioc, update_ioc, \
-    execute_swarm, execute_service, edit_ioc, execute_config
+    execute_swarm, execute_service, edit_ioc, execute_config, show_operation_log
 
 if __name__ == '__main__':
     # argparse
@@ -15,7 +15,7 @@ if __name__ == '__main__':
                                      formatter_class=argparse.RawTextHelpFormatter)
 
     subparsers = parser.add_subparsers(
-        help='For subparser command help, run "IocManager [create|set|exec|list|swarm|service|remove] -h".')
+        help='For subparser command help, run "IocManager [create|set|exec|list|swarm|service|remove|log] -h".')
 
     #
     parser_create = subparsers.add_parser('create', help='Create IOC projects by given settings.',
@@ -78,19 +78,35 @@ if __name__ == '__main__':
                                 help='add source files from given path and update settings automatically.'
                                      '\ndefault: "src" directory in the project')
     parser_execute.add_argument('--gen-startup-file', action="store_true",
-                                help='generate startup files for IOC project.')
+                                help='generate startup files for IOC project.'
+                                     '\nskipped if files it reads are not changed since last generating, '
+                                     'set "--force-generate" to generate anyway.')
     parser_execute.add_argument('--export-for-mount', action="store_true",
                                 help='export generated startup files into running dir.'
                                      '\nset "--force-overwrite" to enable overwrite when project files in running dir '
                                      'conflicts with those in repository.')
+    parser_execute.add_argument('--rollback-export', action="store_true",
+                                help='switch running dir back to the previously exported version, '
+                                     'without regenerating anything.'
+                                     f'\nthe last {EXPORT_VERSIONS_KEEP} exported versions are kept.')
     parser_execute.add_argument('--force-overwrite', action="store_true",
                                 help='force overwrite when file conflicts or already exists.')
+    parser_execute.add_argument('--force-generate', action="store_true",
+                                help='generate startup files even if they are up to date.')
     parser_execute.add_argument('--generate-and-export', action="store_true",
                                 help='generate startup files and then export them into running dir.'
                                      '\nset "--force-overwrite" to enable exporting overwrite when IOC in running dir '
                                      'conflicts with the one in repository.')
     parser_execute.add_argument('--gen-swarm-file', action="store_true",
                                 help='generate docker service compose file of IOC projects for swarm deploying.')
+    parser_execute.add_argument('--shard-by', type=str, default='',
+                                help='also generate sharded stack files each with multiple IOC services '
+                                     'when generating swarm files for "alliocs".'
+                                     '\n"image": group IOC projects by image.'
+                                     '\n"label=KEY": group IOC projects by value of label KEY in DEPLOY section.'
+                                     '\n"size": group IOC projects only by shard size.')
+    parser_execute.add_argument('--shard-size', type=int, default=None,
+                                help='max number of IOC projects in one sharded stack file. default: 50.')
     parser_execute.add_argument('--deploy', action="store_true",
                                 help='generate and export startup files, then generate swarm file for deploying.'
                                      '\nset "--force-overwrite" to enable exporting overwrite when IOC in running dir '
@@ -110,15 +126,88 @@ if __name__ == '__main__':
                                      '(files generated by autosave, etc.).'
                                      '\n"src": back up only config file and source files.'
                                      '\ndefault: "src" ')
+    parser_execute.add_argument('--backup-include', metavar="PATTERN", type=str, nargs='+', default=None,
+                                help='back up only files matching any of given shell-style patterns in "src" and '
+                                     '"project" of IOC projects.'
+                                     '\npatterns with "/" match path relative to IOC project, such as '
+                                     '"project/log/*", others match file name.')
+    parser_execute.add_argument('--backup-exclude', metavar="PATTERN", type=str, nargs='+', default=None,
+                                help='do not back up files and directories matching any of given shell-style '
+                                     'patterns in "src" and "project" of IOC projects.'
+                                     '\nfor example "*.sav?*" to skip history files of autosave.')
+    parser_execute.add_argument('--incremental', action="store_true",
+                                help='generate incremental backup, only files changed since the last incremental '
+                                     'backup are stored.'
+                                     '\nfiles are kept once in object store of backup directory however many '
+                                     'backups refer to them,'
+                                     '\neach backup is a manifest file "<time>.ioc.manifest.json".')
+    parser_execute.add_argument('--backup-keep', type=int, default=None,
+                                help='number of newest incremental backups to keep, older ones and files no longer '
+                                     'referred to are pruned after backing up. default: keep all.')
+    parser_execute.add_argument('--compression', type=str, choices=['gzip', 'zstd'], default='gzip',
+                                help='compression format of full backup file.'
+                                     '\n"gzip": "<time>.ioc.tar.gz" compressed by multiple threads, readable by '
+                                     'standard gzip and tar.'
+                                     '\n"zstd": "<time>.ioc.tar.zst", needs python package "zstandard".'
+                                     '\ndefault: "gzip" ')
+    parser_execute.add_argument('--compress-workers', type=int, default=None,
+                                help='number of threads for compressing backup file. default: number of CPUs.')
     parser_execute.add_argument('-r', '--restore-backup-file', metavar="BACKUP_FILE", type=str,
-                                help='restore IOC projects from tgz backup file into repository.'
+                                help='restore IOC projects from tgz backup file or manifest file of incremental '
+                                     'backup into repository.'
+                                     '\nset a backup directory to restore the latest backup in it, '
+                                     'set "--at" to choose a point in time.'
                                      '\nset "--force-overwrite" to enable overwrite when IOC in backup file '
                                      'conflicts with the one in repository.')
+    parser_execute.add_argument('--at', metavar="TIME", type=str, default=None,
+                                help='restore the latest backup made at or before given time, such as "20240102", '
+                                     '"2024-01-02 10:30", used when a backup directory given to "-r".')
+    parser_execute.add_argument('--only', metavar="IOC", type=str, nargs='+', default=None,
+                                help='restore only given IOC projects from backup file, used with "-r".')
+    parser_execute.add_argument('--list-backups', action="store_true",
+                                help='list backups in backup directory set by "--backup-path" by their catalog files, '
+                                     'backups are not decompressed.'
+                                     '\ncatalog of a backup made without one is built the first time it is listed.'
+                                     '\nset "--ioc" to list backups containing given IOC project.'
+                                     '\nset "--file" to list versions of files in backups.')
+    parser_execute.add_argument('--ioc', metavar="IOC", type=str, default=None,
+                                help='name of IOC project, used with "--list-backups".')
+    parser_execute.add_argument('--file', metavar="PATTERN", type=str, default=None,
+                                help='shell-style pattern of files to list versions in backups, used with '
+                                     '"--list-backups".'
+                                     '\npatterns with "/" match path relative to IOC project, such as "src/*.db", '
+                                     'others match file name.')
     parser_execute.add_argument('--restore-snapshot-file', metavar="SNAPSHOT_FILE", type=str, nargs='+',
                                 help='restore IOC project files from snapshot.'
                                      '\nset "--force-overwrite" to enable overwrite when file in snapshot'
                                      'conflicts with the one in repository.')
-    parser_execute.add_argument('--run-check', action="store_true", help='do checks for IOC projects.')
+    parser_execute.add_argument('--run-check', action="store_true",
+                                help='do checks for IOC projects in a process pool, all IOC projects if no name given.'
+                                     '\nset "--filter" to check IOC projects matching given query.'
+                                     '\nset "--report" to write a report of snapshot and running file consistency.')
+    parser_execute.add_argument('--report', type=str, choices=['json', 'ndjson'], default=None,
+                                help='format of check report, used with "--run-check".'
+                                     '\n"json": one document for all IOC projects.'
+                                     '\n"ndjson": one line for each IOC project.')
+    parser_execute.add_argument('--report-file', type=str, default=None,
+                                help='path of check report file. default: print report to stdout.')
+    parser_execute.add_argument('--fail-on', type=str, choices=['never', 'snapshot', 'running', 'any'],
+                                default='never',
+                                help='exit with code 1 if any IOC project checked has inconsistent files, '
+                                     'used with "--run-check".'
+                                     '\n"snapshot": files inconsistent with snapshot.'
+                                     '\n"running": running files inconsistent with project.'
+                                     '\n"any": either of them.'
+                                     '\nIOC projects failed to check always fail except for "never". default: "never".')
+    parser_execute.add_argument('--filter', metavar="CONDITION", type=str, nargs='+', default=None,
+                                help='generate IOC projects matching given query in a process pool, '
+                                     'used with "--gen-startup-file", "--generate-and-export" or "--deploy".'
+                                     '\nalso used with "--run-check" to check IOC projects matching given query.'
+                                     '\nquery format is the same as "list" command, such as "host=swarm".'
+                                     '\nset name to "alliocs" to generate all IOC projects in a process pool.')
+    parser_execute.add_argument('--workers', type=int, default=None,
+                                help='number of worker processes for generating or checking IOC projects in batch.'
+                                     '\ndefault: number of CPUs.')
     parser_execute.add_argument('-v', '--verbose', action="store_true", help='show processing details.')
     parser_execute.set_defaults(func='parse_execute')
 
@@ -127,6 +216,10 @@ if __name__ == '__main__':
                                         formatter_class=argparse.RawTextHelpFormatter)
     parser_list.add_argument('condition', type=str, nargs='*',
                              help='conditions to filter IOC projects in specified section. format: "xxx=xxx".'
+                                  '\noperators: "=" exact or wildcard match, "~" regular expression match, '
+                                  '"!=" and "!~" for negation.'
+                                  '\nuse "SECTION.xxx=xxx" to filter in other section, "STATE.xxx=xxx" for state info.'
+                                  '\njoin conditions with "AND", "OR", "NOT" and "(", ")", "AND" is used by default.'
                                   '\nlist all IOC projects if no condition provided.')
     parser_list.add_argument('-s', '--section', type=str, default='IOC',
                              help='specify a section applied for condition filtering. default section: "IOC".')
@@ -134,6 +227,9 @@ if __name__ == '__main__':
                              help='filter IOC projects by given conditions from given IOC list.')
     parser_list.add_argument('-i', '--show-info', action="store_true", help='show details of IOC settings.')
     parser_list.add_argument('-p', '--show-panel', action="store_true", help='show panel of IOC information.')
+    parser_list.add_argument('--rebuild-index', action="store_true",
+                             help='discard repository index and parse all IOC projects again.'
+                                  '\nuse it for recovery when listed information is not up to date.')
     parser_list.add_argument('-v', '--verbose', action="store_true", help='show processing details.')
     parser_list.set_defaults(func='parse_list')
 
@@ -145,7 +241,10 @@ if __name__ == '__main__':
     parser_swarm.add_argument('--deploy-global-services', action="store_true",
                               help='deploy all global services into running.')
     parser_swarm.add_argument('--deploy-all-iocs', action="store_true",
-                              help='deploy all IOC projects that are available but not deployed into running.')
+                              help='deploy all IOC projects that are available but not deployed into running.'
+                                   '\nset "--sharded" to deploy by sharded stack files, one deploying for each.')
+    parser_swarm.add_argument('--sharded', action="store_true",
+                              help='deploy IOC projects by sharded stack files generated by "exec --shard-by".')
     parser_swarm.add_argument('--remove-global-services', action="store_true",
                               help='remove all deployed global services.')
     parser_swarm.add_argument('--remove-all-iocs', action="store_true",
@@ -166,13 +265,19 @@ if __name__ == '__main__':
                               help='list all managed swarm services.')
     parser_swarm.add_argument('-b', '--backup-swarm', action="store_true",
                               help='generate backup file of current swarm.'
-                                   '\ndocker daemon of current manager will be paused for backup operation.')
+                                   '\ndocker daemon of current manager will be stopped only while swarm state is '
+                                   'copied, and the copy is compressed after docker started again.')
     parser_swarm.add_argument('-r', '--restore-swarm', action="store_true",
                               help='restore swarm backup file into current machine.'
+                                   '\nbackup file is checked before extracting, and docker is stopped only while '
+                                   'swarm state is switched.'
                                    '\nset "--backup-file" to choose the backup file to restore from.')
     parser_swarm.add_argument('--backup-file', type=str, default='', help='tgz backup file for swarm.')
     parser_swarm.add_argument('--update-deployed-services', action="store_true",
                               help='update all services deployed in swarm to force load balance.')
+    parser_swarm.add_argument('--workers', type=int, default=None,
+                              help='number of services deployed or removed at once. default: 8.'
+                                   '\nused by "--deploy-*" and "--remove-*" options.')
     parser_swarm.add_argument('-v', '--verbose', action="store_true", help='show processing details.')
     parser_swarm.set_defaults(func='parse_swarm')
 
@@ -233,13 +338,31 @@ if __name__ == '__main__':
     parser_config.add_argument('-v', '--verbose', action="store_true", help='show processing details.')
     parser_config.set_defaults(func='parse_config')
 
+    #
+    parser_log = subparsers.add_parser('log', help='Show operation log of IocManager.',
+                                       formatter_class=argparse.RawTextHelpFormatter)
+    parser_log.add_argument('--since', metavar="TIME", type=str, default=None,
+                            help='show operations started at or after given time, such as "20240102", '
+                                 '"2024-01-02 10:30".')
+    parser_log.add_argument('--until', metavar="TIME", type=str, default=None,
+                            help='show operations started at or before given time, the end of given day or minute '
+                                 'is used if time is not complete.')
+    parser_log.add_argument('--ioc', metavar="IOC", type=str, default=None,
+                            help='show operations touching given IOC project.')
+    parser_log.add_argument('--user', type=str, default=None, help='show operations of given user.')
+    parser_log.add_argument('--last', metavar="N", type=int, default=None, help='show only the last N operations.')
+    parser_log.add_argument('--json', action="store_true", help='print entries as JSON lines.')
+    parser_log.add_argument('-v', '--verbose', action="store_true", help='show processing details.')
+    parser_log.set_defaults(func='parse_log')
+
     args = parser.parse_args()
     if not any(vars(args).values()):
         parser.print_help()
         exit()
 
-    # log current operation.
-    operation_log()
+    # log current operation, reading operation log is not logged.
+    operation = operation_log(args) if args.func != 'parse_log' else None
+    exit_code = 0
 
     # print(f'{args}')
     if args.verbose:
@@ -303,14 +426,14 @@ if __name__ == '__main__':
     if args.func == 'parse_list':
         # ./iocManager.py list
         get_filtered_ioc(args.condition, section=args.section, from_list=args.list_from, show_info=args.show_info,
-                         show_panel=args.show_panel, verbose=args.verbose)
+                         show_panel=args.show_panel, rebuild_index=args.rebuild_index, verbose=args.verbose)
     if args.func == 'parse_remove':
         # ./iocManager.py remove
         for item in args.name:
             remove_ioc(item, remove_all=args.remove_all, force_removal=args.force, verbose=args.verbose)
     if args.func == 'parse_execute':
         # ./iocManager.py exec
-        execute_ioc(args)
+        exit_code = execute_ioc(args)
     if args.func == 'parse_rename':
         # ./iocManager.py rename
         rename_ioc(args.name[0], args.name[1], args.verbose)
@@ -329,5 +452,12 @@ if __name__ == '__main__':
     if args.func == 'parse_config':
         # ./iocManager.py config
         execute_config(args)
+    if args.func == 'parse_log':
+        # ./iocManager.py log
+        show_operation_log(args)
     if args.verbose:
-        print()
\ No newline at end of file
+        print()
+    if operation:
+        operation.finish(exit_code)
+    if exit_code:
+        exit(exit_code)
\ No newline at end of file
@@ -15,24 +15,26 @@ _mycommand_completion() {
 	option_set_last=""
 	
 	# 
-	sub_command_opts="create set exec list swarm service remove rename edit config"
+	sub_command_opts="create set exec list swarm service remove rename edit config log"
 	
 	#
 	create_prompt="--options --section --ini-file --caputlog --status-ioc --status-os --autosave --add-asyn --add-stream --add-raw"
 	#
 	exec_prompt="" # general prompt for all exec commands.
-	exec_ioc_prompt="--generate-and-export --gen-startup-file --export-for-mount --add-src-file --restore-snapshot-file --gen-swarm-file --deploy" # exec commands for specified IOC projects.
+	exec_ioc_prompt="--generate-and-export --gen-startup-file --export-for-mount --rollback-export --add-src-file --restore-snapshot-file --gen-swarm-file --deploy" # exec commands for specified IOC projects.
 	#
-	list_prompt="--section --list-from --show-info --show-panel"
+	list_prompt="--section --list-from --show-info --show-panel --rebuild-index"
 	_condition_type_prompt="name= host= state= status= snapshot= is_exported= "
 	#
 	remove_prompt="--remove-all --force"
 	#
 	rename_prompt=""
 	#
-	swarm_prompt="--gen-built-in-services --deploy-global-services --deploy-all-iocs --remove-global-services --remove-all-iocs --remove-all-services --show-digest --show-services --show-nodes --show-tokens --backup-swarm --restore-swarm --update-deployed-services"
+	swarm_prompt="--gen-built-in-services --deploy-global-services --deploy-all-iocs --remove-global-services --remove-all-iocs --remove-all-services --show-digest --show-services --show-nodes --show-tokens --backup-swarm --restore-swarm --update-deployed-services --workers --sharded"
 	#
 	service_prompt="--deploy --remove --show-config --show-info --show-logs --update"
+	#
+	log_prompt="--since --until --ioc --user --last --json"
 	
 	
 
@@ -68,8 +70,8 @@ _mycommand_completion() {
 			prompt="$ioc_list $prompt"
 			;;
 			"exec") # "exec" may specify an IOC project firstly or specify the commands that are applied to all IOC projects.
-			prompt="--gen-backup-file --restore-backup-file --run-check"
-			prompt="$ioc_list $prompt"
+			prompt="--gen-backup-file --restore-backup-file --list-backups --run-check --filter"
+			prompt="alliocs $ioc_list $prompt"
 			;;
 			"list")
 			compopt -o nospace
@@ -94,6 +96,9 @@ _mycommand_completion() {
 			prompt="" # "edit" should specify an IOC project firstly.
 			prompt="$ioc_list $prompt"
 			;;
+			"log")
+			prompt="$log_prompt"
+			;;
 			*)
 			return 1
 		esac
@@ -189,28 +194,34 @@ _mycommand_completion() {
 				return 0
 				;;
 				"--gen-startup-file")
+				COMPREPLY=( $(compgen -W "--force-generate --filter --workers" -- $2) )
 				return 0
 				;;
 				"--export-for-mount")
 				COMPREPLY=( $(compgen -W "--force-overwrite" -- $2) )
 				return 0
 				;;
-				"--force-overwrite")
+				"--force-overwrite"|"--force-generate")
 				return 0
 				;;
 				"--generate-and-export")
-				COMPREPLY=( $(compgen -W "--force-overwrite" -- $2) )
+				COMPREPLY=( $(compgen -W "--force-overwrite --force-generate --filter --workers" -- $2) )
 				return 0
 				;;
 				"--gen-swarm-file")
+				COMPREPLY=( $(compgen -W "--shard-by --shard-size" -- $2) )
+				return 0
+				;;
+				"--shard-by")
+				COMPREPLY=( $(compgen -W "image size label=" -- $2) )
 				return 0
 				;;
 				"--deploy")
-				COMPREPLY=( $(compgen -W "--force-overwrite" -- $2) )
+				COMPREPLY=( $(compgen -W "--force-overwrite --force-generate --filter --workers" -- $2) )
 				return 0
 				;;
 				"-b"|"--gen-backup-file")
-				COMPREPLY=( $(compgen -W "--backup-path --backup-mode" -- $2) )
+				COMPREPLY=( $(compgen -W "--backup-path --backup-mode --backup-include --backup-exclude --incremental --backup-keep --compression --compress-workers" -- $2) )
 				return 0
 				;;
 				"--backup-path")
@@ -225,6 +236,10 @@ _mycommand_completion() {
 				COMPREPLY=( $(compgen -W "all src" -- $2) )
 				return 0
 				;;
+				"--compression")
+				COMPREPLY=( $(compgen -W "gzip zstd" -- $2) )
+				return 0
+				;;
 				"-r"|"--restore-backup-file")
 				compopt -o nospace
 				file_list=$(compgen -f -- $2) # Variable Type!!!
@@ -237,20 +252,35 @@ _mycommand_completion() {
 				done
 				return 0
 				;;
+				"--ioc")
+				COMPREPLY=( $(compgen -W "$ioc_list" -- $2) )
+				return 0
+				;;
 				"--restore-snapshot-file")
 				COMPREPLY=( $(compgen -W "all ioc.ini" -- $2) )
 				return 0
 				;;
 				"--run-check")
+				COMPREPLY=( $(compgen -W "--filter --workers --report --report-file --fail-on" -- $2) )
+				return 0
+				;;
+				"--report")
+				COMPREPLY=( $(compgen -W "json ndjson" -- $2) )
+				return 0
+				;;
+				"--fail-on")
+				COMPREPLY=( $(compgen -W "never snapshot running any" -- $2) )
 				return 0
 				;;
 				*)
 				;;
 			esac
 			if [ "$option_set_first" == "--gen-backup-file" ]; then 
-				prompt="--backup-path --backup-mode"
+				prompt="--backup-path --backup-mode --backup-include --backup-exclude --incremental --backup-keep --compression --compress-workers"
 			elif [ "$option_set_first" == "--restore-backup-file" ]; then 
-				prompt="--force-overwrite"
+				prompt="--force-overwrite --at --only"
+			elif [ "$option_set_first" == "--list-backups" ]; then 
+				prompt="--backup-path --ioc --file"
 			elif [ "$option_set_first" == "--restore-snapshot-file" ]; then 
 				prompt="--force-overwrite"
 			fi
@@ -315,6 +345,22 @@ _mycommand_completion() {
 				return 0
 			fi
 		fi	
+		# options completion for "log".
+		if [ ${COMP_WORDS[1]} == "log" ]; then 
+			case "$3" in
+				"--ioc")
+				COMPREPLY=( $(compgen -W "${ioc_list}" -- $2) )
+				return 0
+				;;
+				"--since"|"--until"|"--user"|"--last")
+				return 0
+				;;
+				*)
+				;;
+			esac
+			COMPREPLY=( $(compgen -W "${log_prompt}" -- $2) )
+			return 0
+		fi	
 		# options completion for "swarm".
 		if [ ${COMP_WORDS[1]} == "swarm" ]; then 
 			case "$3" in
@@ -0,0 +1,212 @@
+import json
+import asyncio
+from urllib.parse import urlencode, quote
+
+from imutils.IMConfig import DOCKER_SOCKET_PATH, DOCKER_API_VERSION, DOCKER_API_TIMEOUT
+from imutils.IMError import IMDockerError
+
+
+class DockerEngine:
+    def __init__(self, socket_path=None, api_version=None, timeout=None):
+        """
+        Asynchronous client of Docker Engine API over unix socket.
+
+        Each request uses its own connection, so that any number of requests can run at once,
+        for example by run(gather(...)) or run_all().
+
+        :param socket_path: path of docker daemon socket.
+        :param api_version: version prefix of API path, such as "v1.41".
+        :param timeout: seconds to wait for a request, streaming requests are not limited.
+        """
+        self.socket_path = socket_path if socket_path else DOCKER_SOCKET_PATH
+        self.api_version = api_version if api_version else DOCKER_API_VERSION
+        self.timeout = timeout if timeout else DOCKER_API_TIMEOUT
+
+    @staticmethod
+    def run(coro):
+        """
+        Run a coroutine to its end from synchronous code.
+        """
+        return asyncio.run(coro)
+
+    @staticmethod
+    async def gather(*coros):
+        """
+        Await coroutines concurrently and return their results in order, the first exception is raised.
+        """
+        return await asyncio.gather(*coros)
+
+    @staticmethod
+    def run_all(coros, limit=None):
+        """
+        Run coroutines concurrently, at most "limit" at once if given.
+
+        :return: list of results in the order of given coroutines, exception object for failed ones.
+        """
+
+        async def run_limited(coro, semaphore):
+            if semaphore is None:
+                return await coro
+            async with semaphore:
+                return await coro
+
+        async def main():
+            semaphore = asyncio.Semaphore(limit) if limit else None
+            return await asyncio.gather(*[run_limited(coro, semaphore) for coro in coros], return_exceptions=True)
+
+        return asyncio.run(main())
+
+    async def open(self, method, path, params=None, body=None):
+        if params:
+            path = f'{path}?{urlencode(params)}'
+        data = json.dumps(body).encode() if body is not None else b''
+        reader, writer = await asyncio.open_unix_connection(self.socket_path)
+        head = f'{method} /{self.api_version}{path} HTTP/1.1\r\nHost: docker\r\nConnection: close\r\n'
+        if body is not None:
+            head += 'Content-Type: application/json\r\n'
+        head += f'Content-Length: {len(data)}\r\n\r\n'
+        writer.write(head.encode() + data)
+        await writer.drain()
+        status_line = (await reader.readline()).decode('latin-1').split(' ', maxsplit=2)
+        if len(status_line) < 2 or not status_line[1].isdigit():
+            writer.close()
+            raise IMDockerError(f'{method} {path}: Invalid response from docker daemon.')
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            key, _, value = line.decode('latin-1').partition(':')
+            headers[key.strip().lower()] = value.strip()
+        return reader, writer, int(status_line[1]), headers
+
+    @staticmethod
+    async def read_body(reader, headers):
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                size = int((await reader.readline()).split(b';')[0].strip() or b'0', 16)
+                if size == 0:
+                    # skip trailers.
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                yield await reader.readexactly(size)
+                await reader.readline()
+        elif 'content-length' in headers:
+            size = int(headers['content-length'])
+            if size:
+                yield await reader.readexactly(size)
+        else:
+            while True:
+                chunk = await reader.read(65536)
+                if not chunk:
+                    break
+                yield chunk
+
+    async def request(self, method, path, params=None, body=None):
+        """
+        Send a request and return parsed JSON of response, or None if response is empty.
+        Raise IMDockerError if daemon responds with an error status.
+        """
+
+        async def do_request():
+            reader, writer, status, headers = await self.open(method, path, params, body)
+            try:
+                data = b''.join([chunk async for chunk in self.read_body(reader, headers)])
+            finally:
+                writer.close()
+            return status, data
+
+        status, data = await asyncio.wait_for(do_request(), self.timeout)
+        if status >= 400:
+            try:
+                message = json.loads(data).get('message', '')
+            except ValueError:
+                message = data.decode(errors='replace').strip()
+            raise IMDockerError(f'{method} {path}: {status} {message}')
+        return json.loads(data) if data.strip() else None
+
+    async def stream(self, method, path, params=None):
+        """
+        Send a request and yield chunks of response body as they arrive.
+        """
+        reader, writer, status, headers = await asyncio.wait_for(self.open(method, path, params), self.timeout)
+        try:
+            if status >= 400:
+                data = b''.join([chunk async for chunk in self.read_body(reader, headers)])
+                try:
+                    message = json.loads(data).get('message', '')
+                except ValueError:
+                    message = data.decode(errors='replace').strip()
+                raise IMDockerError(f'{method} {path}: {status} {message}')
+            async for chunk in self.read_body(reader, headers):
+                yield chunk
+        finally:
+            writer.close()
+
+    @staticmethod
+    def filters(**kwargs):
+        """
+        Return "filters" parameter of API from keyword arguments such as label="a=b" or service=["x", "y"].
+        """
+        return {'filters': json.dumps({key.replace('_', '-'): value if isinstance(value, list) else [value]
+                                       for key, value in kwargs.items()})}
+
+    async def info(self):
+        return await self.request('GET', '/info')
+
+    async def swarm(self):
+        return await self.request('GET', '/swarm')
+
+    async def services(self, **filters):
+        return await self.request('GET', '/services', self.filters(**filters) if filters else None)
+
+    async def tasks(self, **filters):
+        return await self.request('GET', '/tasks', self.filters(**filters) if filters else None)
+
+    async def nodes(self, **filters):
+        return await self.request('GET', '/nodes', self.filters(**filters) if filters else None)
+
+    async def networks(self, **filters):
+        return await self.request('GET', '/networks', self.filters(**filters) if filters else None)
+
+    async def inspect_service(self, name):
+        return await self.request('GET', f'/services/{quote(name, safe="")}')
+
+    async def remove_service(self, name):
+        return await self.request('DELETE', f'/services/{quote(name, safe="")}')
+
+    async def service_logs(self, name, follow=False, tail='all', details=False):
+        """
+        Yield (stream, line) of service logs, where stream is 1 for stdout and 2 for stderr.
+        """
+        params = {'stdout': 1, 'stderr': 1, 'follow': int(follow), 'tail': tail, 'details': int(details)}
+        buffer = b''
+        multiplexed = None
+        pending = {}
+        async for chunk in self.stream('GET', f'/services/{quote(name, safe="")}/logs', params):
+            buffer += chunk
+            if multiplexed is None and len(buffer) >= 8:
+                # output of services without tty is multiplexed by 8-byte frame headers.
+                multiplexed = buffer[0] in (0, 1, 2) and buffer[1:4] == b'\x00\x00\x00'
+            if multiplexed is None:
+                continue
+            if multiplexed:
+                while len(buffer) >= 8:
+                    size = int.from_bytes(buffer[4:8], 'big')
+                    if len(buffer) < 8 + size:
+                        break
+                    stream_type, payload, buffer = buffer[0], buffer[8:8 + size], buffer[8 + size:]
+                    data = pending.pop(stream_type, b'') + payload
+                    *lines, pending[stream_type] = data.split(b'\n')
+                    for line in lines:
+                        yield stream_type, line.decode(errors='replace')
+            else:
+                *lines, buffer = buffer.split(b'\n')
+                for line in lines:
+                    yield 1, line.decode(errors='replace')
+        if not multiplexed and buffer:
+            yield 1, buffer.decode(errors='replace')
+        for stream_type, data in pending.items():
+            if data:
+                yield stream_type, data.decode(errors='replace')
@@ -0,0 +1,675 @@
+import os
+import re
+import json
+import stat
+import time
+import gzip
+import hashlib
+import configparser
+import zlib
+import shutil
+import fnmatch
+import itertools
+import tarfile
+import contextlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from imutils.IMConfig import (BACKUP_PROGRESS_INTERVAL, BACKUP_STORE_DIR, BACKUP_COMPRESS_WORKERS,
+                              BACKUP_COMPRESS_LEVEL, BACKUP_COMPRESS_BLOCK_SIZE, IOC_CONFIG_FILE)
+from imutils.IMError import IMValueError
+from imutils.IMManifest import ObjectStore, human_size, load_manifest, save_manifest, refresh_entry
+
+BACKUP_ARCHIVE_SUFFIX = '.ioc.tar.gz'
+BACKUP_ZSTD_ARCHIVE_SUFFIX = '.ioc.tar.zst'
+BACKUP_MANIFEST_SUFFIX = '.ioc.manifest.json'
+BACKUP_CATALOG_SUFFIX = '.ioc.catalog.json'
+BACKUP_NAME_PATTERN = re.compile(r'^(\d{14})(\.ioc\..+)$')
+CATALOG_FORMAT_VERSION = 1
+CATALOG_CONFIG_FIELDS = ('host', 'image', 'bin', 'module', 'description')
+
+
+class BackupFilter:
+    def __init__(self, include=None, exclude=None):
+        """
+        Select files to back up by shell-style patterns.
+
+        Patterns are matched against path relative to IOC project dir, such as "project/settings/autosave/a.sav0",
+        patterns without "/" are matched against file name only. Directories matching exclude patterns are skipped
+        with all files in them, include patterns only apply to files.
+
+        :param include: patterns of files to back up, all files if not given.
+        :param exclude: patterns of files and directories not to back up.
+        """
+        self.include = list(include) if include else []
+        self.exclude = list(exclude) if exclude else []
+
+    def __bool__(self):
+        return bool(self.include or self.exclude)
+
+    @staticmethod
+    def match_any(rel_path, patterns):
+        name = os.path.basename(rel_path)
+        return any(fnmatch.fnmatchcase(rel_path if '/' in pattern else name, pattern) for pattern in patterns)
+
+    def accept_dir(self, rel_path):
+        return not self.match_any(rel_path, self.exclude)
+
+    def accept_file(self, rel_path):
+        if self.match_any(rel_path, self.exclude):
+            return False
+        return not self.include or self.match_any(rel_path, self.include)
+
+
+class BackupProgress:
+    def __init__(self, title, interval=None):
+        """
+        Count files and bytes written into a backup and print progress every "interval" seconds.
+
+        :param title: prefix of progress lines, such as "repository_backup".
+        :param interval: seconds between progress lines, default BACKUP_PROGRESS_INTERVAL, 0 for no progress lines.
+        """
+        self.title = title
+        self.interval = interval if interval is not None else BACKUP_PROGRESS_INTERVAL
+        self.files = 0
+        self.bytes = 0
+        self.skipped = 0
+        self.stored_files = None
+        self.stored_bytes = 0
+        self.start = time.perf_counter()
+        self.last = self.start
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def update(self, size=0, skipped=False, stored=None):
+        """
+        :param size: size of file backed up.
+        :param skipped: file filtered out.
+        :param stored: for incremental backups, whether content of file is new and stored.
+        """
+        if skipped:
+            self.skipped += 1
+        else:
+            self.files += 1
+            self.bytes += size
+        if stored is not None:
+            self.stored_files = (self.stored_files or 0) + int(stored)
+            self.stored_bytes += size if stored else 0
+        now = time.perf_counter()
+        if self.interval and now - self.last >= self.interval:
+            self.last = now
+            print(f'{self.title}: {self}.', flush=True)
+
+    def __str__(self):
+        rate = self.bytes / self.elapsed if self.elapsed > 0 else 0
+        res = f'{self.files} files ({human_size(self.bytes)}) in {self.elapsed:.1f}s, {human_size(rate)}/s'
+        if self.stored_files is not None:
+            res += f', {self.stored_files} new files ({human_size(self.stored_bytes)}) stored'
+        if self.skipped:
+            res += f', {self.skipped} filtered out'
+        return res
+
+
+class BackupFileReader:
+    def __init__(self, f, size):
+        """
+        Read exactly "size" bytes of a file opened for backup. A file shrinking while being read, such as a log
+        file rotated, is padded with zeros as GNU tar does, so that archive stays valid.
+        """
+        self.f = f
+        self.remain = size
+        self.shrunk = 0
+        self.hash_obj = hashlib.sha256()
+
+    def read(self, size=-1):
+        size = self.remain if size < 0 else min(size, self.remain)
+        data = self.f.read(size)
+        if len(data) < size:
+            self.shrunk += size - len(data)
+            data += b'\0' * (size - len(data))
+        self.remain -= size
+        self.hash_obj.update(data)
+        return data
+
+    def hexdigest(self):
+        """
+        sha256 hex digest of data read, which is content of file as stored in archive.
+        """
+        return self.hash_obj.hexdigest()
+
+
+def iter_tree(top_path, arcname, backup_filter=None, rel_prefix=''):
+    """
+    Yield (path, arcname, rel_path) of a directory and everything in it in sorted order, a file given is yielded
+    itself. Files and directories rejected by backup_filter are yielded with arcname None.
+
+    :param top_path: path of file or directory to walk.
+    :param arcname: name of top_path in archive.
+    :param backup_filter: BackupFilter object.
+    :param rel_prefix: path of top_path relative to IOC project dir, which is matched by backup_filter.
+    """
+    if not os.path.isdir(top_path) or os.path.islink(top_path):
+        accepted = not backup_filter or backup_filter.accept_file(rel_prefix)
+        yield top_path, arcname if accepted else None, rel_prefix
+        return
+    if backup_filter and rel_prefix and not backup_filter.accept_dir(rel_prefix):
+        yield top_path, None, rel_prefix
+        return
+    yield top_path, arcname, rel_prefix
+    for item in sorted(os.listdir(top_path)):
+        yield from iter_tree(os.path.join(top_path, item), f'{arcname}/{item}', backup_filter,
+                             f'{rel_prefix}/{item}' if rel_prefix else item)
+
+
+def read_text(path):
+    with open(path, 'r', errors='replace') as f:
+        return f.read()
+
+
+def add_to_archive(tar, path, arcname, progress=None, catalog=None):
+    """
+    Add a file, directory or symlink into an open tarfile.TarFile by streaming it from its location.
+    Directories are added without their contents.
+
+    :param catalog: BackupCatalog object to record files added.
+    :return: number of bytes a file shrank while being read, 0 for most cases.
+    """
+    info = tar.gettarinfo(path, arcname)
+    shrunk = 0
+    if info.isreg():
+        with open(path, 'rb') as f:
+            reader = BackupFileReader(f, info.size)
+            tar.addfile(info, reader)
+            shrunk = reader.shrunk
+        if catalog is not None:
+            catalog.add_file(arcname, info.size, reader.hexdigest(), info.mtime, lambda: read_text(path))
+    elif info.isdir() or info.issym() or info.islnk():
+        tar.addfile(info)
+        if catalog is not None:
+            catalog.add_member(arcname)
+    else:
+        # sockets, fifos and devices are not backed up.
+        return 0
+    if progress is not None and info.isreg():
+        progress.update(info.size)
+    return shrunk
+
+
+def compress_block(data, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31 for gzip header and trailer.
+    return compressor.compress(data) + compressor.flush()
+
+
+class ParallelGzipWriter:
+    def __init__(self, f, workers=None, level=None, block_size=None):
+        """
+        Write-only file object which compresses data into gzip format on several threads.
+
+        Data is cut into blocks compressed independently as members of a multi-member gzip stream, which is
+        read as one stream by gzip, tar and tarfile. zlib releases GIL while compressing, so that blocks are
+        compressed in parallel, and at most 2 blocks for each thread are kept in memory.
+
+        :param f: file object opened for binary writing, not closed by close().
+        :param workers: number of compressing threads, default BACKUP_COMPRESS_WORKERS.
+        :param level: compression level, default BACKUP_COMPRESS_LEVEL.
+        :param block_size: bytes of each block, default BACKUP_COMPRESS_BLOCK_SIZE.
+        """
+        self.f = f
+        self.workers = workers if workers else BACKUP_COMPRESS_WORKERS
+        self.level = level if level is not None else BACKUP_COMPRESS_LEVEL
+        self.block_size = block_size if block_size else BACKUP_COMPRESS_BLOCK_SIZE
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        self.pending = deque()
+        self.buffer = bytearray()
+        self.blocks = 0
+
+    def write(self, data):
+        self.buffer += data
+        while len(self.buffer) >= self.block_size:
+            self.submit(bytes(self.buffer[:self.block_size]))
+            del self.buffer[:self.block_size]
+        return len(data)
+
+    def submit(self, block):
+        self.pending.append(self.executor.submit(compress_block, block, self.level))
+        self.blocks += 1
+        while len(self.pending) > 2 * self.workers:
+            self.f.write(self.pending.popleft().result())
+
+    def close(self):
+        if self.executor is None:
+            return
+        try:
+            # an empty stream is still written as a valid gzip member.
+            if self.buffer or not self.blocks:
+                self.submit(bytes(self.buffer))
+                self.buffer.clear()
+            while self.pending:
+                self.f.write(self.pending.popleft().result())
+        finally:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+
+def zstd_module():
+    try:
+        import zstandard
+    except ImportError:
+        raise IMValueError('zstd compression needs python package "zstandard", which is not installed')
+    return zstandard
+
+
+@contextlib.contextmanager
+def open_archive_for_reading(file_path):
+    """
+    Open a full backup archive as tarfile.TarFile to be read in one pass, ".ioc.tar.zst" is read by zstandard,
+    others as tgz archive. tgz archives are read by gzip module rather than "r|gz" mode of tarfile,
+    which does not support multi-member gzip stream written by ParallelGzipWriter.
+    """
+    if file_path.endswith(BACKUP_ZSTD_ARCHIVE_SUFFIX):
+        zstandard = zstd_module()
+        with open(file_path, 'rb') as f, zstandard.ZstdDecompressor().stream_reader(f) as reader, \
+                tarfile.open(fileobj=reader, mode='r|') as tar:
+            yield tar
+    else:
+        with gzip.open(file_path, 'rb') as f, tarfile.open(fileobj=f, mode='r|') as tar:
+            yield tar
+
+
+class BackupCatalog:
+    def __init__(self, name):
+        """
+        Catalog of a backup, saved as a sidecar file "<name>.ioc.catalog.json" next to the backup, which lists
+        IOC projects, files with their sizes and hashes and main fields of config files in the backup, so that
+        backups are searched without being decompressed.
+
+        :param name: name of backup, which is time string of backup.
+        """
+        self.name = name
+        self.iocs = {}
+
+    def get_ioc(self, ioc_name):
+        return self.iocs.setdefault(ioc_name, {'config': {}, 'files': {}})
+
+    def add_member(self, arcname):
+        parts = member_path(arcname)
+        if len(parts) >= 2:
+            self.get_ioc(parts[1])
+        return parts
+
+    def add_file(self, arcname, size, file_hash, mtime, read_config=None):
+        """
+        :param arcname: name of file in archive layout, such as "20240102103000/ioc1/src/a.db".
+        :param size: size of file.
+        :param file_hash: sha256 hex digest of file.
+        :param mtime: mtime of file in seconds.
+        :param read_config: function returning content of file, called if the file is config file of IOC project.
+        """
+        parts = self.add_member(arcname)
+        if len(parts) < 3:
+            return
+        ioc = self.get_ioc(parts[1])
+        rel_path = '/'.join(parts[2:])
+        ioc['files'][rel_path] = [size, file_hash, int(mtime)]
+        if rel_path == IOC_CONFIG_FILE and read_config is not None:
+            ioc['config'] = parse_catalog_config(read_config())
+
+    def save(self, file_path):
+        temp_path = f'{file_path}.{os.getpid()}.tmp'
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump({'version': CATALOG_FORMAT_VERSION, 'backup': self.name, 'iocs': self.iocs}, f,
+                          separators=(',', ':'))
+            os.replace(temp_path, file_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+def parse_catalog_config(text):
+    conf = configparser.ConfigParser()
+    try:
+        conf.read_string(text)
+    except configparser.Error:
+        return {}
+    if not conf.has_section('IOC'):
+        return {}
+    return {key: conf.get('IOC', key) for key in CATALOG_CONFIG_FIELDS if conf.has_option('IOC', key)}
+
+
+def backup_name(backup_path):
+    """
+    Return time string of a backup such as "20240102103000", which is the top directory of archive layout.
+    """
+    match = BACKUP_NAME_PATTERN.match(os.path.basename(backup_path))
+    return match.group(1) if match else os.path.basename(backup_path)
+
+
+def catalog_path(backup_path):
+    """
+    Return path of catalog file of a backup archive or manifest of incremental backup.
+    """
+    return os.path.join(os.path.dirname(backup_path), f'{backup_name(backup_path)}{BACKUP_CATALOG_SUFFIX}')
+
+
+def load_catalog(backup_path):
+    """
+    Read catalog of a backup, None if it is lost or unrecognized.
+
+    :return: dict of IOC name to {"config": dict of main fields of config file,
+        "files": dict of path relative to IOC project to [size, hash, mtime]}.
+    """
+    try:
+        with open(catalog_path(backup_path), 'r') as f:
+            data = json.load(f)
+        if data.get('version') != CATALOG_FORMAT_VERSION:
+            return None
+        return data['iocs']
+    except (OSError, ValueError, KeyError, AttributeError):
+        return None
+
+
+def build_catalog(backup_path):
+    """
+    Build and save catalog of a backup made without one by reading the backup in one pass.
+
+    :return: IOC dict of catalog, see load_catalog().
+    """
+    catalog = BackupCatalog(backup_name(backup_path))
+    if backup_path.endswith(BACKUP_MANIFEST_SUFFIX):
+        files = load_manifest(backup_path)
+        if not files:
+            raise IMValueError(f'invalid backup manifest "{backup_path}"')
+        store = get_backup_store(os.path.dirname(backup_path))
+        for key, entry in sorted(files.items()):
+            arcname = f'{catalog.name}/{key}'
+            if entry['type'] == 'file':
+                catalog.add_file(arcname, entry['size'], entry['hash'], entry['mtime_ns'] // 10 ** 9,
+                                 lambda: read_text(store.object_path(entry['hash'])))
+            else:
+                catalog.add_member(arcname)
+    else:
+        with open_archive_for_reading(backup_path) as tar:
+            for member in tar:
+                if not member.isreg():
+                    catalog.add_member(member.name)
+                    continue
+                hash_obj = hashlib.sha256()
+                content = []
+                is_config = member_path(member.name)[2:] == [IOC_CONFIG_FILE]
+                with tar.extractfile(member) as f:
+                    for chunk in iter(lambda: f.read(BACKUP_COMPRESS_BLOCK_SIZE), b''):
+                        hash_obj.update(chunk)
+                        if is_config:
+                            content.append(chunk)
+                catalog.add_file(member.name, member.size, hash_obj.hexdigest(), member.mtime,
+                                 lambda: b''.join(content).decode(errors='replace'))
+    catalog.save(catalog_path(backup_path))
+    return catalog.iocs
+
+
+class ArchiveWriter:
+    def __init__(self, file_path, progress=None, compression='gzip', workers=None):
+        """
+        Write a full backup as a compressed tar archive, which is renamed to file_path when committed.
+
+        :param file_path: path of archive.
+        :param progress: BackupProgress object.
+        :param compression: "gzip" for tgz archive compressed by ParallelGzipWriter, "zstd" for zstd compressed
+            archive if package "zstandard" is installed.
+        :param workers: number of compressing threads, default BACKUP_COMPRESS_WORKERS.
+        """
+        self.file_path = file_path
+        self.temp_path = f'{file_path}.tmp'
+        self.progress = progress
+        self.catalog = BackupCatalog(backup_name(file_path))
+        workers = workers if workers else BACKUP_COMPRESS_WORKERS
+        if compression == 'zstd':
+            compressor_class = zstd_module().ZstdCompressor
+        elif compression != 'gzip':
+            raise IMValueError(f'Unknown compression "{compression}".')
+        self.f = open(self.temp_path, 'wb')
+        if compression == 'zstd':
+            self.compressor = compressor_class(threads=workers).stream_writer(self.f, closefd=False)
+        else:
+            self.compressor = ParallelGzipWriter(self.f, workers=workers)
+        self.tar = tarfile.open(fileobj=self.compressor, mode='w|')
+
+    def add(self, path, arcname):
+        """
+        :return: number of bytes a file shrank while being read, see add_to_archive().
+        """
+        return add_to_archive(self.tar, path, arcname, self.progress, self.catalog)
+
+    def commit(self):
+        self.tar.close()
+        self.compressor.close()
+        self.f.close()
+        os.replace(self.temp_path, self.file_path)
+        self.catalog.save(catalog_path(self.file_path))
+
+    def abort(self):
+        try:
+            self.compressor.close()
+            self.f.close()
+        finally:
+            if os.path.exists(self.temp_path):
+                os.remove(self.temp_path)
+
+
+class StoreWriter:
+    def __init__(self, backup_dir, name, progress=None):
+        """
+        Write an incremental backup into a content-addressed object store shared by all incremental backups
+        in backup_dir, with a manifest "<name>.ioc.manifest.json" listing members of the backup.
+        Only content not yet in the store is written, and files whose size and mtime are not changed since
+        the latest incremental backup are not read at all.
+        """
+        self.manifest_path = os.path.join(backup_dir, f'{name}{BACKUP_MANIFEST_SUFFIX}')
+        self.store = get_backup_store(backup_dir)
+        self.progress = progress
+        latest = [path for time_str, path in list_backups(backup_dir) if path.endswith(BACKUP_MANIFEST_SUFFIX)]
+        self.previous = load_manifest(latest[-1]) if latest else {}
+        self.files = {}
+        self.catalog = BackupCatalog(name)
+
+    def add(self, path, arcname):
+        # members are recorded by path under the top directory of archive layout.
+        key = arcname.partition('/')[2]
+        if not key:
+            return 0
+        mode = os.lstat(path).st_mode
+        if not (stat.S_ISREG(mode) or stat.S_ISDIR(mode) or stat.S_ISLNK(mode)):
+            return 0
+        entry = refresh_entry(path, [self.previous.get(key)])
+        if entry['type'] == 'file':
+            _, stored = self.store.put(path, entry['hash'])
+            if self.progress is not None:
+                self.progress.update(entry['size'], stored=stored)
+            self.catalog.add_file(arcname, entry['size'], entry['hash'], entry['mtime_ns'] // 10 ** 9,
+                                  lambda: read_text(path))
+        else:
+            self.catalog.add_member(arcname)
+        self.files[key] = entry
+        return 0
+
+    def commit(self):
+        save_manifest(self.manifest_path, self.files)
+        self.catalog.save(catalog_path(self.manifest_path))
+
+    def abort(self):
+        # objects stored are kept for the next run, unreferenced ones are removed by prune_backups().
+        pass
+
+
+def get_backup_store(backup_dir):
+    return ObjectStore(os.path.join(backup_dir, BACKUP_STORE_DIR))
+
+
+def list_backups(backup_dir):
+    """
+    Return (time string, path) of backups in backup_dir from the oldest to the newest, full backups and
+    incremental backups are both listed.
+    """
+    res = []
+    if not os.path.isdir(backup_dir):
+        return res
+    for item in os.listdir(backup_dir):
+        match = BACKUP_NAME_PATTERN.match(item)
+        if match and match.group(2) in (BACKUP_ARCHIVE_SUFFIX, BACKUP_ZSTD_ARCHIVE_SUFFIX, BACKUP_MANIFEST_SUFFIX):
+            res.append((match.group(1), os.path.join(backup_dir, item)))
+    return sorted(res)
+
+
+def find_backup(backup_dir, at=None):
+    """
+    Return path of the latest backup in backup_dir made at or before given time, None if not found.
+
+    :param backup_dir: directory of backups.
+    :param at: time such as "20240102", "2024-01-02 10:30" or "20240102103000", the end of given day or minute
+        is used if time is not complete. the latest backup if not given.
+    """
+    backups = list_backups(backup_dir)
+    if at:
+        at = re.sub(r'\D', '', at)
+        at = at + '99991231235959'[len(at):] if len(at) < 14 else at[:14]
+        backups = [item for item in backups if item[0] <= at]
+    return backups[-1][1] if backups else None
+
+
+def restore_store_files(store, files, dest_dir):
+    """
+    Write files recorded in manifest of an incremental backup into dest_dir.
+
+    :param store: ObjectStore of backup directory.
+    :param files: dict of path relative to dest_dir to manifest entry.
+    :param dest_dir: directory to write into.
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    dirs = []
+    for key in sorted(files):
+        entry = files[key]
+        path = os.path.join(dest_dir, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if entry['type'] == 'dir':
+            os.makedirs(path, exist_ok=True)
+            dirs.append((path, entry))
+        elif entry['type'] == 'link':
+            os.symlink(entry['hash'], path)
+        else:
+            shutil.copyfile(store.object_path(entry['hash']), path)
+            os.chmod(path, entry['mode'])
+            os.utime(path, ns=(entry['mtime_ns'], entry['mtime_ns']))
+    # modes of directories are set at last, as read-only directories can not be written into.
+    for path, entry in reversed(dirs):
+        os.chmod(path, entry['mode'])
+        os.utime(path, ns=(entry['mtime_ns'], entry['mtime_ns']))
+
+
+def member_path(name):
+    """
+    Return parts of a member name of backup archive, such as ["20240102103000", "ioc1", "src", "a.db"].
+    Raise IMValueError for names out of archive layout.
+    """
+    parts = [item for item in name.split('/') if item not in ('', '.')]
+    if name.startswith('/') or '..' in parts:
+        raise IMValueError(f'unsafe member "{name}" in backup archive')
+    return parts
+
+
+def extract_archive_members(tar, members, prefix_len, dest_dir):
+    """
+    Extract members read in one pass from a backup archive into dest_dir, with first prefix_len parts of
+    their names removed.
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    extract_kwargs = {'filter': 'tar'} if hasattr(tarfile, 'tar_filter') else {}
+    dirs = []
+    for member in members:
+        parts = member_path(member.name)[prefix_len:]
+        if not parts:
+            continue
+        member.name = '/'.join(parts)
+        if member.islnk():
+            member.linkname = '/'.join(member_path(member.linkname)[prefix_len:])
+        if member.isdir():
+            dirs.append(member)
+        tar.extract(member, dest_dir, set_attrs=not member.isdir(), **extract_kwargs)
+    # modes and mtimes of directories are set at last, as extractall() does.
+    for member in reversed(dirs):
+        path = os.path.join(dest_dir, member.name)
+        os.utime(path, (member.mtime, member.mtime))
+        os.chmod(path, member.mode & 0o7777)
+
+
+@contextlib.contextmanager
+def open_backup_iocs(file_path):
+    """
+    Open a full backup archive or manifest of an incremental backup, and read IOC projects in it in one pass.
+
+    :return: iterator of (backup name, IOC name, extract), where extract(dest_dir) writes files of the IOC project
+        into dest_dir. extract of an IOC project must be called before the next one is read, or not at all.
+    """
+    if file_path.endswith(BACKUP_MANIFEST_SUFFIX):
+        files = load_manifest(file_path)
+        if not files:
+            raise IMValueError(f'invalid backup manifest "{file_path}"')
+        store = get_backup_store(os.path.dirname(file_path))
+        top_name = os.path.basename(file_path)[:-len(BACKUP_MANIFEST_SUFFIX)]
+
+        def iter_store():
+            names = sorted({key.split('/')[0] for key in files})
+            for name in names:
+                def extract(dest_dir, ioc_name=name):
+                    restore_store_files(store, {key[len(ioc_name) + 1:]: entry for key, entry in files.items()
+                                                if key.startswith(f'{ioc_name}/')}, dest_dir)
+
+                yield top_name, name, extract
+
+        yield iter_store()
+    else:
+        with open_archive_for_reading(file_path) as tar:
+            def group_key(member):
+                return tuple((member_path(member.name) + ['', ''])[:2])
+
+            def iter_archive():
+                # files of an IOC project are adjacent in archive, so they are grouped while reading.
+                for (top_name, name), members in itertools.groupby(tar, key=group_key):
+                    if not name:
+                        continue
+
+                    def extract(dest_dir, group=members):
+                        extract_archive_members(tar, group, 2, dest_dir)
+
+                    yield top_name, name, extract
+
+            yield iter_archive()
+
+
+def prune_backups(backup_dir, keep, verbose=False):
+    """
+    Remove incremental backups except the newest "keep" ones, and objects no longer referenced by them.
+    Full backups are not removed.
+
+    :return: number of incremental backups removed.
+    """
+    manifests = [path for time_str, path in list_backups(backup_dir) if path.endswith(BACKUP_MANIFEST_SUFFIX)]
+    removed = manifests[:-keep] if keep > 0 else []
+    referenced = set()
+    for path in manifests[len(removed):]:
+        files = load_manifest(path)
+        if not files:
+            # objects referred by an unreadable manifest can not be told, so nothing is removed.
+            print(f'prune_backups: Failed to read backup manifest "{path}". Pruning skipped.')
+            return 0
+        referenced.update(entry['hash'] for entry in files.values() if entry['type'] == 'file')
+    for path in removed:
+        os.remove(path)
+        if os.path.exists(catalog_path(path)):
+            os.remove(catalog_path(path))
+        if verbose:
+            print(f'prune_backups: Backup "{os.path.basename(path)}" removed.')
+    get_backup_store(backup_dir).prune(referenced, verbose=verbose)
+    return len(removed)
@@ -25,12 +25,19 @@ TEMPLATES_DIR = 'templates'
 TOOLS_DIR = 'imtools'
 SERVICES_DIR = 'imsrvs'
 GLOBAL_SERVICE_FILE_DIR = 'global-services'
+SWARM_SHARD_DIR = 'ioc-shards'  # directory in swarm dir for stack files of multiple IOC projects
 SNAPSHOT_DIR = 'ioc-snapshot'
+SNAPSHOT_OBJECTS_DIR = '.objects'  # directory in snapshot dir for content-addressed snapshot files
 
 IOC_CONFIG_FILE = 'ioc.ini'
 IOC_STATE_INFO_FILE = '.info.ini'
 IOC_SERVICE_FILE = 'compose-swarm.yaml'
-OPERATION_LOG_FILE = 'OperationLog'
+OPERATION_LOG_FILE = 'OperationLog.jsonl'
+OPERATION_LOG_INDEX_FILE = 'OperationLog.index'  # time index of operation log
+OPERATION_LOG_LEGACY_FILE = 'OperationLog'  # tab separated operation log of old versions, migrated once
+REPOSITORY_INDEX_FILE = 'RepositoryIndex'
+SNAPSHOT_MANIFEST_FILE = 'manifest.json'
+PROJECT_MANIFEST_FILE = '.manifest.json'  # manifest of generated files in project dir and exported files in running dir
 
 MANAGER_PATH = os.path.normpath(get_manager_path())
 REPOSITORY_PATH = os.path.join(MANAGER_PATH, REPOSITORY_DIR)
@@ -38,15 +45,38 @@ TOOLS_PATH = os.path.join(MANAGER_PATH, TOOLS_DIR)
 SERVICES_PATH = os.path.join(MANAGER_PATH, SERVICES_DIR)
 GLOBAL_SERVICES_PATH = os.path.join(SERVICES_PATH, GLOBAL_SERVICE_FILE_DIR)
 SNAPSHOT_PATH = os.path.join(MANAGER_PATH, SNAPSHOT_DIR)
+SNAPSHOT_OBJECTS_PATH = os.path.join(SNAPSHOT_PATH, SNAPSHOT_OBJECTS_DIR)
 TEMPLATE_PATH = os.path.join(MANAGER_PATH, TEMPLATES_DIR)
 COMPOSE_TEMPLATE_PATH = os.path.join(TEMPLATE_PATH, 'compose')
 DB_TEMPLATE_PATH = os.path.join(TEMPLATE_PATH, 'db')
 OPERATION_LOG_PATH = os.path.join(TOOLS_PATH, OPERATION_LOG_FILE)
+OPERATION_LOG_INDEX_PATH = os.path.join(TOOLS_PATH, OPERATION_LOG_INDEX_FILE)
+OPERATION_LOG_LEGACY_PATH = os.path.join(TOOLS_PATH, OPERATION_LOG_LEGACY_FILE)
+REPOSITORY_INDEX_PATH = os.path.join(TOOLS_PATH, REPOSITORY_INDEX_FILE)
 
 # others.
 ## ---- ##
 
-OPERATION_LOG_NUM = 3000  # entry numbers of OperationLog
+OPERATION_LOG_MAX_SIZE = 10 * 1024 * 1024  # bytes of operation log before rotated, one rotated file is kept
+OPERATION_LOG_INDEX_BLOCK = 64 * 1024  # bytes of operation log between lines of time index
+OPERATION_LOG_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+REPOSITORY_INDEX_RACY_SECONDS = 2  # files modified within this window are re-parsed rather than trusted from index
+IOC_LOAD_WORKERS = int(os.getenv('IOC_LOAD_WORKERS', 8))  # thread number for loading IOC projects concurrently
+IOC_GENERATE_WORKERS = int(os.getenv('IOC_GENERATE_WORKERS', os.cpu_count() or 4))  # processes for batch generating
+SWARM_OPERATION_WORKERS = int(os.getenv('SWARM_OPERATION_WORKERS', 8))  # services deployed or removed at once
+SWARM_SHARD_SIZE = 50  # max number of IOC services in one sharded stack file
+SWARM_FILE_HASH_PREFIX = '# swarm-file-hash: '  # first line of generated swarm files
+SWARM_FILE_HASH_LABEL = 'swarm-file-hash'  # service label of hash of swarm file
+STARTUP_FILES_VERSION = 1  # part of startup files fingerprint, increase it when generated files change
+EXPORT_VERSIONS_DIR = '.exports'  # directory in running dir of IOC project for exported versions
+EXPORT_CURRENT_LINK = 'current'  # symlink in running dir of IOC project to version currently used
+EXPORT_VERSIONS_KEEP = 5  # number of exported versions kept for rollback
+BACKUP_PROGRESS_INTERVAL = 5  # seconds between progress lines of backing up
+BACKUP_STORE_DIR = '.store'  # object store in backup directory shared by incremental backups
+BACKUP_COMPRESS_WORKERS = int(os.getenv('BACKUP_COMPRESS_WORKERS', os.cpu_count() or 4))  # threads for compressing
+BACKUP_COMPRESS_LEVEL = 6  # gzip level of backup archives, as default of gzip and pigz
+BACKUP_COMPRESS_BLOCK_SIZE = 1024 * 1024  # bytes of data compressed independently by each thread
+RESTORE_STAGING_DIR = '.restoring'  # directory in repository where IOC projects are written before switched in
 
 #######################
 # Management settings #
@@ -84,6 +114,10 @@ LOG_FILE_DIR = 'iocLog'  # directory for running iocLogServer in docker
 
 IOC_BACKUP_DIR = 'ioc-backup'  # backup directory for IOC project files
 SWARM_BACKUP_DIR = 'swarm-backup'  # backup directory for swarm
+SWARM_STATE_PATH = os.getenv('SWARM_STATE_PATH', '/var/lib/docker/swarm')  # swarm state of docker on manager node
+# staging directory for backing up and restoring swarm state, on the same filesystem as swarm state.
+SWARM_STAGING_PATH = os.getenv('SWARM_STAGING_PATH', '/var/lib/.swarm-staging')
+SWARM_STATE_REQUIRED = ('docker-state.json', 'state.json', 'certificates', 'raft')  # checked in swarm backup files
 
 MOUNT_PATH = os.getenv('MOUNT_PATH', os.path.normpath(os.path.join(MANAGER_PATH, '..', MOUNT_DIR)))
 
@@ -93,6 +127,11 @@ MOUNT_PATH = os.getenv('MOUNT_PATH', os.path.normpath(os.path.join(MANAGER_PATH,
 # managed stack name in swarm
 PREFIX_STACK_NAME = 'dals'
 
+# docker engine API, reached over unix socket.
+DOCKER_SOCKET_PATH = os.getenv('DOCKER_SOCKET_PATH', '/var/run/docker.sock')
+DOCKER_API_VERSION = 'v1.41'
+DOCKER_API_TIMEOUT = 30  # seconds
+
 ###########################
 # IOC deployment settings #
 ###########################
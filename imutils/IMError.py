@@ -14,3 +14,9 @@ class IMIOCError(Exception):
     def __init__(self, message):
         self.message = message
         super().__init__(self.message)
+
+
+class IMDockerError(Exception):
+    def __init__(self, message):
+        self.message = message
+        super().__init__(self.message)
@@ -1,13 +1,19 @@
 import os
+import re
 import sys
+import json
+import atexit
+import getpass
 import datetime
 import shutil
 import socket
 import filecmp
-import logging
-from logging.handlers import RotatingFileHandler
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
 
-from imutils.IMConfig import OPERATION_LOG_PATH, OPERATION_LOG_FILE
+from imutils.IMConfig import (OPERATION_LOG_PATH, OPERATION_LOG_INDEX_PATH, OPERATION_LOG_INDEX_BLOCK,
+                              OPERATION_LOG_TIME_FORMAT, OPERATION_LOG_MAX_SIZE, OPERATION_LOG_LEGACY_PATH)
 
 
 def try_makedirs(d, verbose=False):
@@ -116,6 +122,24 @@ def dir_copy(source_folder, destination_folder, verbose=False):
         return True
 
 
+def write_config_file(conf, file_path):
+    """
+    Write a configparser.ConfigParser object to given file atomically, so that readers running in parallel
+    never see a partially written file.
+
+    :param conf: configparser.ConfigParser object.
+    :param file_path: path of config file.
+    """
+    temp_path = f'{file_path}.{os.getpid()}.tmp'
+    try:
+        with open(temp_path, 'w') as f:
+            conf.write(f)
+        os.replace(temp_path, file_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
 def relative_and_absolute_path_to_abs(input_path, default_path=None):
     """
     return an absolute path or a relative path against current work path in normalized format.
@@ -224,40 +248,324 @@ def dir_compare(snapshot_dir, source_dir, print_info=False):
     # compare_res.report_full_closure()
 
 
+class ThreadOutputCapture:
+    """
+    Proxy of sys.stdout that redirects what worker threads print into per-thread buffers,
+    so that output of concurrent tasks can be printed in order afterwards.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def write(self, s):
+        buffer = getattr(self.local, 'buffer', None)
+        if buffer is None:
+            return self.stream.write(s)
+        buffer.append(s)
+        return len(s)
+
+    def flush(self):
+        if getattr(self.local, 'buffer', None) is None:
+            self.stream.flush()
+
+    def __getattr__(self, item):
+        return getattr(self.stream, item)
+
+    def call(self, func, *args, **kwargs):
+        """
+        Call func in current thread with its output captured.
+
+        :return: (result, output, exception), exception is None if func returned normally.
+        """
+        self.local.buffer = []
+        try:
+            res = func(*args, **kwargs)
+        except Exception as e:
+            return None, ''.join(self.local.buffer), e
+        else:
+            return res, ''.join(self.local.buffer), None
+        finally:
+            self.local.buffer = None
+
+
+@contextlib.contextmanager
+def thread_output_capture():
+    original_stdout = sys.stdout
+    capture = ThreadOutputCapture(original_stdout)
+    sys.stdout = capture
+    try:
+        yield capture
+    finally:
+        sys.stdout = original_stdout
+
+
+def concurrent_call(func, items, workers):
+    """
+    Call func for each item in a thread pool, output printed by func is captured separately for each item.
+
+    :param func: function accepting one item as argument.
+    :param items: list of items.
+    :param workers: number of threads, items are processed one by one in current thread if less than 2.
+    :return: generator of (item, result, output, exception) in the order of items.
+    """
+    if workers <= 1 or len(items) <= 1:
+        capture = ThreadOutputCapture(sys.stdout)
+        for item in items:
+            res, output, exception = capture.call(func, item)
+            yield item, res, output, exception
+        return
+    with thread_output_capture() as capture:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(capture.call, func, item) for item in items]
+            try:
+                for item, future in zip(items, futures):
+                    res, output, exception = future.result()
+                    yield item, res, output, exception
+            finally:
+                for future in futures:
+                    future.cancel()
+
+
 #########################################################
-def operation_log():
-    # 生成日志内容
-    log_time = datetime.datetime.now().strftime("%Y.%m.%d %H:%M:%S")
-    log_command = ' '.join(sys.argv)
-    log_user = os.getenv("USER")
-    log_host = socket.gethostname()
-    log_id = f"{log_user}@{log_host}"
-    log_str = '\t'.join([log_time, log_id, log_command]) + '\n'  # 自带换行符
-
-    # 获取日志文件路径
-    file_path = OPERATION_LOG_PATH
-    if not os.path.isfile(file_path):
-        with open(file_path, 'w'):
-            pass
-
-    # 配置日志记录器
-    logger = logging.getLogger('operation_logger')
-
-    # 防止重复添加handler
-    if not logger.handlers:
-        # 设置循环日志处理器
-        handler = RotatingFileHandler(
-            filename=file_path,
-            maxBytes=10 * 1024 * 1024,  # 10MB滚动
-            encoding='utf-8'
-        )
-        # 保持原始日志格式（仅记录纯消息）
-        handler.setFormatter(logging.Formatter('%(message)s'))
-        logger.addHandler(handler)
-        logger.setLevel(logging.INFO)
-
-    # 记录日志
-    logger.info(log_str)
+class OperationLogEntry:
+    def __init__(self, command, subcommand='', iocs=()):
+        """
+        Entry of operation log, appended to log file as one JSON line when the operation finishes.
+
+        :param command: command line of the operation.
+        :param subcommand: subcommand of IocManager, such as "exec".
+        :param iocs: names of IOC projects touched, more can be added by add_iocs().
+        """
+        self.start = datetime.datetime.now()
+        self.command = command
+        self.subcommand = subcommand
+        self.user = os.getenv('USER')
+        if not self.user:
+            # there may be no passwd entry for current user in containers.
+            try:
+                self.user = getpass.getuser()
+            except (KeyError, OSError):
+                self.user = str(os.getuid())
+        self.host = socket.gethostname()
+        self.iocs = []
+        self.add_iocs(iocs)
+        self.finished = False
+
+    def add_iocs(self, names):
+        for name in names:
+            if name and name != 'alliocs' and name not in self.iocs:
+                self.iocs.append(name)
+
+    def finish(self, exit_code=0, outcome=None, error=''):
+        """
+        Append entry to operation log, only the first call takes effect.
+
+        :param exit_code: exit code of the operation.
+        :param outcome: "success", "failed", "interrupted" or "exited", by exit_code if not given.
+        :param error: message of exception raised.
+        """
+        if self.finished:
+            return
+        self.finished = True
+        exit_code = exit_code if exit_code else 0
+        end = datetime.datetime.now()
+        entry = {
+            'start': self.start.strftime(OPERATION_LOG_TIME_FORMAT),
+            'end': end.strftime(OPERATION_LOG_TIME_FORMAT),
+            'duration': round((end - self.start).total_seconds(), 3),
+            'user': self.user,
+            'host': self.host,
+            'subcommand': self.subcommand,
+            'command': self.command,
+            'iocs': self.iocs,
+            'outcome': outcome if outcome else ('success' if not exit_code else 'failed'),
+            'exit_code': exit_code,
+        }
+        if error:
+            entry['error'] = error
+        try:
+            append_operation_log(entry)
+        except OSError as e:
+            print(f'operation_log: Failed to write operation log, {e}.')
+
+    def finish_at_exit(self):
+        # called at exit if the operation did not finish normally, uncaught exception is kept in sys.last_value.
+        exception = getattr(sys, 'last_value', None)
+        if isinstance(exception, KeyboardInterrupt):
+            self.finish(1, outcome='interrupted')
+        elif exception is not None:
+            self.finish(1, outcome='failed', error=f'{type(exception).__name__}: {exception}')
+        else:
+            self.finish(0, outcome='exited')
+
+
+_current_operation = None
+
+
+def operation_log(args=None):
+    """
+    Start logging current operation, which is appended to operation log when it finishes or the program exits.
+
+    :param args: parsed arguments of IocManager, IOC projects named by them to operate on are recorded.
+    :return: OperationLogEntry object.
+    """
+    global _current_operation
+    func = getattr(args, 'func', '')
+    subcommand = {'parse_execute': 'exec'}.get(func, func.replace('parse_', ''))
+    iocs = []
+    if args is not None and subcommand != 'config':
+        # "--ioc" only filters what is shown, such as backups listed, so it is not recorded.
+        for key in ('name', 'only'):
+            value = getattr(args, key, None)
+            iocs.extend([value] if isinstance(value, str) else value or [])
+    _current_operation = OperationLogEntry(' '.join(sys.argv), subcommand, iocs)
+    atexit.register(_current_operation.finish_at_exit)
+    return _current_operation
+
+
+def operation_log_iocs(names):
+    """
+    Record IOC projects touched by current operation, such as the ones selected by query.
+    """
+    if _current_operation is not None:
+        _current_operation.add_iocs(names)
+
+
+def operation_log_files():
+    """
+    Return (log path, time index path) of operation log files from the oldest to the newest.
+    """
+    return [(f'{OPERATION_LOG_PATH}.1', f'{OPERATION_LOG_INDEX_PATH}.1'),
+            (OPERATION_LOG_PATH, OPERATION_LOG_INDEX_PATH)]
+
+
+def append_operation_log(entry):
+    """
+    Append an entry to operation log file as one JSON line. A time index line of "<end time> <offset>" is appended
+    to index file each time log file grows over a block of OPERATION_LOG_INDEX_BLOCK bytes, which means that
+    entries after offset end after the time.
+    Log file is rotated when it grows over OPERATION_LOG_MAX_SIZE bytes, see rotate_operation_log().
+    """
+    migrate_operation_log()
+    data = (json.dumps(entry, ensure_ascii=False) + '\n').encode()
+    # one write() call for each entry in append mode, so that entries of concurrent operations are not mixed up.
+    with open(OPERATION_LOG_PATH, 'ab') as f:
+        f.write(data)
+        end_offset = f.tell()
+        # log file may have been rotated by another operation, then its index is not written into the new one.
+        try:
+            current = os.path.samestat(os.fstat(f.fileno()), os.stat(OPERATION_LOG_PATH))
+        except FileNotFoundError:
+            current = False
+    if not current:
+        return
+    if (end_offset - len(data)) // OPERATION_LOG_INDEX_BLOCK != end_offset // OPERATION_LOG_INDEX_BLOCK:
+        with open(OPERATION_LOG_INDEX_PATH, 'a') as f:
+            f.write(f'{time_bound(entry["end"])} {end_offset}\n')
+    if end_offset > OPERATION_LOG_MAX_SIZE:
+        rotate_operation_log()
+
+
+def rotate_operation_log():
+    """
+    Move operation log and its time index to "<name>.1", replacing the ones rotated before. Each log file keeps
+    its own time index, so that offsets in index stay valid.
+    """
+    os.replace(OPERATION_LOG_PATH, f'{OPERATION_LOG_PATH}.1')
+    if os.path.exists(OPERATION_LOG_INDEX_PATH):
+        os.replace(OPERATION_LOG_INDEX_PATH, f'{OPERATION_LOG_INDEX_PATH}.1')
+    elif os.path.exists(f'{OPERATION_LOG_INDEX_PATH}.1'):
+        os.remove(f'{OPERATION_LOG_INDEX_PATH}.1')
+
+
+def migrate_operation_log():
+    """
+    Convert tab separated operation log written by old versions into entries of operation log, if there is no
+    operation log yet. Old log file is renamed to "<name>.migrated" first, so that it is converted only once.
+    """
+    if os.path.exists(OPERATION_LOG_PATH) or not os.path.isfile(OPERATION_LOG_LEGACY_PATH):
+        return
+    migrated_path = f'{OPERATION_LOG_LEGACY_PATH}.migrated'
+    try:
+        os.rename(OPERATION_LOG_LEGACY_PATH, migrated_path)
+    except FileNotFoundError:
+        return  # converted by another operation.
+    with open(migrated_path, 'r', errors='replace') as f:
+        for line in f:
+            # lines of "<%Y.%m.%d %H:%M:%S>\t<user>@<host>\t<command>".
+            items = line.rstrip('\n').split('\t', maxsplit=2)
+            if len(items) != 3:
+                continue
+            try:
+                start = datetime.datetime.strptime(items[0], '%Y.%m.%d %H:%M:%S').strftime(OPERATION_LOG_TIME_FORMAT)
+            except ValueError:
+                continue
+            user, _, host = items[1].rpartition('@')
+            args = items[2].split()
+            append_operation_log({'start': start, 'end': start, 'duration': 0, 'user': user, 'host': host,
+                                  'subcommand': args[1] if len(args) > 1 else '', 'command': items[2], 'iocs': [],
+                                  'outcome': 'unknown'})
+
+
+def time_bound(time_str, end=False):
+    """
+    Normalize time such as "20240102", "2024-01-02 10:30" or "20240102103000" into 14 digits for comparing.
+
+    :param end: use the end of given day or minute if time is not complete, otherwise the beginning.
+    """
+    digits = re.sub(r'\D', '', time_str)
+    if len(digits) >= 14:
+        return digits[:14]
+    return digits + ('99991231235959' if end else '00000101000000')[len(digits):]
+
+
+def read_operation_log(since=None, until=None, ioc=None, user=None):
+    """
+    Read entries of operation log in the order they were written, filtered by given conditions.
+    Reading starts from the offset found in time index for "since", so that older history is not read.
+
+    :param since: entries started at or after given time, see time_bound().
+    :param until: entries started at or before given time.
+    :param ioc: entries touching given IOC project.
+    :param user: entries of given user.
+    :return: generator of entry dicts.
+    """
+    since = time_bound(since) if since else None
+    until = time_bound(until, end=True) if until else None
+    for log_path, index_path in operation_log_files():
+        yield from read_operation_log_file(log_path, index_path, since, until, ioc, user)
+
+
+def read_operation_log_file(log_path, index_path, since, until, ioc, user):
+    offset = 0
+    if since and os.path.isfile(index_path):
+        with open(index_path, 'r') as f:
+            for line in f:
+                items = line.split()
+                if len(items) != 2:
+                    continue
+                if items[0] >= since:
+                    break
+                offset = int(items[1])
+    if not os.path.isfile(log_path):
+        return
+    with open(log_path, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            # most lines are skipped by a plain search before being parsed.
+            if (ioc and f'"{ioc}"'.encode() not in line) or (user and f'"{user}"'.encode() not in line):
+                continue
+            try:
+                entry = json.loads(line)
+                start = re.sub(r'\D', '', entry['start'])
+            except (ValueError, KeyError, TypeError):
+                continue
+            if since and start < since or until and start > until:
+                continue
+            if ioc and ioc not in entry.get('iocs', []) or user and entry.get('user') != user:
+                continue
+            yield entry
 
 
 if __name__ == '__main__':
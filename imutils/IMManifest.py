@@ -0,0 +1,425 @@
+import os
+import json
+import stat
+import shutil
+import hashlib
+
+HASH_CHUNK_SIZE = 1024 * 1024
+MANIFEST_FORMAT_VERSION = 1
+
+
+def file_hash(file_path):
+    """
+    Return sha256 hex digest of file content.
+    """
+    hash_obj = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            hash_obj.update(chunk)
+    return hash_obj.hexdigest()
+
+
+def file_entry(path, with_hash=False):
+    """
+    Return manifest entry of given path, see build_manifest(). None if path not exists.
+    """
+    try:
+        st = os.lstat(path)
+    except FileNotFoundError:
+        return None
+    entry = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'mode': stat.S_IMODE(st.st_mode), 'hash': None}
+    if stat.S_ISLNK(st.st_mode):
+        entry.update(type='link', hash=os.readlink(path))
+    elif stat.S_ISDIR(st.st_mode):
+        entry.update(type='dir', size=0)
+    else:
+        entry.update(type='file', hash=file_hash(path) if with_hash else None)
+    return entry
+
+
+def build_manifest(dir_path, with_hash=False):
+    """
+    Build manifest of all files and directories under given path.
+
+    :param dir_path: top path to scan.
+    :param with_hash: whether to compute hash of each file, otherwise hash is computed only when it is needed.
+    :return: dict of relative path to {"type", "size", "mtime_ns", "mode", "hash"}, "type" is one of "file",
+        "dir" and "link", "hash" is None if not computed and is target path for links.
+        Empty dict if dir_path not exists.
+    """
+    manifest = {}
+    if not os.path.isdir(dir_path):
+        return manifest
+
+    def scan(path, prefix):
+        with os.scandir(path) as it:
+            for item in it:
+                rel_path = f'{prefix}{item.name}'
+                manifest[rel_path] = file_entry(item.path, with_hash=with_hash)
+                if manifest[rel_path]['type'] == 'dir':
+                    scan(item.path, f'{rel_path}/')
+
+    scan(dir_path, '')
+    return manifest
+
+
+def load_manifest(file_path):
+    """
+    Read manifest saved by save_manifest(), empty dict if it is lost or unrecognized.
+    """
+    try:
+        with open(file_path, 'r') as f:
+            data = json.load(f)
+        if data.get('version') != MANIFEST_FORMAT_VERSION:
+            return {}
+        return data['files']
+    except (OSError, ValueError, KeyError, AttributeError):
+        return {}
+
+
+def save_manifest(file_path, files):
+    """
+    Write manifest atomically.
+
+    :param file_path: path of manifest file.
+    :param files: dict of relative path to manifest entry.
+    """
+    temp_path = f'{file_path}.{os.getpid()}.tmp'
+    try:
+        with open(temp_path, 'w') as f:
+            json.dump({'version': MANIFEST_FORMAT_VERSION, 'files': files}, f, indent=1)
+        os.replace(temp_path, file_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def refresh_entry(path, recorded_entries=()):
+    """
+    Return manifest entry of given path with hash. Hash of a recorded entry is reused if size and mtime
+    of the file are not changed since it was recorded, otherwise the file is hashed. None if path not exists.
+
+    :param path: path of file.
+    :param recorded_entries: entries of the file recorded before, None items are ignored.
+    """
+    entry = file_entry(path)
+    if entry and entry['type'] == 'file':
+        for recorded_entry in recorded_entries:
+            if (recorded_entry and recorded_entry.get('type') == 'file' and recorded_entry.get('hash') and
+                    (recorded_entry['size'], recorded_entry['mtime_ns']) == (entry['size'], entry['mtime_ns'])):
+                entry['hash'] = recorded_entry['hash']
+                break
+        else:
+            entry['hash'] = file_hash(path)
+    return entry
+
+
+def refresh_manifest(dir_path, recorded=(), prefix=''):
+    """
+    Build manifest with hashes of all files under given path, only files whose size or mtime changed since
+    they were recorded are hashed.
+
+    :param dir_path: top path to scan.
+    :param recorded: manifests recorded before, such as ones read by load_manifest().
+    :param prefix: prefix of keys in manifest, such as "startup/".
+    :return: dict of prefixed relative path to manifest entry.
+    """
+    manifest = {}
+    for rel_path, entry in build_manifest(dir_path).items():
+        key = f'{prefix}{rel_path}'
+        if entry['type'] == 'file':
+            entry = refresh_entry(os.path.join(dir_path, rel_path), [item.get(key) for item in recorded])
+        manifest[key] = entry
+    return manifest
+
+
+def compare_manifests(left, right):
+    """
+    Compare two manifests with hashes, such as ones returned by refresh_manifest().
+
+    :return: (changed, left_only, right_only), sorted lists of keys.
+    """
+    changed = sorted(key for key in left if key in right and
+                     (left[key]['type'], left[key]['hash']) != (right[key]['type'], right[key]['hash']))
+    left_only = sorted(key for key in left if key not in right)
+    right_only = sorted(key for key in right if key not in left)
+    return changed, left_only, right_only
+
+
+def entry_hash(path, entry):
+    if entry['hash'] is None:
+        entry['hash'] = file_hash(path)
+    return entry['hash']
+
+
+def same_file(src, src_entry, dest, dest_entry):
+    """
+    Whether a file in source and destination has the same content according to their manifest entries.
+    Files with the same size and mtime are considered the same, otherwise hashes are compared if sizes match.
+    """
+    if not src_entry or not dest_entry:
+        return False
+    if src_entry['type'] != dest_entry['type'] or src_entry['size'] != dest_entry['size']:
+        return False
+    if src_entry['type'] == 'link':
+        return src_entry['hash'] == dest_entry['hash']
+    if src_entry['mtime_ns'] == dest_entry['mtime_ns']:
+        return True
+    return entry_hash(src, src_entry) == entry_hash(dest, dest_entry)
+
+
+class SyncStats:
+    def __init__(self):
+        """
+        Statistics of directory synchronization.
+        """
+        self.files_copied = 0
+        self.bytes_copied = 0
+        self.files_deleted = 0
+        self.files_unchanged = 0
+
+    def __iadd__(self, other):
+        self.files_copied += other.files_copied
+        self.bytes_copied += other.bytes_copied
+        self.files_deleted += other.files_deleted
+        self.files_unchanged += other.files_unchanged
+        return self
+
+    def __str__(self):
+        return (f'{self.files_copied} files ({human_size(self.bytes_copied)}) transferred, '
+                f'{self.files_deleted} deleted, {self.files_unchanged} unchanged')
+
+
+def human_size(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f'{size:.0f}{unit}' if unit == 'B' else f'{size:.1f}{unit}'
+        size /= 1024
+
+
+def sync_file(src, dest, stats=None):
+    """
+    Copy a file with its mode and mtime to dest atomically, so that readers never see a partially written file.
+
+    :param src: source file path.
+    :param dest: destination file path, its directory must exist.
+    :param stats: SyncStats object to update.
+    """
+    temp_path = os.path.join(os.path.dirname(dest), f'.{os.path.basename(dest)}.{os.getpid()}.tmp')
+    try:
+        if os.path.islink(src):
+            os.symlink(os.readlink(src), temp_path)
+        else:
+            shutil.copy2(src, temp_path)
+        if os.path.isdir(dest) and not os.path.islink(dest):
+            shutil.rmtree(dest)
+        os.replace(temp_path, dest)
+    finally:
+        if os.path.lexists(temp_path):
+            os.remove(temp_path)
+    if stats is not None:
+        stats.files_copied += 1
+        stats.bytes_copied += os.lstat(dest).st_size
+
+
+def update_mtime(src, dest, mtime_ns):
+    """
+    Set mtime of dest whose content is the same as src. Dest hard-linked with other files, such as the ones of
+    exported versions made by link_tree(), is replaced by a copy instead, so that the other files keep their mtime.
+    """
+    if os.lstat(dest).st_nlink > 1:
+        sync_file(src, dest)
+    else:
+        os.utime(dest, ns=(mtime_ns, mtime_ns))
+
+
+def update_file(src, dest, stats=None):
+    """
+    Copy a single file to dest by sync_file() only if its content changed, see sync_dir().
+
+    :return: whether the file was copied.
+    """
+    src_entry = file_entry(src)
+    dest_entry = file_entry(dest)
+    if same_file(src, src_entry, dest, dest_entry):
+        if src_entry['type'] == 'file' and src_entry['mtime_ns'] != dest_entry['mtime_ns']:
+            update_mtime(src, dest, src_entry['mtime_ns'])
+        if stats is not None:
+            stats.files_unchanged += 1
+        return False
+    sync_file(src, dest, stats)
+    return True
+
+
+def remove_path(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+
+def sync_dir(src, dest, delete=True, verbose=False):
+    """
+    Synchronize dest directory with src directory by copying only changed files and deleting only stale ones.
+
+    Source and destination are compared by manifests of size, mtime and hash, hashes are only computed
+    for files with the same size but different mtime. Files are replaced one by one atomically,
+    so that readers of dest never see an empty directory or a partially written file.
+
+    :param src: source directory.
+    :param dest: destination directory, created if not exists.
+    :param delete: whether to delete files in dest that are not in src.
+    :param verbose: verbosity.
+    :return: SyncStats object.
+    """
+    stats = SyncStats()
+    src_manifest = build_manifest(src)
+    dest_manifest = build_manifest(dest)
+    os.makedirs(dest, exist_ok=True)
+    created_dirs = []
+    # parents sort before their children, so that directories are created before files in them.
+    for rel_path in sorted(src_manifest.keys()):
+        src_entry = src_manifest[rel_path]
+        dest_entry = dest_manifest.get(rel_path)
+        dest_path = os.path.join(dest, rel_path)
+        if src_entry['type'] == 'dir':
+            if dest_entry is None or dest_entry['type'] != 'dir':
+                if dest_entry is not None:
+                    remove_path(dest_path)
+                os.makedirs(dest_path)
+                created_dirs.append(rel_path)
+            continue
+        if same_file(os.path.join(src, rel_path), src_entry, dest_path, dest_entry):
+            if src_entry['type'] == 'file' and src_entry['mtime_ns'] != dest_entry['mtime_ns']:
+                # content is the same, only update mtime so that hash is not computed next time.
+                update_mtime(os.path.join(src, rel_path), dest_path, src_entry['mtime_ns'])
+            stats.files_unchanged += 1
+            continue
+        sync_file(os.path.join(src, rel_path), dest_path, stats)
+        if verbose:
+            print(f'sync_dir: Copy "{rel_path}" to "{dest}".')
+    # mode of created directories is set at last, in case they are not writable.
+    for rel_path in reversed(created_dirs):
+        shutil.copymode(os.path.join(src, rel_path), os.path.join(dest, rel_path))
+    if delete:
+        # children sort after their parents, remove them first.
+        for rel_path in sorted(dest_manifest.keys(), reverse=True):
+            if rel_path in src_manifest:
+                continue
+            dest_path = os.path.join(dest, rel_path)
+            if not os.path.lexists(dest_path):
+                continue
+            remove_path(dest_path)
+            if dest_manifest[rel_path]['type'] != 'dir':
+                stats.files_deleted += 1
+            if verbose:
+                print(f'sync_dir: Delete "{rel_path}" from "{dest}".')
+    return stats
+
+
+def link_tree(src, dest):
+    """
+    Copy a directory tree by hard links of files, so that it costs no data transfer.
+    Files in dest must be replaced rather than modified in place, as sync_file() does.
+    """
+    manifest = build_manifest(src)
+    os.makedirs(dest)
+    for rel_path, entry in sorted(manifest.items()):
+        src_path = os.path.join(src, rel_path)
+        dest_path = os.path.join(dest, rel_path)
+        if entry['type'] == 'dir':
+            os.makedirs(dest_path)
+        elif entry['type'] == 'link':
+            os.symlink(entry['hash'], dest_path)
+        else:
+            os.link(src_path, dest_path)
+    for rel_path, entry in sorted(manifest.items(), reverse=True):
+        if entry['type'] == 'dir':
+            os.chmod(os.path.join(dest, rel_path), entry['mode'])
+
+
+def switch_symlink(link_path, target):
+    """
+    Point symlink at link_path to target atomically, a directory at link_path is replaced by the symlink.
+    """
+    temp_path = f'{link_path}.{os.getpid()}.tmp'
+    if os.path.lexists(temp_path):
+        os.remove(temp_path)
+    os.symlink(target, temp_path)
+    if os.path.isdir(link_path) and not os.path.islink(link_path):
+        # a directory can not be replaced by rename, move it away first.
+        old_path = f'{link_path}.{os.getpid()}.old'
+        os.rename(link_path, old_path)
+        os.replace(temp_path, link_path)
+        shutil.rmtree(old_path)
+    else:
+        os.replace(temp_path, link_path)
+
+
+class ObjectStore:
+    def __init__(self, dir_path):
+        """
+        Content-addressed store of files, each file is kept once as "<hash[:2]>/<hash[2:]>" however many
+        manifests refer to it.
+
+        :param dir_path: top path of object store.
+        """
+        self.dir_path = dir_path
+
+    def object_path(self, file_hash_str):
+        return os.path.join(self.dir_path, file_hash_str[:2], file_hash_str[2:])
+
+    def has(self, file_hash_str):
+        return os.path.isfile(self.object_path(file_hash_str))
+
+    def put(self, file_path, file_hash_str=None):
+        """
+        Add a file into store, nothing is copied if the same content is already stored.
+
+        :param file_path: path of file to add.
+        :param file_hash_str: hash of file if already known.
+        :return: (hash of file, whether the file was copied).
+        """
+        if not file_hash_str:
+            file_hash_str = file_hash(file_path)
+        object_path = self.object_path(file_hash_str)
+        if os.path.isfile(object_path):
+            return file_hash_str, False
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        temp_path = f'{object_path}.{os.getpid()}.tmp'
+        try:
+            shutil.copyfile(file_path, temp_path)
+            os.chmod(temp_path, 0o444)
+            os.replace(temp_path, object_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return file_hash_str, True
+
+    def prune(self, referenced, verbose=False):
+        """
+        Remove objects not in referenced hashes.
+
+        :param referenced: set of hashes still referenced by manifests.
+        :param verbose: verbosity.
+        :return: number of objects removed.
+        """
+        removed = 0
+        if not os.path.isdir(self.dir_path):
+            return removed
+        for prefix in os.listdir(self.dir_path):
+            prefix_path = os.path.join(self.dir_path, prefix)
+            if not os.path.isdir(prefix_path):
+                continue
+            for name in os.listdir(prefix_path):
+                if f'{prefix}{name}' not in referenced and not name.endswith('.tmp'):
+                    os.remove(os.path.join(prefix_path, name))
+                    removed += 1
+            if not os.listdir(prefix_path):
+                os.rmdir(prefix_path)
+        if verbose:
+            print(f'ObjectStore.prune: {removed} unreferenced objects removed from "{self.dir_path}".')
+        return removed
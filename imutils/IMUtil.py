@@ -1,14 +1,17 @@
 import os
 import sys
+import json
 from tabulate import tabulate
 from collections.abc import Iterable
 
 import imutils.IMConfig as IMConfig
 from imutils.IMConfig import get_manager_path
 from imutils.IMError import IMValueError
-from imutils.IocClass import IOC, gen_swarm_files, get_all_ioc, repository_backup, restore_backup
-from imutils.SwarmClass import SwarmManager, SwarmService
-from imutils.IMFunc import try_makedirs, condition_parse
+from imutils.IocClass import (IOC, gen_swarm_files, get_all_ioc, preload_ioc, batch_generate, batch_check,
+                              repository_backup, restore_backup, show_backups)
+from imutils.IocQuery import IocQuery, parse_query, query_conditions
+from imutils.SwarmClass import SwarmManager, SwarmService, SwarmStateSnapshot
+from imutils.IMFunc import try_makedirs, read_operation_log
 
 
 # accepts iterable for input
@@ -20,6 +23,10 @@ def create_ioc(name, args, config=None, verbose=False):
             if cha in name:
                 print(f'create_ioc: Failed. IOC name "{name}" has invalid character "{cha}".')
                 return
+        if name.startswith('.'):
+            # hidden directories in repository are not listed as IOC projects.
+            print(f'create_ioc: Failed. IOC name "{name}" should not start with ".".')
+            return
         #
         dir_path = os.path.join(IMConfig.REPOSITORY_PATH, name)
         if os.path.exists(os.path.join(dir_path, IMConfig.IOC_CONFIG_FILE)):
@@ -165,83 +172,87 @@ def rename_ioc(old_name, new_name, verbose):
         print(f'rename_ioc: Failed. IOC "{old_name}" not found.')
 
 
-def get_filtered_ioc(condition: list, section='IOC', from_list=None, show_info=False, show_panel=False,
-                     verbose=False):
+def query_ioc(condition: list, section='IOC', from_list=None, rebuild_index=False, verbose=False):
     """
-    Filter and List IOC projects by specified conditions and section. Logic "AND" is used between each condition.
+    Return IOC projects in read-only mode matching specified query, see get_filtered_ioc().
 
-    :param condition: filter conditions such as ["a=b", "c=d"]
-    :param section: filter on given section in config file
-    :param from_list: filter from given IOC list
-    :param show_info: show IOC configurations
-    :param show_panel: show IOC management pannel
-    :param verbose:
-    :return:
+    :return: list of IOC objects, or None if query is invalid.
     """
     section = section.upper()  # to support case-insensitive filter for section.
-    ioc_list = get_all_ioc(read_mode=True, from_list=from_list, verbose=verbose)
+    # IOC projects are loaded only when conditions on their config are evaluated,
+    # so that name conditions cost no file reading.
+    ioc_list = get_all_ioc(read_mode=True, from_list=from_list, rebuild_index=rebuild_index, lazy=True,
+                           verbose=verbose)
 
     if verbose and from_list is not None:
         print(f'List IOC projects from "{from_list}".')
 
-    index_to_remove = []
     if not condition:
         # Return all IOC projects when no condition specified.
         if verbose:
             print(f'No condition specified, list all IOC projects.')
     elif isinstance(condition, list):
-        valid_flag = False  # flag to check whether any valid condition has been given.
-        valid_condition = []
-        for c in condition:
-            key, value = condition_parse(c)
-            # only valid condition was parsed to filter IOC.
-            if key:
-                valid_flag = True
-                valid_condition.append(c)
-                if key.lower() == 'name':
-                    for i in range(0, len(ioc_list)):
-                        if value not in ioc_list[i].name:
-                            index_to_remove.append(i)
-                else:
-                    for i in range(0, len(ioc_list)):
-                        if not ioc_list[i].check_config(key, value, section):
-                            index_to_remove.append(i)
-            else:
-                if verbose:
-                    print(f'Skip invalid condition "{c}".')
-        if valid_flag:
+        try:
+            query = parse_query(condition, section=section, verbose=verbose)
+        except IMValueError as e:
+            print(f'query_ioc: Failed. Invalid query "{" ".join(condition)}", {e}')
+            return None
+        if query is not None:
             if verbose:
-                print(f'Results for filter with parameter: section="{section}", condition="{valid_condition}".')
+                print(f'Results for filter with parameter: section="{section}", '
+                      f'condition="{query_conditions(query)}".')
+            res = IocQuery(ioc_list, load_func=preload_ioc).evaluate(query)
+            ioc_list = [ioc for ioc in ioc_list if ioc.name in res]
         else:
             # Do not return any result if no valid condition given.
-            index_to_remove = [i for i in range(0, len(ioc_list))]
+            ioc_list = []
             if verbose:
                 print(f'No result. No valid condition given.')
     else:
         raise IMValueError(f'Invalid filter parameter: condition="{condition}".')
+    return ioc_list
 
-    # get index to print.
-    index_reserved = []
-    for i in range(0, len(ioc_list)):
-        if i in index_to_remove:
-            continue
-        else:
-            index_reserved.append(i)
+
+def get_filtered_ioc(condition: list, section='IOC', from_list=None, show_info=False, show_panel=False,
+                     rebuild_index=False, verbose=False):
+    """
+    Filter and List IOC projects by specified query and section.
+
+    Conditions such as "host=swarm", "image~beta", "name=test*" or "DEPLOY.labels~test" are joined by
+    "AND", "OR" and "NOT", with "AND" used between adjacent conditions. Parentheses group conditions.
+
+    :param condition: filter query split into tokens, such as ["a=b", "OR", "NOT", "c~d"]
+    :param section: filter on given section in config file for conditions without section
+    :param from_list: filter from given IOC list
+    :param show_info: show IOC configurations
+    :param show_panel: show IOC management pannel
+    :param rebuild_index: rebuild repository index before filtering
+    :param verbose:
+    :return:
+    """
+    ioc_list = query_ioc(condition, section=section, from_list=from_list, rebuild_index=rebuild_index,
+                         verbose=verbose)
+    if ioc_list is None:
+        return
+
+    if show_info or show_panel:
+        preload_ioc(ioc_list)
     # print results.
     ioc_print = []
     panel_print = [["IOC", "Host", "State", "Status", "DeployStatus", "ExportConsistency"], ]
-    for i in index_reserved:
+    swarm_snapshot = SwarmStateSnapshot()  # state of all services fetched once for the whole panel.
+    for ioc in ioc_list:
         if show_info:
-            ioc_list[i].show_config()
+            ioc.show_config()
         elif show_panel:
-            temp_service = SwarmService(name=ioc_list[i].name, service_type='ioc')
-            panel_print.append([ioc_list[i].name, ioc_list[i].get_config("host"),
-                                ioc_list[i].state_manager.get_config("state"),
-                                ioc_list[i].state_manager.get_config("status"),
+            temp_service = SwarmService(name=ioc.name, service_type='ioc', snapshot=swarm_snapshot)
+            panel_print.append([ioc.name, ioc.get_config("host"),
+                                ioc.state_manager.get_config("state"),
+                                ioc.state_manager.get_config("status"),
                                 temp_service.current_state,
-                                ioc_list[i].check_consistency(print_info=False)[1]])
+                                ioc.check_consistency(print_info=False)[1]])
         else:
-            ioc_print.append(ioc_list[i].name)
+            ioc_print.append(ioc.name)
     else:
         if show_info:
             pass
@@ -252,32 +263,69 @@ def get_filtered_ioc(condition: list, section='IOC', from_list=None, show_info=F
 
 
 def execute_ioc(args):
+    """
+    :return: exit code, 1 if any operation failed, otherwise 0.
+    """
     # operation outside IOC projects.
     if args.gen_swarm_file:
-        gen_swarm_files(iocs=args.name, verbose=args.verbose)
+        gen_swarm_files(iocs=args.name, shard_by=args.shard_by, shard_size=args.shard_size, verbose=args.verbose)
     elif args.gen_backup_file:
-        repository_backup(backup_mode=args.backup_mode, backup_dir=args.backup_path, verbose=args.verbose)
+        if not repository_backup(backup_mode=args.backup_mode, backup_dir=args.backup_path, include=args.backup_include,
+                                 exclude=args.backup_exclude, incremental=args.incremental, keep=args.backup_keep,
+                                 compression=args.compression, workers=args.compress_workers, verbose=args.verbose):
+            return 1
     elif args.restore_backup_file:
-        restore_backup(backup_path=args.restore_backup_file, force_overwrite=args.force_overwrite,
-                       verbose=args.verbose)
+        if not restore_backup(backup_path=args.restore_backup_file, force_overwrite=args.force_overwrite, at=args.at,
+                              only=args.only, verbose=args.verbose):
+            return 1
+    elif args.list_backups:
+        show_backups(backup_dir=args.backup_path, ioc_name=args.ioc, file_pattern=args.file, verbose=args.verbose)
     elif args.run_check:
-        if args.name:
+        # IOC projects are checked in a process pool.
+        not_found = []
+        if args.name and args.name != ['alliocs']:
+            names = []
             for name in args.name:
-                dir_path = os.path.join(IMConfig.REPOSITORY_PATH, name)
-                if os.path.exists(os.path.join(dir_path, IMConfig.IOC_CONFIG_FILE)):
-                    print(f'execute_ioc: operating for IOC "{name}".')
-                    ioc_temp = IOC(dir_path=dir_path, verbose=args.verbose)
-                    ioc_temp.project_check(print_info=True)
+                if os.path.exists(os.path.join(IMConfig.REPOSITORY_PATH, name, IMConfig.IOC_CONFIG_FILE)):
+                    names.append(name)
                 else:
                     print(f'execute_ioc: Failed. IOC "{name}" not found.')
+                    not_found.append(name)
         else:
-            for ioc_temp in get_all_ioc():
-                ioc_temp.project_check()
+            names = None
+        if args.filter or names is None:
+            ioc_list = query_ioc(args.filter if args.filter else [], verbose=args.verbose)
+            if ioc_list is None:
+                return 1
+            names = [ioc.name for ioc in ioc_list if names is None or ioc.name in names]
+        return batch_check(names, print_info=bool(args.name) and args.name != ['alliocs'], workers=args.workers,
+                           report_format=args.report, report_file=args.report_file, fail_on=args.fail_on,
+                           not_found=not_found, verbose=args.verbose)
+    elif (args.name == ['alliocs'] or args.filter) and (args.gen_startup_file or args.generate_and_export
+                                                         or args.deploy):
+        # batch operation for IOC projects in repository.
+        ioc_list = query_ioc(args.filter if args.filter else [], verbose=args.verbose)
+        if ioc_list is None:
+            return 1
+        names = [ioc.name for ioc in ioc_list if args.name in ([], ['alliocs']) or ioc.name in args.name]
+        if not names:
+            print(f'execute_ioc: No IOC project matched.')
+            return 0
+        res = batch_generate(names, export=args.generate_and_export or args.deploy, force=args.force_generate,
+                             force_overwrite=args.force_overwrite, workers=args.workers, verbose=args.verbose)
+        if args.deploy:
+            names = [name for name, result, output, elapsed in res if result != 'failed']
+            if names:
+                gen_swarm_files(iocs=names, verbose=args.verbose)
+        if any(result == 'failed' for name, result, output, elapsed in res):
+            return 1
     else:
         # operation inside IOC projects.
         if not args.name:
             print(f'execute_ioc: No IOC project specified.')
+            return 1
         else:
+            failed = False
             for name in args.name:
                 dir_path = os.path.join(IMConfig.REPOSITORY_PATH, name)
                 if os.path.exists(os.path.join(dir_path, IMConfig.IOC_CONFIG_FILE)):
@@ -286,24 +334,30 @@ def execute_ioc(args):
                     if isinstance(args.add_src_file, str):
                         ioc_temp.get_src_file(src_dir=args.add_src_file, print_info=True)
                     elif args.generate_and_export:
-                        ioc_temp.generate_startup_files()
-                        ioc_temp.export_for_mount(force_overwrite=args.force_overwrite)
+                        failed |= not ioc_temp.generate_startup_files(force=args.force_generate)
+                        failed |= not ioc_temp.export_for_mount(force_overwrite=args.force_overwrite)
                     elif args.gen_startup_file:
-                        ioc_temp.generate_startup_files()
+                        failed |= not ioc_temp.generate_startup_files(force=args.force_generate)
                     elif args.export_for_mount:
-                        ioc_temp.export_for_mount(force_overwrite=args.force_overwrite)
+                        failed |= not ioc_temp.export_for_mount(force_overwrite=args.force_overwrite)
+                    elif args.rollback_export:
+                        failed |= not ioc_temp.rollback_export()
                     elif args.restore_snapshot_file:
                         ioc_temp.restore_from_snapshot_files(restore_files=args.restore_snapshot_file,
                                                              force_restore=args.force_overwrite)
                     elif args.deploy:
-                        ioc_temp.generate_startup_files()
-                        ioc_temp.export_for_mount(force_overwrite=args.force_overwrite)
+                        failed |= not ioc_temp.generate_startup_files(force=args.force_generate)
+                        failed |= not ioc_temp.export_for_mount(force_overwrite=args.force_overwrite)
                         gen_swarm_files(iocs=list([ioc_temp.name, ]), verbose=args.verbose)
                     else:
                         print(f'execute_ioc: No "exec" option specified.')
-                        break  # break to avoid repeat print of "no exec" operation.
+                        return 1
                 else:
                     print(f'execute_ioc: Failed. IOC "{name}" not found.')
+                    failed = True
+            if failed:
+                return 1
+    return 0
 
 
 def execute_swarm(args):
@@ -311,15 +365,15 @@ def execute_swarm(args):
         SwarmManager.gen_global_services(verbose=args.verbose)
         SwarmManager.gen_local_services(verbose=args.verbose)
     elif args.deploy_global_services:
-        SwarmManager().deploy_global_services()
+        SwarmManager().deploy_global_services(workers=args.workers, verbose=args.verbose)
     elif args.deploy_all_iocs:
-        SwarmManager().deploy_all_iocs()
+        SwarmManager().deploy_all_iocs(sharded=args.sharded, workers=args.workers, verbose=args.verbose)
     elif args.remove_global_services:
-        SwarmManager().remove_global_services()
+        SwarmManager().remove_global_services(workers=args.workers, verbose=args.verbose)
     elif args.remove_all_iocs:
-        SwarmManager().remove_all_iocs()
+        SwarmManager().remove_all_iocs(workers=args.workers, verbose=args.verbose)
     elif args.remove_all_services:
-        SwarmManager().remove_all_services()
+        SwarmManager().remove_all_services(workers=args.workers, verbose=args.verbose)
     elif args.show_digest:
         SwarmManager().show_info()
     elif args.show_services:
@@ -346,16 +400,18 @@ def execute_service(args):
     if not args.name:
         print(f'execute_service: No IOC project specified.')
     else:
-        services_dict = SwarmManager().services
+        swarm_manager = SwarmManager()
+        services_dict = swarm_manager.services
         for name in args.name:
             # set service_type automatically
             if not args.type:
                 if name in services_dict.keys():
-                    temp_service = SwarmService(name, service_type=services_dict[name].service_type)
+                    temp_service = SwarmService(name, service_type=services_dict[name].service_type,
+                                                snapshot=swarm_manager.snapshot)
                 else:
-                    temp_service = SwarmService(name, service_type='custom')
+                    temp_service = SwarmService(name, service_type='custom', snapshot=swarm_manager.snapshot)
             else:
-                temp_service = SwarmService(name, service_type=args.type)
+                temp_service = SwarmService(name, service_type=args.type, snapshot=swarm_manager.snapshot)
             #
             if args.deploy:
                 temp_service.deploy()
@@ -408,6 +464,27 @@ def execute_config(args):
             exit(10)
 
 
+def show_operation_log(args):
+    entries = list(read_operation_log(since=args.since, until=args.until, ioc=args.ioc, user=args.user))
+    if args.last is not None:
+        entries = entries[-args.last:] if args.last > 0 else []
+    if args.json:
+        for entry in entries:
+            print(json.dumps(entry, ensure_ascii=False))
+        return
+    if not entries:
+        print(f'show_operation_log: No operation found.')
+        return
+    raw_print = [["Start", "Duration(s)", "User", "Outcome", "IOCs", "Command"], ]
+    for entry in entries:
+        iocs = entry.get('iocs', [])
+        if len(iocs) > 3:
+            iocs = iocs[:3] + [f'(+{len(iocs) - 3})']
+        raw_print.append([entry['start'], f'{entry.get("duration", 0):.2f}', f'{entry.get("user")}@{entry.get("host")}',
+                          entry.get('outcome', ''), ', '.join(iocs), entry.get('command', '')])
+    print(tabulate(raw_print, headers="firstrow", tablefmt='plain', disable_numparse=True))
+
+
 if __name__ == '__main__':
     class TESTV: pass
 
@@ -1,15 +1,30 @@
+import io
 import os
+import re
+import copy
+import time
+import json
 import yaml
-import filecmp
-import tarfile
+import hashlib
 import datetime
+import contextlib
 import configparser
+from tabulate import tabulate
+from concurrent.futures import ProcessPoolExecutor
 
 from imutils.IMConfig import *
-from imutils.IMError import IMValueError, IMIOCError
-from imutils.IMFunc import (try_makedirs, file_remove, dir_remove, file_copy, dir_copy,
+from imutils.IMError import IMValueError
+from imutils.IMFunc import (try_makedirs, file_remove, dir_remove, file_copy,
                             condition_parse, multi_line_parse, format_normalize,
-                            relative_and_absolute_path_to_abs, dir_compare)
+                            relative_and_absolute_path_to_abs, concurrent_call, write_config_file,
+                            operation_log_iocs)
+from imutils.IMBackup import (BACKUP_ARCHIVE_SUFFIX, BACKUP_ZSTD_ARCHIVE_SUFFIX, BACKUP_MANIFEST_SUFFIX, BackupFilter,
+                              BackupProgress, ArchiveWriter, StoreWriter, iter_tree, list_backups, find_backup,
+                              open_backup_iocs, prune_backups, load_catalog, build_catalog)
+from imutils.IocIndex import RepositoryIndex, conf_from_sections, read_ini_sections
+from imutils.IMManifest import (SyncStats, ObjectStore, sync_dir, update_file, link_tree, switch_symlink, file_entry,
+                                same_file, load_manifest, save_manifest, refresh_entry, refresh_manifest,
+                                compare_manifests, human_size)
 
 
 class IocStateManager:
@@ -19,6 +34,9 @@ class IocStateManager:
 
         :param dir_path: path to project directory.
         :param verbose: whether to show details about program processing.
+        :param kwargs: extra arguments. "create" to indicate a creation operation.
+            "index_entry" to use parsed state info from repository index instead of reading the file.
+            "read_mode" to never write state info file, state changes are only kept in memory.
         """
 
         # self.dir_path: directory for IOC project.
@@ -29,12 +47,14 @@ class IocStateManager:
 
         self.dir_path = dir_path
         self.verbose = verbose
+        self.read_mode = kwargs.get('read_mode', False)
         self.info_file_path = os.path.join(self.dir_path, IOC_STATE_INFO_FILE)
 
         self.conf = None
         self.state = ''
         self.state_info = ''
-        self.read_config(create=kwargs.get('create', False))
+        self.diagnostics = []  # (state, state_info, prompt) reported while running, kept in memory.
+        self.read_config(create=kwargs.get('create', False), index_entry=kwargs.get('index_entry'))
         self.state = self.get_config('state')
         self.state_info += self.get_config('state_info')
 
@@ -56,7 +76,12 @@ class IocStateManager:
         self.set_config('is_exported', 'unknown')
         self.write_config()
 
-    def read_config(self, create):
+    def read_config(self, create, index_entry=None):
+        if index_entry and index_entry['state'] is not None:
+            self.conf = conf_from_sections(index_entry['state'])
+            if self.verbose:
+                print(f'IocStateManager.read_config: Read state info of "{self.info_file_path}" from index.')
+            return
         if os.path.exists(self.info_file_path):
             conf = configparser.ConfigParser()
             if conf.read(self.info_file_path):
@@ -85,9 +110,12 @@ class IocStateManager:
                 self.set_state_info(state=STATE_ERROR, state_info=state_info, prompt=prompt)
 
     def write_config(self):
+        if self.read_mode:
+            if self.verbose:
+                print(f'IocStateManager.write_config: Skip writing "{self.info_file_path}" in read-only mode.')
+            return
         self.normalize_config()
-        with open(self.info_file_path, 'w') as f:
-            self.conf.write(f)
+        write_config_file(self.conf, self.info_file_path)
 
     def set_config(self, option, value, section='STATE'):
         section = section.upper()  # sections should only be uppercase.
@@ -143,6 +171,8 @@ class IocStateManager:
         file_remove(self.info_file_path, verbose=False)
 
     def set_state_info(self, state, state_info, prompt=''):
+        if state in (STATE_ERROR, STATE_WARNING):
+            self.diagnostics.append((state, state_info, prompt))
         if self.state_info:
             prefix_newline = '\n'
         else:
@@ -176,6 +206,10 @@ class IOC:
         :param verbose: whether to show details about program processing.
         :param kwargs: extra arguments. "create" to indicate a creation operation.
             "state_info_ini_dir" to indicate dir of state info file when reading config file not in repository dir.
+            "index" to use parsed files from given RepositoryIndex instead of reading them, read-only mode only.
+
+        In read-only mode config file, state info file and source directory are loaded the first time they are
+        accessed, so that only the name of project is known after initialization.
         """
 
         # self.dir_path: directory for IOC project.
@@ -208,6 +242,15 @@ class IOC:
         self.read_mode = read_mode
         self.verbose = verbose
         self.dir_path = os.path.normpath(dir_path)
+        self.name = os.path.basename(self.dir_path)
+        self.index = kwargs.get('index') if read_mode else None
+        self._index_entry = None
+        self._state_info_dir = kwargs.get('state_info_ini_dir', self.dir_path)
+        self._create = kwargs.get('create', False)
+        self._state_manager = None
+        self._conf = None
+        self._conf_loaded = False
+        self._src_files = None
 
         self.src_path = os.path.join(self.dir_path, 'src')
         self.config_file_path = os.path.join(self.dir_path, IOC_CONFIG_FILE)
@@ -215,44 +258,30 @@ class IOC:
         self.settings_path = os.path.join(self.project_path, 'settings')
         self.log_path = os.path.join(self.project_path, 'log')
         self.startup_path = os.path.join(self.project_path, 'startup')
+        self.project_manifest_file = os.path.join(self.project_path, PROJECT_MANIFEST_FILE)
         self.db_path = os.path.join(self.startup_path, 'db')
         self.boot_path = os.path.join(self.startup_path, 'iocBoot')
 
-        self.state_manager = IocStateManager(dir_path=kwargs.get('state_info_ini_dir', self.dir_path),
-                                             verbose=self.verbose, create=kwargs.get('create', False))
-
-        self.conf = None
-        if not self.read_mode:
-            self.read_config(create=kwargs.get('create', False))
-        else:
-            self.read_config(create=False)
-
-        self.name = self.get_config('name')
-        if self.name != os.path.basename(self.dir_path):
-            if self.read_mode:
-                self.name = os.path.basename(self.dir_path)
-            else:
-                old_name = self.name
-                self.name = os.path.basename(self.dir_path)
-                self.set_config('name', self.name)
-                self.write_config()
-                print(f'IOC.__init__: Set name from "{old_name}" to "{self.name}" according to project top-level path.')
-
         self.snapshot_path = os.path.join(SNAPSHOT_PATH, self.name)
         self.config_snapshot_file = os.path.join(self.snapshot_path, IOC_CONFIG_FILE)
         self.src_snapshot_path = os.path.join(self.snapshot_path, 'src')
-
-        self.dir_path_for_mount = os.path.join(MOUNT_PATH, self.get_config('host'), self.get_config('name'))
-        self.config_file_path_for_mount = os.path.join(self.dir_path_for_mount, IOC_CONFIG_FILE)
+        self.snapshot_manifest_file = os.path.join(self.snapshot_path, SNAPSHOT_MANIFEST_FILE)
 
         self.settings_path_in_docker = os.path.join(CONTAINER_IOC_RUN_PATH, self.name, 'settings')
         self.log_path_in_docker = os.path.join(CONTAINER_IOC_RUN_PATH, self.name, 'log')
         self.startup_path_in_docker = os.path.join(CONTAINER_IOC_RUN_PATH, self.name, 'startup')
 
-        # update currently managed source files or check existence of src dir if in read-only mode.
-        self.get_src_file()
-
         if not self.read_mode:
+            config_name = self.get_config('name')
+            if config_name != self.name:
+                self.set_config('name', self.name)
+                self.write_config()
+                print(f'IOC.__init__: Set name from "{config_name}" to "{self.name}" '
+                      f'according to project top-level path.')
+
+            # update currently managed source files.
+            self.get_src_file()
+
             #
             if not self.state_manager.check_config('state', 'normal'):
                 if self.verbose:
@@ -262,6 +291,64 @@ class IOC:
         if self.verbose:
             print(f'IOC.__init__: Finished initializing for IOC "{self.name}".')
 
+    @property
+    def index_entry(self):
+        if self.index and self._index_entry is None:
+            self._index_entry = self.index.get_entry(self.name)
+        return self._index_entry
+
+    @property
+    def conf(self):
+        if not self._conf_loaded:
+            self._conf_loaded = True
+            self.read_config(create=self._create)
+        return self._conf
+
+    @conf.setter
+    def conf(self, value):
+        self._conf_loaded = True
+        self._conf = value
+
+    @property
+    def state_manager(self):
+        if self._state_manager is None:
+            self._state_manager = IocStateManager(dir_path=self._state_info_dir, verbose=self.verbose,
+                                                  create=self._create, index_entry=self.index_entry,
+                                                  read_mode=self.read_mode)
+            if self.read_mode:
+                # problems of config file and source directory are reported in state info.
+                if not self._conf_loaded:
+                    self.conf
+                # check existence of src dir.
+                self.get_src_file()
+        return self._state_manager
+
+    @property
+    def src_files(self):
+        """
+        File names in source directory, None if source directory not exists.
+        """
+        if self._src_files is None:
+            if self.index_entry:
+                self._src_files = self.index_entry['src']
+            elif os.path.isdir(self.src_path):
+                self._src_files = sorted(os.listdir(self.src_path))
+        return self._src_files
+
+    @property
+    def dir_path_for_mount(self):
+        return os.path.join(MOUNT_PATH, self.get_config('host'), self.get_config('name'))
+
+    @property
+    def config_file_path_for_mount(self):
+        return os.path.join(self.dir_path_for_mount, IOC_CONFIG_FILE)
+
+    def load(self):
+        """
+        Load config file, state info file and source directory if not loaded yet.
+        """
+        _ = self.conf, self.state_manager, self.src_files
+
     def create_new(self):
         self.make_directory_structure()
         self.set_default_settings()
@@ -275,6 +362,11 @@ class IOC:
 
     # read config or create a new config or set error.
     def read_config(self, create):
+        if self.index_entry and self.index_entry['config'] is not None:
+            self.conf = conf_from_sections(self.index_entry['config'])
+            if self.verbose:
+                print(f'IOC.read_config: Read config of "{self.config_file_path}" from index.')
+            return
         if os.path.exists(self.config_file_path):
             conf = configparser.ConfigParser()
             if conf.read(self.config_file_path):
@@ -297,9 +389,12 @@ class IOC:
                 self.state_manager.set_state_info(state=STATE_ERROR, state_info=state_info, prompt=prompt)
 
     def write_config(self):
+        if self.read_mode:
+            if self.verbose:
+                print(f'IOC.write_config: Skip writing "{self.config_file_path}" in read-only mode.')
+            return
         self.normalize_config()
-        with open(self.config_file_path, 'w') as f:
-            self.conf.write(f)
+        write_config_file(self.conf, self.config_file_path)
 
     def set_config(self, option, value, section='IOC'):
         section = section.upper()  # sections should only be uppercase.
@@ -463,13 +558,25 @@ class IOC:
             else:
                 print(f'IOC("{self.name}").get_src_file: Start.')
 
-        if not os.path.isdir(self.src_path):
+        if self.read_mode:
+            src_exists = self.src_files is not None
+        else:
+            src_exists = os.path.isdir(self.src_path)
+        if not src_exists:
             print(f'IOC("{self.name}").get_src_file: Failed. Source path of project "{self.src_path}" not exist.')
             state_info = 'source directory lost'
-            prompt = 'source directory was lost and an empty dir was created.'
+            if self.read_mode:
+                prompt = 'source directory was lost.'
+            else:
+                prompt = 'source directory was lost and an empty dir was created.'
             self.state_manager.set_state_info(STATE_ERROR, state_info=state_info, prompt=prompt)
+            if self.read_mode:
+                return
             try_makedirs(self.src_path, verbose=self.verbose)
 
+        if self.read_mode and src_dir is None:
+            return
+
         src_p = relative_and_absolute_path_to_abs(src_dir, self.src_path)
         if not os.path.exists(src_p):
             print(f'IOC("{self.name}").get_src_file: Failed. Dir path "{src_p}" not exist.')
@@ -624,15 +731,63 @@ class IOC:
                   f'Option "load" in section "DB" should be defined before generating "{self.name}.substitutions".')
             return False
 
+    # Fingerprint of all files read when generating startup files.
+    def get_startup_fingerprint(self):
+        files = [self.config_file_path, os.path.join(TEMPLATE_PATH, 'caputlog.acf')]
+        if os.path.isdir(DB_TEMPLATE_PATH):
+            files.extend(os.path.join(DB_TEMPLATE_PATH, item) for item in sorted(os.listdir(DB_TEMPLATE_PATH)))
+        for load_line in multi_line_parse(self.get_config('load', 'DB')):
+            files.append(os.path.join(self.src_path, load_line.split(',')[0].strip()))
+        if self.conf.has_section('STREAM'):
+            for item in self.get_config('protocol_file', 'STREAM').split(','):
+                files.append(os.path.join(self.src_path, item.strip()))
+        if self.conf.has_section('RAW'):
+            for item in multi_line_parse(self.get_config('file_copy', 'RAW')):
+                src = item.split(sep=':')[0]
+                files.append(os.path.join(self.src_path if src.startswith('src/') else TEMPLATE_PATH, src))
+        hash_obj = hashlib.sha256(f'{STARTUP_FILES_VERSION}\n'.encode())
+        for file_path in files:
+            hash_obj.update(f'{file_path}\n'.encode())
+            try:
+                with open(file_path, 'rb') as f:
+                    hash_obj.update(hashlib.sha256(f.read()).digest())
+            except OSError:
+                hash_obj.update(b'lost')
+        return hash_obj.hexdigest()
+
+    # Whether startup files generated last time are still up to date with the given fingerprint,
+    # and all files in startup dir are still the ones recorded in project manifest when they were generated.
+    def startup_files_up_to_date(self, fingerprint):
+        if not (self.state_manager.check_config('fingerprint', fingerprint)
+                and self.state_manager.check_config('state', 'normal')
+                and (self.state_manager.check_config('status', 'generated')
+                     or self.state_manager.check_config('status', 'exported'))
+                and self.state_manager.check_config('snapshot', 'tracked')):
+            return False
+        recorded = {key: entry for key, entry in load_manifest(self.project_manifest_file).items()
+                    if key.startswith('startup/')}
+        if not recorded:
+            return False
+        # only files whose size or mtime changed since generating are hashed.
+        current = refresh_manifest(self.startup_path, [recorded], 'startup/')
+        return not any(compare_manifests(recorded, current))
+
     # Generate all startup files for running an IOC project.
     # This function should be called after that generate_check is passed.
-    def generate_startup_files(self):
+    # Generating is skipped if files it reads are not changed since last successful generating, unless force is set.
+    def generate_startup_files(self, force=False):
         if self.verbose:
             print(f'IOC("{self.name}").generate_startup_files: Start.')
 
+        fingerprint = self.get_startup_fingerprint()
+        if not force and self.startup_files_up_to_date(fingerprint):
+            print(f'IOC("{self.name}").generate_startup_files: Skipped. Startup files are up to date.')
+            return True
+        self.state_manager.set_config('fingerprint', '')
+
         if not self.generate_check():
             print(f'IOC("{self.name}").generate_startup_files": Failed. Checks failed before generating startup files.')
-            return
+            return False
 
         lines_before_dbload = []
         lines_at_dbload = [f'cd {self.startup_path_in_docker}\n',
@@ -847,7 +1002,7 @@ class IOC:
 
         # generate .substitutions file.
         if not self.generate_substitutions_file():
-            return
+            return False
 
         # write st.cmd file.
         try_makedirs(self.boot_path, self.verbose)
@@ -864,7 +1019,7 @@ class IOC:
                   f'Exception "{e}" occurs while trying to write st.cmd file.')
             state_info = 'write st.cmd file failed.'
             self.state_manager.set_state_info(state=STATE_WARNING, state_info=state_info)
-            return
+            return False
         # set readable and executable permission.
         os.chmod(file_path, 0o555)
         if self.verbose:
@@ -872,14 +1027,25 @@ class IOC:
 
         # add snapshot files
         if not self.add_snapshot_files():
-            return
+            return False
+
+        # record hashes of generated files for consistency checks.
+        try:
+            save_manifest(self.project_manifest_file,
+                          build_export_manifest(self.config_file_path, self.settings_path, self.startup_path,
+                                                [load_manifest(self.project_manifest_file)]))
+        except OSError as e:
+            print(f'IOC("{self.name}").generate_startup_files: Warning. '
+                  f'Exception "{e}" occurs while trying to write manifest file.')
 
         #
         self.state_manager.set_config('status', 'generated')
         self.state_manager.set_config('state', 'normal')
         self.state_manager.set_config('state_info', '')
+        self.state_manager.set_config('fingerprint', fingerprint)
         self.state_manager.write_config()
         print(f'IOC("{self.name}").generate_startup_files": Success.')
+        return True
 
     # Copy IOC startup files to mount dir for running in container.
     # force_overwrite: "True" will overwrite all files, "False" only files that are not generated during running.
@@ -890,12 +1056,12 @@ class IOC:
         if not self.state_manager.check_config('state', 'normal'):
             print(f'IOC("{self.name}").export_for_mount: Failed. '
                   f'Exporting operation must under "normal" state.')
-            return
+            return False
         if not (self.state_manager.check_config('status', 'generated') or
                 self.state_manager.check_config('status', 'exported')):
             print(f'IOC("{self.name}").export_for_mount: Failed. '
                   f'Startup files should be generated before exporting.')
-            return
+            return False
 
         container_name = self.name
         host_name = self.get_config('host')
@@ -904,39 +1070,137 @@ class IOC:
 
         top_path = os.path.join(MOUNT_PATH, host_name, container_name)
         if not os.path.isdir(top_path):
-            file_to_copy = (IOC_CONFIG_FILE,)
-            dir_to_copy = ('settings', 'log', 'startup',)
+            dir_to_copy = ('settings', 'log',)
             exec_type = 'created'
         elif os.path.isdir(top_path) and force_overwrite:
-            file_to_copy = (IOC_CONFIG_FILE,)
-            dir_to_copy = ('settings', 'log', 'startup',)
+            dir_to_copy = ('settings', 'log',)
             exec_type = 'overwritten'
         else:
-            file_to_copy = (IOC_CONFIG_FILE,)
-            dir_to_copy = ('startup',)
+            dir_to_copy = ()
             exec_type = 'updated'
 
-        for item_file in file_to_copy:
-            file_copy(os.path.join(self.dir_path, item_file), os.path.join(top_path, item_file),
-                      verbose=self.verbose)
-            os.chmod(os.path.join(top_path, item_file), mode=0o444)  # set readonly permission.
-        for item_dir in dir_to_copy:
-            if not dir_copy(os.path.join(self.project_path, item_dir), os.path.join(top_path, item_dir),
-                            self.verbose):
-                print(f'IOC("{self.name}").export_for_mount: Failed. '
-                      f'Run this command again with "-v" option to see what happened in details.')
-                state_info = 'exporting failed.'
-                self.state_manager.set_state_info(state=STATE_WARNING, state_info=state_info)
-                return
+        # config file and startup files are exported into a new version directory, which is then switched to by
+        # symlink atomically, so that containers never see a partially exported project.
+        # unchanged files are hard linked from current version, only changed files are transferred.
+        stats = SyncStats()
+        versions_path = os.path.join(top_path, EXPORT_VERSIONS_DIR)
+        version = datetime.datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        version_path = os.path.join(versions_path, version)
+        current_version = get_export_version(top_path)
+        try:
+            try_makedirs(versions_path, self.verbose)
+            if current_version:
+                link_tree(os.path.join(versions_path, current_version), version_path)
+            else:
+                try_makedirs(version_path, self.verbose)
+            update_file(self.config_file_path, os.path.join(version_path, IOC_CONFIG_FILE), stats)
+            os.chmod(os.path.join(version_path, IOC_CONFIG_FILE), mode=0o444)  # set readonly permission.
+            stats += sync_dir(self.startup_path, os.path.join(version_path, 'startup'), verbose=self.verbose)
+            if current_version and not (stats.files_copied or stats.files_deleted):
+                dir_remove(version_path, verbose=False)
+                version = current_version
+            for item_dir in dir_to_copy:
+                stats += sync_dir(os.path.join(self.project_path, item_dir), os.path.join(top_path, item_dir),
+                                  verbose=self.verbose)
+            if version != current_version:
+                switch_symlink(os.path.join(top_path, EXPORT_CURRENT_LINK),
+                               os.path.join(EXPORT_VERSIONS_DIR, version))
+            # running dir exported before versioning is migrated to links once.
+            for item in (IOC_CONFIG_FILE, 'startup'):
+                link_path = os.path.join(top_path, item)
+                if not (os.path.islink(link_path) and
+                        os.readlink(link_path) == os.path.join(EXPORT_CURRENT_LINK, item)):
+                    switch_symlink(link_path, os.path.join(EXPORT_CURRENT_LINK, item))
+        except OSError as e:
+            if version != get_export_version(top_path) and os.path.isdir(version_path):
+                dir_remove(version_path, verbose=False)
+            print(f'IOC("{self.name}").export_for_mount: Failed. Exception "{e}" occurs while exporting.')
+            state_info = 'exporting failed.'
+            self.state_manager.set_state_info(state=STATE_WARNING, state_info=state_info, prompt=f'{e}')
+            return False
+        # record hashes of exported files for consistency checks, hashes in project manifest are reused.
+        try:
+            save_manifest(get_export_manifest_file(top_path),
+                          build_export_manifest(os.path.realpath(os.path.join(top_path, IOC_CONFIG_FILE)),
+                                                os.path.join(top_path, 'settings'),
+                                                os.path.realpath(os.path.join(top_path, 'startup')),
+                                                [load_manifest(self.project_manifest_file),
+                                                 load_manifest(get_export_manifest_file(top_path))]))
+        except OSError as e:
+            print(f'IOC("{self.name}").export_for_mount: Warning. '
+                  f'Exception "{e}" occurs while trying to write manifest file.')
+        prune_export_versions(top_path, verbose=self.verbose)
+        if version == current_version:
+            print(f'IOC("{self.name}").export_for_mount: Success. Project files {exec_type} in "{top_path}", '
+                  f'version "{version}" is up to date, {stats}.')
         else:
-            print(f'IOC("{self.name}").export_for_mount: Success. Project files {exec_type} in "{top_path}".')
+            print(f'IOC("{self.name}").export_for_mount: Success. Project files {exec_type} in "{top_path}", '
+                  f'switched to version "{version}", {stats}.')
 
         self.state_manager.set_config('status', 'exported')
         self.state_manager.set_config('is_exported', 'true')
         self.state_manager.write_config()
+        return True
+
+    # Switch running dir back to the exported version before current one, without regenerating anything.
+    def rollback_export(self):
+        host_name = self.get_config('host')
+        if not host_name:
+            host_name = SWARM_DIR
+        top_path = os.path.join(MOUNT_PATH, host_name, self.name)
+        current_version = get_export_version(top_path)
+        versions = list_export_versions(top_path)
+        if not current_version or current_version not in versions:
+            print(f'IOC("{self.name}").rollback_export: Failed. No exported version found in "{top_path}".')
+            return False
+        index = versions.index(current_version)
+        if index == 0:
+            print(f'IOC("{self.name}").rollback_export: Failed. '
+                  f'No version earlier than current version "{current_version}" kept.')
+            return False
+        try:
+            switch_symlink(os.path.join(top_path, EXPORT_CURRENT_LINK),
+                           os.path.join(EXPORT_VERSIONS_DIR, versions[index - 1]))
+        except OSError as e:
+            print(f'IOC("{self.name}").rollback_export: Failed. Exception "{e}" occurs while switching version.')
+            return False
+        print(f'IOC("{self.name}").rollback_export: Success. '
+              f'Switched from version "{current_version}" back to "{versions[index - 1]}".')
+        return True
+
+    # Read manifest of snapshot files, which maps "ioc.ini" and "src/<file>" to hash, size and mtime of the file
+    # when snapshot was taken. Snapshot of the old layout, plain copies of files, is read as well.
+    # return None if snapshot lost.
+    def read_snapshot_manifest(self):
+        if os.path.isfile(self.snapshot_manifest_file):
+            return load_manifest(self.snapshot_manifest_file) or None
+        if not os.path.isfile(self.config_snapshot_file):
+            return None
+        files = {IOC_CONFIG_FILE: dict(file_entry(self.config_snapshot_file), path=self.config_snapshot_file)}
+        if os.path.isdir(self.src_snapshot_path):
+            for item in os.listdir(self.src_snapshot_path):
+                item_path = os.path.join(self.src_snapshot_path, item)
+                files[f'src/{item}'] = dict(file_entry(item_path), path=item_path)
+        return files
+
+    # return path to read content of snapshot file from its manifest entry.
+    @staticmethod
+    def snapshot_object_path(entry):
+        return entry.get('path') or ObjectStore(SNAPSHOT_OBJECTS_PATH).object_path(entry['hash'])
+
+    # return path to read content of snapshot file by its name, "" if not exist.
+    def get_snapshot_file(self, name, manifest=None):
+        if manifest is None:
+            manifest = self.read_snapshot_manifest()
+        if not manifest or name not in manifest:
+            return ''
+        return self.snapshot_object_path(manifest[name])
 
     # return whether the files are in consistent with snapshot files.
-    def check_snapshot_files(self, print_info=False):
+    # diff: dict to be filled with lists of "changed", "missing" and "untracked" files if given.
+    def check_snapshot_files(self, print_info=False, diff=None):
+        diff = diff if diff is not None else {}
+        diff.update(changed=[], missing=[], untracked=[])
         if not self.state_manager.check_config('snapshot', 'tracked'):
             if self.verbose:
                 print(f'IOC("{self.name}").check_snapshot_files: '
@@ -949,16 +1213,21 @@ class IOC:
         consistent_flag = True
         config_file_check_res = ''
         source_file_check_res = ''
+        manifest = self.read_snapshot_manifest()
+        # files are compared by size and mtime recorded in manifest, only files whose stat changed are hashed.
         # check config snapshot file.
-        if os.path.isfile(self.config_snapshot_file):
+        if manifest and IOC_CONFIG_FILE in manifest:
             if os.path.isfile(self.config_file_path):
-                compare_res = filecmp.cmp(self.config_snapshot_file, self.config_file_path)
-                if not compare_res:
+                entry = manifest[IOC_CONFIG_FILE]
+                if not same_file(self.snapshot_object_path(entry), entry,
+                                 self.config_file_path, file_entry(self.config_file_path)):
                     consistent_flag = False
                     config_file_check_res = 'config file changed.'
+                    diff['changed'].append(IOC_CONFIG_FILE)
             else:
                 consistent_flag = False
                 config_file_check_res = 'config file lost.'
+                diff['missing'].append(IOC_CONFIG_FILE)
                 state_info = config_file_check_res
                 self.state_manager.set_state_info(state=STATE_ERROR, state_info=state_info)
         else:
@@ -967,38 +1236,37 @@ class IOC:
             self.state_manager.write_config()
             config_file_check_res = 'config file snapshot lost.'
         # check source snapshot files.
-        if os.path.isdir(self.src_snapshot_path):
+        if manifest is not None:
             if not os.path.isdir(self.src_path):
                 consistent_flag = False
                 self.state_manager.set_config('state', 'error')
                 self.state_manager.write_config()
                 source_file_check_res = 'source directory lost.'
             else:
-                src_compare_res = filecmp.dircmp(self.src_snapshot_path, self.src_path)
-                if src_compare_res.diff_files:
+                snapshot_items = {name[len('src/'):]: entry for name, entry in manifest.items()
+                                  if name.startswith('src/')}
+                source_items = os.listdir(self.src_path)
+                diff_files = []
+                for item in sorted(snapshot_items.keys()):
+                    if item in source_items:
+                        entry = snapshot_items[item]
+                        item_path = os.path.join(self.src_path, item)
+                        if not same_file(self.snapshot_object_path(entry), entry, item_path, file_entry(item_path)):
+                            diff_files.append(item)
+                left_only = sorted(item for item in snapshot_items if item not in source_items)
+                right_only = sorted(item for item in source_items if item not in snapshot_items)
+                diff['changed'].extend(f'src/{item}' for item in diff_files)
+                diff['missing'].extend(f'src/{item}' for item in left_only)
+                diff['untracked'].extend(f'src/{item}' for item in right_only)
+                if diff_files:
                     consistent_flag = False
-                    source_file_check_res += 'changed files: '
-                    for item in src_compare_res.diff_files:
-                        source_file_check_res += f'{item}, '
-                    else:
-                        source_file_check_res = source_file_check_res.rstrip(', ')
-                        source_file_check_res += '.\n'
-                if src_compare_res.left_only:
+                    source_file_check_res += f'changed files: {", ".join(diff_files)}.\n'
+                if left_only:
                     consistent_flag = False
-                    source_file_check_res += 'missing files and directories: '
-                    for item in src_compare_res.left_only:
-                        source_file_check_res += f'{item}, '
-                    else:
-                        source_file_check_res = source_file_check_res.rstrip(', ')
-                        source_file_check_res += '.\n'
-                if src_compare_res.right_only:
+                    source_file_check_res += f'missing files and directories: {", ".join(left_only)}.\n'
+                if right_only:
                     consistent_flag = False
-                    source_file_check_res += 'untracked files and directories: '
-                    for item in src_compare_res.right_only:
-                        source_file_check_res += f'{item}, '
-                    else:
-                        source_file_check_res = source_file_check_res.rstrip(', ')
-                        source_file_check_res += '.\n'
+                    source_file_check_res += f'untracked files and directories: {", ".join(right_only)}.\n'
                 source_file_check_res = source_file_check_res.rstrip('\n')
         else:
             consistent_flag = False
@@ -1020,39 +1288,49 @@ class IOC:
                   f'\n')
         return consistent_flag, config_file_check_res, source_file_check_res
 
+    # Take snapshot of config file and source files into content-addressed object store,
+    # files already stored are not copied again, files not changed since last snapshot are not hashed again.
     def add_snapshot_files(self):
         if self.verbose:
             print(f'IOC("{self.name}").add_snapshot_files: Start.')
-        self.delete_snapshot_files()
-        # snapshot for config file.
-        try_makedirs(self.snapshot_path, self.verbose)
-        if os.path.isfile(self.config_file_path):
-            if not file_copy(self.config_file_path, self.config_snapshot_file, 'r', self.verbose):
-                print(f'IOC("{self.name}").add_snapshot_files: Failed, snapshot file for config created failed.')
-                self.state_manager.set_config('snapshot', 'error')
-                state_info = f'snapshot files not create correctly.'
-                self.state_manager.set_state_info(state=STATE_WARNING, state_info=state_info)
-                return False
-        else:
+        if not os.path.isfile(self.config_file_path):
             print(f'IOC("{self.name}").add_snapshot_files: Failed, source file "{self.config_file_path}" not exist.')
             self.state_manager.set_config('snapshot', 'error')
             state_info = f'snapshot files not create correctly.'
             self.state_manager.set_state_info(state=STATE_WARNING, state_info=state_info)
             return False
-        # snapshot for source files.
-        try_makedirs(self.src_snapshot_path, self.verbose)
-        for item in os.listdir(self.src_path):
-            if not file_copy(os.path.join(self.src_path, item), os.path.join(self.src_snapshot_path, item), 'r',
-                             self.verbose):
-                print(f'IOC("{self.name}").add_snapshot_files: Failed, snapshot file '
-                      f'"{os.path.join(self.src_snapshot_path, item)}" created failed.')
-                self.state_manager.set_config('snapshot', 'error')
-                state_info = f'snapshot files not create correctly.'
-                self.state_manager.set_state_info(state=STATE_WARNING, state_info=state_info)
-                return False
+        last_manifest = self.read_snapshot_manifest() or {}
+        store = ObjectStore(SNAPSHOT_OBJECTS_PATH)
+        files = {IOC_CONFIG_FILE: self.config_file_path}
+        for item in sorted(os.listdir(self.src_path)):
+            files[f'src/{item}'] = os.path.join(self.src_path, item)
+        manifest = {}
+        copied_num = 0
+        try:
+            for name, file_path in files.items():
+                last_entry = last_manifest.get(name)
+                # hash of files in snapshot of the old layout is not recorded, they are hashed again.
+                entry = refresh_entry(file_path, [last_entry] if last_entry and 'path' not in last_entry else [])
+                entry['hash'], copied = store.put(file_path, entry['hash'])
+                copied_num += copied
+                manifest[name] = entry
+            try_makedirs(self.snapshot_path, self.verbose)
+            save_manifest(self.snapshot_manifest_file, manifest)
+        except OSError as e:
+            print(f'IOC("{self.name}").add_snapshot_files: Failed, snapshot files created failed, {e}.')
+            self.state_manager.set_config('snapshot', 'error')
+            state_info = f'snapshot files not create correctly.'
+            self.state_manager.set_state_info(state=STATE_WARNING, state_info=state_info)
+            return False
+        # remove snapshot files of the old layout.
+        if os.path.isfile(self.config_snapshot_file):
+            file_remove(self.config_snapshot_file, verbose=False)
+        if os.path.isdir(self.src_snapshot_path):
+            dir_remove(self.src_snapshot_path, verbose=False)
 
         if self.verbose:
-            print(f'IOC("{self.name}").add_snapshot_files: Success.')
+            print(f'IOC("{self.name}").add_snapshot_files: Success, {len(manifest)} files in snapshot, '
+                  f'{copied_num} new files stored.')
         self.state_manager.set_config('snapshot', 'tracked')
         self.state_manager.write_config()
         return True
@@ -1062,6 +1340,7 @@ class IOC:
             dir_remove(self.snapshot_path, verbose=False)
             self.state_manager.set_config('snapshot', 'untracked')
             self.state_manager.write_config()
+            prune_snapshot_objects(verbose=self.verbose)
 
     def restore_from_snapshot_files(self, restore_files: list, force_restore=False):
         if self.state_manager.check_config('snapshot', 'untracked'):
@@ -1075,49 +1354,19 @@ class IOC:
         else:
             restore_files = list(set(restore_files))  # remove duplicates
 
-        supported_items = []
-        files_provided = {'config': '', 'src': []}
-        if os.path.isfile(self.config_snapshot_file):
-            files_provided['config'] = self.config_snapshot_file
-            supported_items.append('ioc.ini')
-        for item in os.listdir(self.src_snapshot_path):
-            files_provided['src'].append(os.path.join(self.src_snapshot_path, item))
-            supported_items.append(item)
-
-        items_to_restore = []
-        unsupported_items = []
-        files_to_restore = {'config': '', 'src': []}
+        manifest = self.read_snapshot_manifest() or {}
+        # names of files provided, "ioc.ini" for config file and file name for source files.
+        files_provided = {name[len('src/'):] if name.startswith('src/') else name: name for name in manifest}
+
         if 'all' in restore_files:
-            files_to_restore = files_provided
-            items_to_restore = supported_items
+            items_to_restore = sorted(files_provided.keys())
+            unsupported_items = []
         else:
-            if 'ioc.ini' in restore_files:
-                restore_files.remove('ioc.ini')
-                files_to_restore['config'] = files_provided['config']  # as it is to restore, get path of ioc.ini
-                if not files_provided['config']:  # if it is not provided, add to unsupported list
-                    unsupported_items.append('ioc.ini')
-                else:
-                    items_to_restore.append('ioc.ini')
-            for item in restore_files:
-                item_path = os.path.join(self.src_snapshot_path, item)
-                if item_path in files_provided:
-                    files_to_restore['src'].append(item_path)
-                    items_to_restore.append(item)
-                else:
-                    unsupported_items.append(item)
+            items_to_restore = sorted(item for item in restore_files if item in files_provided)
+            unsupported_items = sorted(item for item in restore_files if item not in files_provided)
 
-        supported_file_string = ''
-        for item in items_to_restore:
-            supported_file_string += f'"{item}", '
-        else:
-            supported_file_string = supported_file_string.rstrip()
-            supported_file_string = supported_file_string.rstrip(',')
-        unsupported_file_string = ''
-        for item in unsupported_items:
-            unsupported_file_string += f'"{item}", '
-        else:
-            unsupported_file_string = unsupported_file_string.rstrip()
-            unsupported_file_string = unsupported_file_string.rstrip(',')
+        supported_file_string = ', '.join(f'"{item}"' for item in items_to_restore)
+        unsupported_file_string = ', '.join(f'"{item}"' for item in unsupported_items)
 
         if not supported_file_string:
             print(f'IOC("{self.name}").restore_from_snapshot_file: '
@@ -1141,16 +1390,14 @@ class IOC:
                         break
                     print('invalid input, please try again.')
             if force_restore:
-                if files_to_restore['config']:
-                    if not file_copy(files_to_restore['config'], self.dir_path, mode='rw', verbose=self.verbose):
-                        print(f'Restoring "{files_to_restore["config"]}" failed.')
+                for item in items_to_restore:
+                    name = files_provided[item]
+                    dest = os.path.join(self.dir_path, name)
+                    if not file_copy(self.snapshot_object_path(manifest[name]), dest, mode='rw',
+                                     verbose=self.verbose):
+                        print(f'Restoring "{dest}" failed.')
                     else:
-                        print(f'Restoring "{files_to_restore["config"]}" succeed.')
-                for item in files_to_restore['src']:
-                    if not file_copy(item, self.src_path, mode='rw', verbose=self.verbose):
-                        print(f'Restoring "{item}" failed.')
-                    else:
-                        print(f'Restoring "{item}" succeed.')
+                        print(f'Restoring "{dest}" succeed.')
 
     # Checks before generating the IOC project startup files.
     def generate_check(self):
@@ -1221,13 +1468,17 @@ class IOC:
 
     # Check differences between snapshot file and running settings file.
     # Check differences between project files and running files.
-    def check_consistency(self, print_info=False):
+    # diff: dict to be filled with lists of "changed", "missing" and "untracked" files if given.
+    def check_consistency(self, print_info=False, diff=None):
+        diff = diff if diff is not None else {}
+        diff.update(changed=[], missing=[], untracked=[])
         if not self.state_manager.check_config('is_exported', 'true'):
             if self.verbose:
                 print(f'IOC("{self.name}").check_consistency: '
                       f'Failed, can\'t check consistency as project is not in "exported" state.')
             return False, "Project not exported."
-        if not os.path.isfile(self.config_snapshot_file):
+        config_snapshot_file = self.get_snapshot_file(IOC_CONFIG_FILE)
+        if not config_snapshot_file:
             if self.verbose:
                 print(f'IOC("{self.name}").check_consistency: '
                       f'Failed, can\'t check consistency as config snapshot file lost.')
@@ -1236,6 +1487,7 @@ class IOC:
             if self.verbose:
                 print(f'IOC("{self.name}").check_consistency: '
                       f'Failed, can\'t check consistency as config file in mount dir lost.')
+            diff['missing'].append(IOC_CONFIG_FILE)
             return False, "Differences detected."
 
         if self.verbose or print_info:
@@ -1245,34 +1497,57 @@ class IOC:
         consistent_flag = True
         check_res = 'Consistency checked.'
 
-        files_to_compare = (
-            (self.config_snapshot_file, self.config_file_path_for_mount),
+        # files are compared by hashes in manifests recorded when generating and exporting,
+        # only files whose size or mtime changed since then are hashed again.
+        snapshot_entry = self.read_snapshot_manifest().get(IOC_CONFIG_FILE)
+        repo_manifest = build_export_manifest(self.config_file_path, self.settings_path, self.startup_path,
+                                              [load_manifest(self.project_manifest_file)])
+        repo_manifest[IOC_CONFIG_FILE] = refresh_entry(config_snapshot_file, [snapshot_entry])
+        mount_path = self.dir_path_for_mount
+        mount_manifest = build_export_manifest(os.path.realpath(self.config_file_path_for_mount),
+                                               os.path.join(mount_path, 'settings'),
+                                               os.path.realpath(os.path.join(mount_path, 'startup')),
+                                               [load_manifest(get_export_manifest_file(mount_path))])
+        changed, left_only, right_only = compare_manifests(repo_manifest, mount_manifest)
+        compare_items = (
+            (IOC_CONFIG_FILE, config_snapshot_file, self.config_file_path_for_mount),
+            ('settings/', self.settings_path, os.path.join(mount_path, 'settings')),
+            ('startup/', self.startup_path, os.path.join(mount_path, 'startup')),
         )
-        dirs_to_compare = (
-            (self.settings_path, os.path.join(self.dir_path_for_mount, 'settings')),
-            (self.startup_path, os.path.join(self.dir_path_for_mount, 'startup')),
-        )
-        for item in files_to_compare:
-            if print_info:
-                print(f'diff {item[0]} {item[1]}')
-            compare_res = filecmp.cmp(item[0], item[1])
-            if not compare_res:
-                consistent_flag = False
-                check_res = 'Differences detected.'
-                if print_info:
-                    print('changed files: "ioc.ini".\n')
+        for prefix, repo_path, running_path in compare_items:
+            res_str = f'diff {repo_path} {running_path}\n'
+            for title, diff_key, keys in (('changed files', 'changed', changed),
+                                          ('missing files and directories', 'missing', left_only),
+                                          ('untracked files and directories', 'untracked', right_only)):
+                keys = [key for key in keys if key.startswith(prefix)]
+                # files in a missing or untracked directory are reported by the directory.
+                keys = [key for key in keys if os.path.dirname(key) not in keys]
+                if keys:
+                    consistent_flag = False
+                    check_res = 'Differences detected.'
+                    diff[diff_key].extend(keys)
+                    res_str += f'{title}: ' + ', '.join(f'"{key}"' for key in keys) + '.\n'
             if print_info:
-                print()
-        for item in dirs_to_compare:
-            if dir_compare(item[0], item[1], print_info=print_info):
-                consistent_flag = False
-                check_res = 'Differences detected.'
+                print(res_str)
         return consistent_flag, check_res
 
     # Checks for IOC projects.
+    # return dict of check results, see check_ioc_project().
     def project_check(self, print_info=False):
         print(f'---------------------------------------------')
-        consistent_flag, temp, _ = self.check_snapshot_files(print_info=print_info)
+        for state, state_info, prompt in self.state_manager.diagnostics:
+            prompt = f' ====>>>> {prompt}' if prompt else ''
+            print(f'IOC("{self.name}").project_check: [{state}] {state_info}{prompt}')
+        snapshot_diff = {}
+        consistent_flag, temp, temp_src = self.check_snapshot_files(print_info=print_info, diff=snapshot_diff)
+        report = {
+            'name': self.name,
+            'state': self.state_manager.get_config('state'),
+            'status': self.state_manager.get_config('status'),
+            'snapshot': dict(consistent=consistent_flag, checked=temp != 'unchecked',
+                             result=' '.join(item for item in (temp, temp_src) if item and item != 'unchecked'),
+                             **snapshot_diff),
+        }
         if consistent_flag:
             print(f'IOC("{self.name}").project_check: snapshot consistency OK.')
         else:
@@ -1281,21 +1556,29 @@ class IOC:
                       f'can\'t check snapshot consistency as project is not tracked by snapshot.')
             else:
                 print(f'IOC("{self.name}").project_check: snapshot inconsistency found!')
-        consistent_flag, _ = self.check_consistency(print_info=print_info)
+        running_diff = {}
+        consistent_flag, temp = self.check_consistency(print_info=print_info, diff=running_diff)
+        report['running'] = dict(consistent=consistent_flag,
+                                 checked=self.state_manager.check_config('is_exported', 'true'),
+                                 result=temp, **running_diff)
         if consistent_flag:
             print(f'IOC("{self.name}").project_check: running file consistency OK.')
         else:
             print(f'IOC("{self.name}").project_check: running file inconsistency found!')
+        return report
 
     def try_repair(self):
         self.make_directory_structure()
 
 
-def gen_swarm_files(iocs, verbose):
+def gen_swarm_files(iocs, shard_by='', shard_size=None, verbose=False):
     """
     Generate Docker Compose file for swarm deploying at swarm data dir for specified IOC projects.
 
     :param iocs: IOC projects specified to generate compose file.
+    :param shard_by: also generate sharded stack files of multiple IOC projects for all IOC projects,
+        grouped by "image", "label=KEY" (value of label KEY in DEPLOY section) or "size" (shard size only).
+    :param shard_size: max number of IOC projects in one sharded stack file, default SWARM_SHARD_SIZE.
     :param verbose:
     """
     if verbose:
@@ -1313,8 +1596,14 @@ def gen_swarm_files(iocs, verbose):
         if verbose:
             print(f'gen_swarm_files: Working at {top_path}.')
 
+    if shard_by and not (shard_by in ('image', 'size') or shard_by.startswith('label=')):
+        print(f'gen_swarm_files: Failed. Invalid shard mode "{shard_by}".')
+        return
+
     processed_dir = []
-    for service_dir in os.listdir(top_path):
+    written_num = 0
+    shard_services = {}  # service_dir: (shard key, service definition) for sharded stack files.
+    for service_dir in sorted(os.listdir(top_path)):
         if not (iocs == ['alliocs'] or service_dir in iocs):
             continue
         service_path = os.path.join(top_path, service_dir)
@@ -1326,52 +1615,55 @@ def gen_swarm_files(iocs, verbose):
             if verbose:
                 print(f'gen_swarm_files: Skip directory "{service_dir}" as there is no valid IOC config file.')
             continue
-        try:
-            temp_ioc = IOC(dir_path=service_path, read_mode=True, verbose=verbose,
-                           state_info_ini_dir=os.path.join(REPOSITORY_PATH, service_dir))
-            if not temp_ioc.check_config(section='IOC', option='host', value='swarm'):
-                print(f'gen_swarm_files: Warning. IOC "{service_dir}" not defined in swarm mode, skipped.')
-                continue
-            if not temp_ioc.get_config(section='IOC', option='image'):
-                print(f'gen_swarm_files: Warning. Option "image" not defined for IOC "{service_dir}", skipped.')
-                continue
-            else:
-                ioc_settings['image'] = temp_ioc.get_config(section='IOC', option='image')
-            if not temp_ioc.get_config(section='DEPLOY', option='cpu-reserve'):
-                ioc_settings['cpu-reserve'] = ''
-            else:
-                ioc_settings['cpu-reserve'] = temp_ioc.get_config(section='DEPLOY', option='cpu-reserve')
-            if not temp_ioc.get_config(section='DEPLOY', option='memory-reserve'):
-                ioc_settings['memory-reserve'] = ''
-            else:
-                ioc_settings['memory-reserve'] = temp_ioc.get_config(section='DEPLOY', option='memory-reserve')
-            if not temp_ioc.get_config(section='DEPLOY', option='cpu-limit'):
-                ioc_settings['cpu-limit'] = RESOURCE_IOC_CPU_LIMIT
-            else:
-                ioc_settings['cpu-limit'] = temp_ioc.get_config(section='DEPLOY', option='cpu-limit')
-            if not temp_ioc.get_config(section='DEPLOY', option='memory-limit'):
-                ioc_settings['memory-limit'] = RESOURCE_IOC_MEMORY_LIMIT
-            else:
-                ioc_settings['memory-limit'] = temp_ioc.get_config(section='DEPLOY', option='memory-limit')
-            # resources reservations
-            reservations_dict = {}
-            if ioc_settings['cpu-reserve']:
-                reservations_dict['cpus'] = ioc_settings['cpu-reserve']
-            if ioc_settings['memory-reserve']:
-                reservations_dict['memory'] = ioc_settings['memory-reserve']
-            # labels
-            labels_to_add = {}
-            for label_line in multi_line_parse(temp_ioc.get_config(section='DEPLOY', option='labels')):
-                k, v = condition_parse(label_line)
-                if k:
-                    labels_to_add[k] = v
-                else:
-                    print(f'gen_swarm_files: Warning. '
-                          f'Invalid label definition "{label_line}" for IOC "{service_dir}", skipped.')
-        except IMIOCError as e:
-            print(f'gen_swarm_files: Warning. Exception raised "{e}" while Parsing "{ioc_ini_path}", skipped.')
+        # only config file is needed, so it is parsed without building an IOC object.
+        sections, error = read_ini_sections(ioc_ini_path)
+        if error:
+            print(f'gen_swarm_files: Warning. Failed to parse "{ioc_ini_path}", skipped.')
             continue
 
+        def get_option(option, section):
+            return sections.get(section, {}).get(option, '')
+
+        if get_option(section='IOC', option='host') != 'swarm':
+            print(f'gen_swarm_files: Warning. IOC "{service_dir}" not defined in swarm mode, skipped.')
+            continue
+        if not get_option(section='IOC', option='image'):
+            print(f'gen_swarm_files: Warning. Option "image" not defined for IOC "{service_dir}", skipped.')
+            continue
+        else:
+            ioc_settings['image'] = get_option(section='IOC', option='image')
+        if not get_option(section='DEPLOY', option='cpu-reserve'):
+            ioc_settings['cpu-reserve'] = ''
+        else:
+            ioc_settings['cpu-reserve'] = get_option(section='DEPLOY', option='cpu-reserve')
+        if not get_option(section='DEPLOY', option='memory-reserve'):
+            ioc_settings['memory-reserve'] = ''
+        else:
+            ioc_settings['memory-reserve'] = get_option(section='DEPLOY', option='memory-reserve')
+        if not get_option(section='DEPLOY', option='cpu-limit'):
+            ioc_settings['cpu-limit'] = RESOURCE_IOC_CPU_LIMIT
+        else:
+            ioc_settings['cpu-limit'] = get_option(section='DEPLOY', option='cpu-limit')
+        if not get_option(section='DEPLOY', option='memory-limit'):
+            ioc_settings['memory-limit'] = RESOURCE_IOC_MEMORY_LIMIT
+        else:
+            ioc_settings['memory-limit'] = get_option(section='DEPLOY', option='memory-limit')
+        # resources reservations
+        reservations_dict = {}
+        if ioc_settings['cpu-reserve']:
+            reservations_dict['cpus'] = ioc_settings['cpu-reserve']
+        if ioc_settings['memory-reserve']:
+            reservations_dict['memory'] = ioc_settings['memory-reserve']
+        # labels
+        labels_to_add = {}
+        for label_line in multi_line_parse(get_option(section='DEPLOY', option='labels')):
+            k, v = condition_parse(label_line)
+            if k:
+                labels_to_add[k] = v
+            else:
+                print(f'gen_swarm_files: Warning. '
+                      f'Invalid label definition "{label_line}" for IOC "{service_dir}", skipped.')
+
         # yaml file title, name of Compose Project must match pattern '^[a-z0-9][a-z0-9_-]*$'
         yaml_data = {
             'services': {},
@@ -1440,66 +1732,543 @@ def gen_swarm_files(iocs, verbose):
             'name': 'host',
         }
         yaml_data['networks'].update({f'hostnet': temp_yaml})
+        # hash of file content, recorded in file and in service label, so that unchanged file is not rewritten.
+        swarm_file_hash = get_swarm_file_hash(yaml_data)
+        yaml_data['services'][f'srv-{ioc_settings["service_dir"]}']['deploy']['labels'][
+            SWARM_FILE_HASH_LABEL] = swarm_file_hash
+        if shard_by == 'image':
+            shard_services[service_dir] = (ioc_settings['image'], yaml_data['services'])
+        elif shard_by.startswith('label='):
+            shard_services[service_dir] = (labels_to_add.get(shard_by[len('label='):], ''), yaml_data['services'])
+        else:
+            shard_services[service_dir] = ('', yaml_data['services'])
         # write yaml file
         file_path = os.path.join(top_path, service_dir, IOC_SERVICE_FILE)
-        if os.path.exists(file_path):
-            file_remove(file_path, verbose=False)
-        with open(file_path, 'w') as file:
-            yaml.dump(yaml_data, file, default_flow_style=False)
-        # set readonly permission.
-        os.chmod(file_path, 0o444)
-
         processed_dir.append(service_dir)
+        if read_swarm_file_hash(file_path) == swarm_file_hash:
+            if verbose:
+                print(f'gen_swarm_files: Swarm file for service "{service_dir}" is up to date, skipped.')
+            continue
+        write_swarm_file(file_path, yaml_data, swarm_file_hash)
+        written_num += 1
         print(f'gen_swarm_files: Create swarm file for service "{service_dir}".')
     else:
         if iocs == ['alliocs']:
-            print(f'gen_swarm_files: Finished creating swarm files for all IOC projects.')
+            print(f'gen_swarm_files: Finished creating swarm files for all IOC projects, '
+                  f'{written_num} created, {len(processed_dir) - written_num} up to date.')
         else:
             for item in iocs:
                 if item not in processed_dir:
                     print(f'gen_swarm_files: Failed to create swarm files for IOC project "{item}", '
                           f'may be it is not correctly set.')
 
+    if shard_by:
+        if iocs == ['alliocs']:
+            gen_swarm_shard_files(shard_services, shard_size=shard_size, verbose=verbose)
+        else:
+            print(f'gen_swarm_files: Warning. Sharded stack files are only generated for all IOC projects, skipped.')
+
+
+def gen_swarm_shard_files(shard_services, shard_size=None, verbose=False):
+    """
+    Generate stack files each with multiple IOC services at SWARM_SHARD_DIR of swarm data dir, so that
+    one "docker stack deploy" brings up a whole shard. Existing sharded stack files are replaced.
 
-def get_all_ioc(dir_path=None, from_list=None, read_mode=False, verbose=False):
+    :param shard_services: dict of {service_dir: (shard key, services definition of compose file)},
+        IOC projects with the same key are put into the same shards.
+    :param shard_size: max number of IOC projects in one sharded stack file, default SWARM_SHARD_SIZE.
+    :param verbose:
+    """
+    shard_size = shard_size if shard_size and shard_size > 0 else SWARM_SHARD_SIZE
+    shard_path = os.path.join(MOUNT_PATH, SWARM_DIR, SWARM_SHARD_DIR)
+    groups = {}
+    for service_dir in sorted(shard_services.keys()):
+        key, services = shard_services[service_dir]
+        groups.setdefault(key, []).append((service_dir, services))
+
+    shards = {}
+    for key in sorted(groups.keys()):
+        # name of shard must match pattern '^[a-z0-9][a-z0-9_-]*$' as name of stack file.
+        prefix = re.sub(r'[^a-z0-9_-]+', '-', key.lower()).strip('-_')
+        prefix = f'shard-{prefix}' if prefix else 'shard'
+        items = groups[key]
+        for i in range(0, len(items), shard_size):
+            yaml_data = {
+                'services': {},
+                'networks': {'hostnet': {'external': True, 'name': 'host'}},
+            }
+            for service_dir, services in items[i:i + shard_size]:
+                for service_name, service in services.items():
+                    service = copy.deepcopy(service)
+                    # paths relative to the directory of stack file, which is at the same depth as IOC directories.
+                    for volume in service['volumes']:
+                        if volume['source'] == '.':
+                            volume['source'] = f'../{service_dir}'
+                    yaml_data['services'][service_name] = service
+            shards[f'{prefix}-{i // shard_size}'] = yaml_data
+
+    try_makedirs(shard_path, verbose=verbose)
+    for item in os.listdir(shard_path):
+        if item.endswith('.yaml') and item[:-len('.yaml')] not in shards:
+            file_remove(os.path.join(shard_path, item), verbose=verbose)
+    for name, yaml_data in shards.items():
+        file_path = os.path.join(shard_path, f'{name}.yaml')
+        swarm_file_hash = get_swarm_file_hash(yaml_data)
+        if read_swarm_file_hash(file_path) == swarm_file_hash:
+            if verbose:
+                print(f'gen_swarm_files: Sharded stack file "{name}" is up to date, skipped.')
+            continue
+        write_swarm_file(file_path, yaml_data, swarm_file_hash)
+        print(f'gen_swarm_files: Create sharded stack file "{name}" with {len(yaml_data["services"])} services.')
+
+
+def get_swarm_file_hash(yaml_data):
+    return hashlib.sha256(json.dumps(yaml_data, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def read_swarm_file_hash(file_path):
+    """
+    Return hash recorded in the first line of swarm file, or "" if not recorded.
+    """
+    try:
+        with open(file_path, 'r') as f:
+            line = f.readline()
+    except OSError:
+        return ''
+    if line.startswith(SWARM_FILE_HASH_PREFIX):
+        return line[len(SWARM_FILE_HASH_PREFIX):].strip()
+    return ''
+
+
+def write_swarm_file(file_path, yaml_data, swarm_file_hash):
+    if os.path.exists(file_path):
+        file_remove(file_path, verbose=False)
+    with open(file_path, 'w') as file:
+        file.write(f'{SWARM_FILE_HASH_PREFIX}{swarm_file_hash}\n')
+        yaml.dump(yaml_data, file, default_flow_style=False)
+    # set readonly permission.
+    os.chmod(file_path, 0o444)
+
+
+def get_all_ioc(dir_path=None, from_list=None, read_mode=False, rebuild_index=False, workers=None, lazy=False,
+                verbose=False):
     """
     Get IOC projects at given path from given name list. Return all IOC projects if name list not given.
+    IOC projects in repository are initialized from repository index in read-only mode.
+    IOC projects are loaded concurrently, output of each loading is printed in the order of results.
 
     :param dir_path: top path to find all ioc projects
     :param from_list: return ioc projects from given list
     :param read_mode: whether to initialize an IOC in read-only mode
+    :param rebuild_index: whether to discard repository index and parse all IOC projects again
+    :param workers: number of threads used for loading, default IOC_LOAD_WORKERS, 1 to load one by one
+    :param lazy: in read-only mode, return IOC projects without loading any file, see preload_ioc()
     :param verbose: verbosity
     :return: a list of IOC class objects.
     """
     ioc_list = []
     if not dir_path:
-        try_makedirs(REPOSITORY_PATH, verbose=verbose)
+        if read_mode:
+            if not os.path.isdir(REPOSITORY_PATH):
+                return ioc_list
+        else:
+            try_makedirs(REPOSITORY_PATH, verbose=verbose)
         dir_path = REPOSITORY_PATH
-    items = os.listdir(dir_path)
+    index = None
+    if read_mode and os.path.normpath(dir_path) == os.path.normpath(REPOSITORY_PATH):
+        index = RepositoryIndex(dir_path=dir_path, verbose=verbose)
+        if rebuild_index:
+            index.rebuild()
+    with os.scandir(dir_path) as it:
+        # hidden directories such as RESTORE_STAGING_DIR are not IOC projects.
+        items = [entry.name for entry in it if entry.is_dir() and not entry.name.startswith('.')]
     if from_list:
-        temp_items = []
-        for i in items:
-            if i in from_list:
-                temp_items.append(i)
-        else:
-            items = temp_items
+        from_list = set(from_list)
+        items = [item for item in items if item in from_list]
+    elif index:
+        index.prune(items)
     items.sort()  # sort according to name string.
-    for ioc_name in items:
-        subdir_path = os.path.join(dir_path, ioc_name)
-        if os.path.isdir(subdir_path):
-            ioc_temp = IOC(dir_path=subdir_path, read_mode=read_mode, verbose=verbose)
-            ioc_list.append(ioc_temp)
+
+    if read_mode:
+        # initialization in read-only mode does not load any file.
+        for ioc_name in items:
+            ioc_list.append(IOC(dir_path=os.path.join(dir_path, ioc_name), read_mode=True, verbose=verbose,
+                                index=index))
+        if not lazy:
+            preload_ioc(ioc_list, workers=workers)
+        return ioc_list
+
+    def load_ioc(ioc_name):
+        return IOC(dir_path=os.path.join(dir_path, ioc_name), read_mode=False, verbose=verbose)
+
+    if workers is None:
+        workers = IOC_LOAD_WORKERS
+    for ioc_name, ioc_temp, output, exception in concurrent_call(load_ioc, items, workers):
+        if output:
+            print(output, end='')
+        if exception is not None:
+            print(f'get_all_ioc: Failed. Exception raised while initializing IOC "{ioc_name}".')
+            raise exception
+        ioc_list.append(ioc_temp)
     return ioc_list
 
 
-def repository_backup(backup_mode, backup_dir, verbose):
+def preload_ioc(ioc_list, workers=None):
+    """
+    Load files of IOC projects initialized in read-only mode concurrently, and save repository index they use.
+
+    :param ioc_list: list of IOC class objects.
+    :param workers: number of threads used for loading, default IOC_LOAD_WORKERS, 1 to load one by one
+    """
+    if workers is None:
+        workers = IOC_LOAD_WORKERS
+    for ioc_temp, _, output, exception in concurrent_call(IOC.load, ioc_list, workers):
+        if output:
+            print(output, end='')
+        if exception is not None:
+            print(f'preload_ioc: Failed. Exception raised while loading IOC "{ioc_temp.name}".')
+            raise exception
+    for index in {id(ioc_temp.index): ioc_temp.index for ioc_temp in ioc_list if ioc_temp.index}.values():
+        index.save()
+
+
+def prune_snapshot_objects(verbose=False):
+    """
+    Remove objects in snapshot object store that no snapshot manifest refers to.
+    """
+    referenced = set()
+    if not os.path.isdir(SNAPSHOT_PATH):
+        return
+    for item in os.listdir(SNAPSHOT_PATH):
+        try:
+            with open(os.path.join(SNAPSHOT_PATH, item, SNAPSHOT_MANIFEST_FILE), 'r') as f:
+                referenced.update(entry['hash'] for entry in json.load(f)['files'].values())
+        except FileNotFoundError:
+            continue
+        except (OSError, ValueError, KeyError) as e:
+            # objects referred by an unreadable manifest can not be told, so nothing is removed.
+            print(f'prune_snapshot_objects: Failed to read snapshot manifest of "{item}", {e}. Pruning skipped.')
+            return
+    ObjectStore(SNAPSHOT_OBJECTS_PATH).prune(referenced, verbose=verbose)
+
+
+def get_export_manifest_file(top_path):
+    """
+    Return path of manifest file of exported files in running dir of an IOC project.
+    """
+    return os.path.join(top_path, EXPORT_VERSIONS_DIR, PROJECT_MANIFEST_FILE)
+
+
+def build_export_manifest(config_file, settings_path, startup_path, recorded=()):
+    """
+    Build manifest with hashes of config file, settings and startup files of an IOC project.
+
+    :param config_file: path of config file.
+    :param settings_path: path of settings dir.
+    :param startup_path: path of startup dir.
+    :param recorded: manifests recorded before, hashes of files not changed since then are reused.
+    :return: dict of "ioc.ini", "settings/..." and "startup/..." to manifest entry.
+    """
+    manifest = {}
+    entry = refresh_entry(config_file, [item.get(IOC_CONFIG_FILE) for item in recorded])
+    if entry:
+        manifest[IOC_CONFIG_FILE] = entry
+    manifest.update(refresh_manifest(settings_path, recorded, 'settings/'))
+    manifest.update(refresh_manifest(startup_path, recorded, 'startup/'))
+    return manifest
+
+
+def list_export_versions(top_path):
+    """
+    Return names of exported versions in running dir of an IOC project, from the oldest to the newest.
+    """
+    versions_path = os.path.join(top_path, EXPORT_VERSIONS_DIR)
+    if not os.path.isdir(versions_path):
+        return []
+    return sorted(item for item in os.listdir(versions_path) if os.path.isdir(os.path.join(versions_path, item)))
+
+
+def get_export_version(top_path):
+    """
+    Return name of exported version currently used in running dir of an IOC project, None if not versioned.
+    """
+    try:
+        return os.path.basename(os.readlink(os.path.join(top_path, EXPORT_CURRENT_LINK)))
+    except OSError:
+        return None
+
+
+def prune_export_versions(top_path, keep=None, verbose=False):
+    """
+    Remove old exported versions in running dir of an IOC project, the newest ones and current one are kept.
+
+    :param top_path: running dir of IOC project.
+    :param keep: number of versions to keep, default EXPORT_VERSIONS_KEEP.
+    :param verbose: verbosity.
+    """
+    keep = keep if keep else EXPORT_VERSIONS_KEEP
+    current_version = get_export_version(top_path)
+    versions = list_export_versions(top_path)
+    for version in versions[:-keep]:
+        if version != current_version:
+            dir_remove(os.path.join(top_path, EXPORT_VERSIONS_DIR, version), verbose=verbose)
+
+
+def generate_ioc_files(name, export=False, force=False, force_overwrite=False, verbose=False):
+    """
+    Generate startup files of an IOC project in repository and optionally export them, with output captured.
+    This function is run in worker processes of batch_generate().
+
+    :return: (name, result, output, elapsed seconds), result is one of "generated", "exported", "skipped"
+        and "failed".
+    """
+    start = time.perf_counter()
+    with io.StringIO() as buf, contextlib.redirect_stdout(buf):
+        try:
+            ioc_temp = IOC(dir_path=os.path.join(REPOSITORY_PATH, name), verbose=verbose)
+            if not force and ioc_temp.startup_files_up_to_date(ioc_temp.get_startup_fingerprint()):
+                print(f'IOC("{name}").generate_startup_files: Skipped. Startup files are up to date.')
+                result = 'skipped'
+            elif ioc_temp.generate_startup_files(force=True):
+                result = 'generated'
+            else:
+                result = 'failed'
+            if export and result != 'failed':
+                result = 'exported' if ioc_temp.export_for_mount(force_overwrite=force_overwrite) else 'failed'
+        except Exception as e:
+            print(f'generate_ioc_files: Failed. Exception "{e}" occurs while operating IOC "{name}".')
+            result = 'failed'
+        output = buf.getvalue()
+    return name, result, output, time.perf_counter() - start
+
+
+def batch_generate(names, export=False, force=False, force_overwrite=False, workers=None, verbose=False):
+    """
+    Generate startup files of IOC projects in a process pool, and optionally export them.
+
+    Each IOC project is handled by one worker process, which only writes files of its own project.
+    Output of each IOC project is buffered and printed in the order of given names, failure of an IOC project
+    does not stop the others, and a summary with time of each IOC project is printed at the end.
+
+    :param names: names of IOC projects in repository.
+    :param export: export startup files after generating.
+    :param force: generate startup files even if they are up to date.
+    :param force_overwrite: overwrite when exporting, see IOC.export_for_mount().
+    :param workers: number of worker processes, default IOC_GENERATE_WORKERS, 1 to generate one by one.
+    :param verbose: verbosity.
+    :return: list of (name, result, output, elapsed seconds), see generate_ioc_files().
+    """
+    workers = workers if workers else IOC_GENERATE_WORKERS
+    names = sorted(set(names))
+    operation_log_iocs(names)
+    start_time = time.perf_counter()
+    print(f'batch_generate: Start to generate {len(names)} IOC projects, {min(workers, len(names))} at once.')
+    res = []
+    if workers <= 1 or len(names) <= 1:
+        for name in names:
+            res.append(generate_ioc_files(name, export, force, force_overwrite, verbose))
+            print(res[-1][2], end='')
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(generate_ioc_files, name, export, force, force_overwrite, verbose)
+                       for name in names]
+            for name, future in zip(names, futures):
+                try:
+                    res.append(future.result())
+                except Exception as e:
+                    res.append((name, 'failed', f'batch_generate: Failed. Worker process of IOC "{name}" '
+                                                f'exited abnormally, {e}.\n', 0))
+                print(res[-1][2], end='', flush=True)
+    total_time = time.perf_counter() - start_time
+
+    raw_print = [["IOC", "Result", "Time(s)"], ]
+    for name, result, output, elapsed in res:
+        raw_print.append([name, result, f'{elapsed:.2f}'])
+    if len(raw_print) > 1:
+        print('')
+        print(tabulate(raw_print, headers="firstrow", tablefmt='plain', disable_numparse=True))
+        print('')
+    # up-to-date IOC projects are still exported, so there is nothing skipped when exporting.
+    counts = {key: len([item for item in res if item[1] == key])
+              for key in (('exported', 'failed') if export else ('generated', 'skipped', 'failed'))}
+    print(f'batch_generate: Finished in {total_time:.1f}s, '
+          f'{", ".join(f"{value} {key}" for key, value in counts.items())}.')
+    return res
+
+
+def failed_check_report(name, error):
+    report = {'name': name, 'state': None, 'status': None}
+    for key in ('snapshot', 'running'):
+        report[key] = dict(consistent=False, checked=False, result='', changed=[], missing=[], untracked=[])
+    report['error'] = f'{error}'
+    return report
+
+
+def check_ioc_project(name, print_info=False, verbose=False):
+    """
+    Run checks of an IOC project in repository with output captured.
+    This function is run in worker processes of batch_check().
+
+    :return: (report, output), report is a dict of "name", "state", "status", "snapshot" and "running" results,
+        each result has "consistent", "checked", "result" and lists of "changed", "missing" and "untracked" files,
+        with "elapsed" seconds of checking and "error" message if exception occurs.
+    """
+    start = time.perf_counter()
+    with io.StringIO() as buf, contextlib.redirect_stdout(buf):
+        try:
+            ioc_temp = IOC(dir_path=os.path.join(REPOSITORY_PATH, name), read_mode=True, verbose=verbose)
+            report = ioc_temp.project_check(print_info=print_info)
+            report['error'] = None
+        except Exception as e:
+            print(f'check_ioc_project: Failed. Exception "{e}" occurs while checking IOC "{name}".')
+            report = failed_check_report(name, e)
+        output = buf.getvalue()
+    report['elapsed'] = round(time.perf_counter() - start, 3)
+    return report, output
+
+
+def check_report_failed(report, fail_on):
+    """
+    Return whether check report of an IOC project fails given policy.
+
+    :param report: report returned by check_ioc_project().
+    :param fail_on: "never", "snapshot", "running" or "any". checks that can not be done for project state,
+        such as running files of project not exported, are not failures, while exceptions always are.
+    """
+    if fail_on == 'never':
+        return False
+    if report['error']:
+        return True
+    keys = ('snapshot', 'running') if fail_on == 'any' else (fail_on,)
+    return any(report[key]['checked'] and not report[key]['consistent'] for key in keys)
+
+
+def batch_check(names, print_info=False, workers=None, report_format=None, report_file=None, fail_on='never',
+                not_found=None, verbose=False):
+    """
+    Check IOC projects in a process pool and optionally write a machine-readable report.
+
+    Output of each IOC project is printed in the order of given names, unless report is written to stdout.
+
+    :param names: names of IOC projects in repository.
+    :param print_info: print differences found.
+    :param workers: number of worker processes, default IOC_GENERATE_WORKERS, 1 to check one by one.
+    :param report_format: "json" for a document of all IOC projects, "ndjson" for one line per IOC project.
+    :param report_file: path of report file, "-" or None for stdout.
+    :param fail_on: policy of exit code, see check_report_failed().
+    :param not_found: names of IOC projects requested but not found in repository, which are reported as failed.
+    :param verbose: verbosity.
+    :return: exit code, 1 if any IOC project fails given policy, otherwise 0.
+    """
+    workers = workers if workers else IOC_GENERATE_WORKERS
+    names = sorted(set(names))
+    # output of checks is not mixed into report on stdout.
+    quiet = report_format and report_file in (None, '-')
+    start_time = time.perf_counter()
+    if not quiet:
+        print(f'batch_check: Start to check {len(names)} IOC projects, {min(workers, len(names))} at once.')
+    reports = []
+    if workers <= 1 or len(names) <= 1:
+        for name in names:
+            report, output = check_ioc_project(name, print_info, verbose)
+            reports.append(report)
+            if not quiet:
+                print(output, end='')
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(check_ioc_project, name, print_info, verbose) for name in names]
+            for name, future in zip(names, futures):
+                try:
+                    report, output = future.result()
+                except Exception as e:
+                    output = f'batch_check: Failed. Worker process of IOC "{name}" exited abnormally, {e}.\n'
+                    report = failed_check_report(name, e)
+                    report['elapsed'] = 0
+                reports.append(report)
+                if not quiet:
+                    print(output, end='', flush=True)
+    for name in sorted(set(not_found or [])):
+        reports.append(failed_check_report(name, 'IOC project not found'))
+        reports[-1]['elapsed'] = 0
+    total_time = time.perf_counter() - start_time
+
+    if report_format:
+        if report_format == 'json':
+            content = json.dumps({'time': datetime.datetime.now().isoformat(timespec='seconds'),
+                                  'elapsed': round(total_time, 3), 'fail_on': fail_on,
+                                  'failed': [item['name'] for item in reports if check_report_failed(item, fail_on)],
+                                  'iocs': reports}, indent=1) + '\n'
+        else:
+            content = ''.join(json.dumps(item) + '\n' for item in reports)
+        if quiet:
+            print(content, end='')
+        else:
+            try:
+                with open(report_file, 'w') as f:
+                    f.write(content)
+            except OSError as e:
+                print(f'batch_check: Failed to write report file "{report_file}", {e}.')
+                return 1
+            print(f'batch_check: Report written to "{report_file}".')
+
+    failed = [item['name'] for item in reports if check_report_failed(item, fail_on)]
+    if not quiet:
+        counts = {
+            'checked': len(reports),
+            'inconsistent': len([item for item in reports if not item['error'] and
+                                 any(item[key]['checked'] and not item[key]['consistent']
+                                     for key in ('snapshot', 'running'))]),
+            'failed': len([item for item in reports if item['error']]),
+        }
+        print(f'batch_check: Finished in {total_time:.1f}s, '
+              f'{", ".join(f"{value} {key}" for key, value in counts.items())}.')
+        if failed:
+            print(f'batch_check: IOC projects failing "--fail-on {fail_on}": {", ".join(failed)}.')
+    return 1 if failed else 0
+
+
+def iter_backup_members(ioc_item, backup_mode, top_name, backup_filter=None):
+    """
+    Yield (path, arcname, rel_path) of files of an IOC project to back up, see iter_tree().
+    Members are laid out as "<top_name>/<IOC>/ioc.ini", ".info.ini", "src/" and "project/" in "all" mode.
+    """
+    ioc_arcname = f'{top_name}/{ioc_item.name}'
+    yield ioc_item.dir_path, ioc_arcname, ''
+    # config file and state info file are backed up anyway.
+    yield ioc_item.config_file_path, f'{ioc_arcname}/{IOC_CONFIG_FILE}', IOC_CONFIG_FILE
+    yield ioc_item.state_manager.info_file_path, f'{ioc_arcname}/{IOC_STATE_INFO_FILE}', IOC_STATE_INFO_FILE
+    sources = [(ioc_item.src_path, 'src')]
+    if backup_mode == 'all':
+        yield ioc_item.project_path, f'{ioc_arcname}/project', 'project'
+        # startup files from repository, log and settings from running data.
+        sources.extend([
+            (ioc_item.startup_path, 'project/startup'),
+            (os.path.join(ioc_item.dir_path_for_mount, 'log'), 'project/log'),
+            (os.path.join(ioc_item.dir_path_for_mount, 'settings'), 'project/settings'),
+        ])
+    for path, rel_path in sources:
+        if os.path.exists(path):
+            yield from iter_tree(path, f'{ioc_arcname}/{rel_path}', backup_filter, rel_path)
+
+
+def repository_backup(backup_mode, backup_dir, include=None, exclude=None, incremental=False, keep=None,
+                      compression='gzip', workers=None, verbose=False):
     """
     Generate backup file of IOC project files into datetime tgz file.
 
+    Files are streamed from their locations into the archive, no temporary copy is made.
+    Incremental backups are written into object store of backup directory instead, see StoreWriter.
+
     :param backup_mode: "src" to back up only config file and source files, "all" to back up all files.
     :param backup_dir: relative path or absolute path to store backup files.
+    :param include: patterns of files in "src" and "project" to back up, see BackupFilter.
+    :param exclude: patterns of files and directories in "src" and "project" not to back up, see BackupFilter.
+    :param incremental: write only content not stored by previous incremental backups.
+    :param keep: number of newest incremental backups to keep after backing up, the others are pruned.
+    :param compression: "gzip" or "zstd" for full backups, see ArchiveWriter.
+    :param workers: number of threads compressing full backups, default BACKUP_COMPRESS_WORKERS.
     :param verbose:
-    :return:
+    :return: whether backup is created, True if there is no IOC project to back up.
     """
     ioc_list = get_all_ioc(read_mode=True)
     if ioc_list:
@@ -1507,86 +2276,95 @@ def repository_backup(backup_mode, backup_dir, verbose):
         if not os.path.exists(backup_path):
             try_makedirs(backup_path, verbose)
         now_time = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-        tar_dir = os.path.join(backup_path, now_time)
+        backup_filter = BackupFilter(include, exclude)
+        progress = BackupProgress('repository_backup')
 
+        writer = None
         try:
-            for ioc_item in ioc_list:
-                # make temporary directory.
-                ioc_tar_dir = os.path.join(tar_dir, ioc_item.name)
-                try_makedirs(ioc_tar_dir, verbose)
-                # copy config file, state info file and "src" dir anyway.
-                file_copy(ioc_item.config_file_path, os.path.join(ioc_tar_dir, IOC_CONFIG_FILE), mode='rw',
-                          verbose=verbose)
-                file_copy(ioc_item.state_manager.info_file_path, os.path.join(ioc_tar_dir, IOC_STATE_INFO_FILE),
-                          mode='rw',
-                          verbose=verbose)
-                dir_copy(ioc_item.src_path, os.path.join(ioc_tar_dir, 'src'), verbose=verbose)
-                # copy "project" dir if backup_mode == "all".
-                if backup_mode == 'all':
-                    # copy from repository
-                    dir_copy(ioc_item.startup_path, os.path.join(ioc_tar_dir, 'project', 'startup'), verbose=verbose)
-                    # copy from running data
-                    ioc_run_path = os.path.join(MOUNT_PATH, ioc_item.get_config('host'), ioc_item.name)
-                    dir_copy(os.path.join(ioc_run_path, 'log'), os.path.join(ioc_tar_dir, 'project', 'log'),
-                             verbose=verbose)
-                    dir_copy(os.path.join(ioc_run_path, 'settings'), os.path.join(ioc_tar_dir, 'project', 'settings'),
-                             verbose=verbose)
+            if incremental:
+                writer = StoreWriter(backup_path, now_time, progress)
             else:
-                with tarfile.open(os.path.join(backup_path, f'{now_time}.ioc.tar.gz'), "w:gz") as tar:
-                    tar.add(tar_dir, arcname=os.path.basename(tar_dir))
-                dir_remove(tar_dir, verbose=verbose)
-                print(f'repository_backup: Finished. Backup file created at {backup_path} in "{backup_mode}" mode.')
+                suffix = BACKUP_ZSTD_ARCHIVE_SUFFIX if compression == 'zstd' else BACKUP_ARCHIVE_SUFFIX
+                writer = ArchiveWriter(os.path.join(backup_path, f'{now_time}{suffix}'), progress,
+                                       compression=compression, workers=workers)
+            writer.add(backup_path, now_time)
+            for ioc_item in ioc_list:
+                for path, arcname, rel_path in iter_backup_members(ioc_item, backup_mode, now_time, backup_filter):
+                    if arcname is None:
+                        if verbose:
+                            print(f'repository_backup: Skip "{path}" by filter.')
+                        progress.update(skipped=True)
+                        continue
+                    if rel_path == IOC_CONFIG_FILE and not os.path.isfile(path):
+                        raise FileNotFoundError(f'config file "{path}" lost')
+                    if not os.path.lexists(path):
+                        continue
+                    if writer.add(path, arcname) and verbose:
+                        print(f'repository_backup: "{path}" shrank while being backed up, padded with zeros.')
+            writer.commit()
+            print(f'repository_backup: Finished. {"Incremental backup" if incremental else "Backup file"} '
+                  f'created at {backup_path} in "{backup_mode}" mode, {progress}.')
         except Exception as e:
             print(f'repository_backup: Failed. Exception raised: {e}.')
-            dir_remove(tar_dir, verbose=verbose)
+            if writer is not None:
+                writer.abort()
+            return False
+        if incremental and keep:
+            removed = prune_backups(backup_path, keep, verbose=verbose)
+            if removed:
+                print(f'repository_backup: {removed} old incremental backups pruned, {keep} kept.')
     else:
         print(f'repository_backup: Skipped. No IOC project in repository.')
+    return True
 
 
-def restore_backup(backup_path, force_overwrite, verbose):
+def restore_backup(backup_path, force_overwrite, at=None, only=None, verbose=False):
     """
-    Restore IOC projects into repository from tgz backup file.
+    Restore IOC projects into repository from tgz backup file or incremental backup.
+
+    Backup is read in one pass, files of each IOC project are written into a staging directory in repository
+    and then switched in by renaming, no temporary directory outside repository is used.
 
-    :param backup_path: path of tgz backup file.
+    :param backup_path: path of tgz backup file or manifest file of incremental backup, or directory of backups
+        to restore the latest backup made at or before "at".
     :param force_overwrite: whether to force overwrite when existing IOC project conflicts with the backup file.
+    :param at: point in time to restore, see find_backup(). used when backup_path is a directory.
+    :param only: names of IOC projects to restore, all IOC projects in backup if not given.
     :param verbose:
-    :return:
+    :return: whether backup is restored, False if any IOC project given by "only" is not found in backup.
     """
     extract_path = relative_and_absolute_path_to_abs(backup_path)
+    if os.path.isdir(extract_path):
+        found_path = find_backup(extract_path, at)
+        if not found_path:
+            print(f'restore_backup: Failed. No backup made at or before "{at}" found in "{extract_path}".'
+                  if at else f'restore_backup: Failed. No backup found in "{extract_path}".')
+            return False
+        extract_path = found_path
+        print(f'restore_backup: Backup "{os.path.basename(extract_path)}" chosen.')
     if not os.path.isfile(extract_path):
         print(f'restore_backup: Failed. File "{extract_path}" to extract not exists.')
-        return
-
-    # make temporary directory.
-    temp_dir = relative_and_absolute_path_to_abs(f'/tmp/tar_temp_{datetime.datetime.now().strftime("%Y%m%d%H%M%S")}')
-    try_makedirs(temp_dir, verbose=verbose)
-    # extract tgz files into temporary directory.
-    try:
-        with tarfile.open(extract_path, 'r:gz') as tar:
-            tar.extractall(temp_dir)
-    except Exception as e:
-        print(f'restore_backup: Failed. Failed to extract "{extract_path}", {e}.')
-        dir_remove(temp_dir, verbose=verbose)
-        return
-    else:
-        if verbose:
-            print(f'restore_backup: File extracted at {temp_dir}.')
-        temp_in_dir = os.path.join(temp_dir, os.listdir(temp_dir)[0])
-        print(f'restore_backup: Start restoring from backup file "{os.path.basename(temp_in_dir)}".')
+        return False
 
+    # repository may not exist yet, such as restoring on a new installation.
+    try_makedirs(REPOSITORY_PATH, verbose=verbose)
+    # IOC projects existed are found by directory scan, no IOC project is loaded.
+    ioc_existed = [item for item in os.listdir(REPOSITORY_PATH)
+                   if os.path.isfile(os.path.join(REPOSITORY_PATH, item, IOC_CONFIG_FILE))]
+    only = set(only) if only else None
+    found = set()
+    staging_path = os.path.join(REPOSITORY_PATH, RESTORE_STAGING_DIR)
     try:
-        # restore IOC projects. if IOC conflicts, skip or overwrite according to force_overwrite.
-        ioc_existed = [ioc_item.name for ioc_item in get_all_ioc(read_mode=True)]
-        for ioc_item in os.listdir(temp_in_dir):
-            backup_ioc_dir = os.path.join(temp_in_dir, ioc_item)
-            current_ioc_dir = os.path.join(REPOSITORY_PATH, ioc_item)
-            restore_flag = False
-            if os.path.isdir(backup_ioc_dir) and os.path.exists(os.path.join(backup_ioc_dir, IOC_CONFIG_FILE)):
-                if ioc_item not in ioc_existed:
-                    print(f'restore_backup: Restoring IOC project "{ioc_item}".')
-                    dir_copy(backup_ioc_dir, current_ioc_dir, verbose=verbose)
-                    restore_flag = True
-                elif ioc_item in ioc_existed and not force_overwrite:
+        with open_backup_iocs(extract_path) as backup_iocs:
+            for backup_name, ioc_item, extract in backup_iocs:
+                if not found:
+                    print(f'restore_backup: Start restoring from backup file "{backup_name}".')
+                found.add(ioc_item)
+                if only is not None and ioc_item not in only:
+                    continue
+                # restore IOC projects. if IOC conflicts, skip or overwrite according to force_overwrite.
+                current_ioc_dir = os.path.join(REPOSITORY_PATH, ioc_item)
+                if ioc_item in ioc_existed and not force_overwrite:
                     while True:
                         ans = input(f'restore_backup: "{ioc_item}" already exists, overwrite '
                                     f'it(this will remove the original IOC project files)?[y|n]:')
@@ -1600,27 +2378,131 @@ def restore_backup(backup_path, force_overwrite, verbose):
                             break
                         else:
                             print(f'restore_backup: wrong input, please enter your answer again.')
-                    if overwrite_flag:
-                        dir_copy(backup_ioc_dir, current_ioc_dir, verbose=verbose)
-                        restore_flag = True
-                else:
+                    if not overwrite_flag:
+                        continue
+                # files are written into staging directory, and switched in only if backup of IOC is valid.
+                backup_ioc_dir = os.path.join(staging_path, ioc_item)
+                if os.path.lexists(backup_ioc_dir):
+                    dir_remove(backup_ioc_dir, verbose=verbose)
+                extract(backup_ioc_dir)
+                if not os.path.isfile(os.path.join(backup_ioc_dir, IOC_CONFIG_FILE)):
+                    if verbose:
+                        print(f'restore_backup: Skip invalid directory "{ioc_item}".')
+                    dir_remove(backup_ioc_dir, verbose=verbose)
+                    continue
+                if ioc_item in ioc_existed:
                     print(f'restore_backup: Restoring IOC project "{ioc_item}", local project will be overwrite.')
-                    dir_copy(backup_ioc_dir, current_ioc_dir, verbose=verbose)
-                    restore_flag = True
-            else:
-                if verbose:
-                    print(f'restore_backup: Skip invalid directory "{ioc_item}".')
-            if restore_flag:
+                    old_ioc_dir = os.path.join(staging_path, f'{ioc_item}.old')
+                    os.rename(current_ioc_dir, old_ioc_dir)
+                    os.rename(backup_ioc_dir, current_ioc_dir)
+                    dir_remove(old_ioc_dir, verbose=verbose)
+                else:
+                    print(f'restore_backup: Restoring IOC project "{ioc_item}".')
+                    os.rename(backup_ioc_dir, current_ioc_dir)
                 print(f'restore_backup: Restoring IOC project "{ioc_item}" finished.')
-                temp_ioc = IOC(dir_path=current_ioc_dir, read_mode=True, verbose=verbose)
+                operation_log_iocs([ioc_item])
                 # set status for restored IOC.
-                temp_ioc.state_manager.set_config('status', 'restored')
-                temp_ioc.write_config()
+                state_manager = IocStateManager(dir_path=current_ioc_dir, verbose=verbose)
+                state_manager.set_config('status', 'restored')
+                state_manager.write_config()
     except Exception as e:
-        # remove temporary directory finally.
         print(f'\nrestore_backup: Falided. Exception raised: {e}.')
-        dir_remove(temp_dir, verbose=verbose)
+        return False
     else:
-        # remove temporary directory finally.
+        for ioc_item in sorted(only - found) if only else []:
+            print(f'restore_backup: IOC project "{ioc_item}" not found in backup file.')
         print(f'restore_backup: Restoring Finished.')
-        dir_remove(temp_dir, verbose=verbose)
+        return not only or only <= found
+    finally:
+        # remove staging directory finally.
+        if os.path.isdir(staging_path):
+            dir_remove(staging_path, verbose=verbose)
+
+
+def format_backup_time(time_str):
+    return f'{time_str[:4]}-{time_str[4:6]}-{time_str[6:8]} {time_str[8:10]}:{time_str[10:12]}:{time_str[12:]}'
+
+
+def show_backups(backup_dir, ioc_name=None, file_pattern=None, verbose=False):
+    """
+    List backups in backup directory by their catalog files, backups are not decompressed. Catalog of a backup
+    made without one is built once by reading the backup.
+
+    :param backup_dir: relative path or absolute path of backup directory.
+    :param ioc_name: list only backups containing given IOC project, and show main fields of its config file.
+    :param file_pattern: list versions of files matching given shell-style pattern, patterns with "/" match path
+        relative to IOC project, such as "src/*.db", others match file name. each version is listed with the first
+        and the last backup containing it.
+    :param verbose:
+    :return:
+    """
+    start_time = time.perf_counter()
+    backup_path = relative_and_absolute_path_to_abs(backup_dir, IOC_BACKUP_DIR)
+    backups = list_backups(backup_path)
+    if not backups:
+        print(f'show_backups: No backup found in "{backup_path}".')
+        return
+    catalogs = []
+    for time_str, path in backups:
+        catalog = load_catalog(path)
+        if catalog is None:
+            print(f'show_backups: Building catalog of backup "{os.path.basename(path)}".')
+            try:
+                catalog = build_catalog(path)
+            except Exception as e:
+                print(f'show_backups: Failed to build catalog of backup "{os.path.basename(path)}", {e}.')
+                continue
+        catalogs.append((time_str, path, catalog))
+
+    if file_pattern:
+        # versions of each file in order of backups, keyed by hash.
+        versions = {}
+        for time_str, path, catalog in catalogs:
+            for name, ioc in catalog.items():
+                if ioc_name and name != ioc_name:
+                    continue
+                for rel_path, (size, file_hash, mtime) in ioc['files'].items():
+                    if not BackupFilter.match_any(rel_path, [file_pattern]):
+                        continue
+                    file_versions = versions.setdefault((name, rel_path), {})
+                    if file_hash in file_versions:
+                        file_versions[file_hash][2] = time_str
+                        file_versions[file_hash][3] += 1
+                    else:
+                        file_versions[file_hash] = [size, time_str, time_str, 1]
+        raw_print = [["IOC", "File", "Hash", "Size", "First Backup", "Last Backup", "Backups"], ]
+        for (name, rel_path), items in sorted(versions.items()):
+            for file_hash, (size, first, last, count) in sorted(items.items(), key=lambda item: item[1][1]):
+                raw_print.append([name, rel_path, file_hash[:12], human_size(size), format_backup_time(first),
+                                  format_backup_time(last), count])
+    elif ioc_name:
+        raw_print = [["Backup", "Type", "Files", "Data", "Host", "Image", "Module"], ]
+        for time_str, path, catalog in catalogs:
+            if ioc_name not in catalog:
+                continue
+            files = catalog[ioc_name]['files']
+            config = catalog[ioc_name]['config']
+            raw_print.append([format_backup_time(time_str), backup_type(path), len(files),
+                              human_size(sum(item[0] for item in files.values())), config.get('host', ''),
+                              config.get('image', ''), config.get('module', '')])
+    else:
+        raw_print = [["Backup", "Type", "Size", "IOCs", "Files", "Data"], ]
+        for time_str, path, catalog in catalogs:
+            files = [item for ioc in catalog.values() for item in ioc['files'].values()]
+            raw_print.append([format_backup_time(time_str), backup_type(path),
+                              human_size(os.path.getsize(path)) if not path.endswith(BACKUP_MANIFEST_SUFFIX) else '-',
+                              len(catalog), len(files), human_size(sum(item[0] for item in files))])
+    if len(raw_print) > 1:
+        print(tabulate(raw_print, headers="firstrow", tablefmt='plain', disable_numparse=True))
+    elif file_pattern:
+        print(f'show_backups: No file matching "{file_pattern}" found in backups.')
+    else:
+        print(f'show_backups: IOC project "{ioc_name}" not found in backups.')
+    if verbose:
+        print(f'show_backups: {len(catalogs)} backups searched in {(time.perf_counter() - start_time) * 1000:.1f}ms.')
+
+
+def backup_type(backup_path):
+    if backup_path.endswith(BACKUP_MANIFEST_SUFFIX):
+        return 'incremental'
+    return 'zstd' if backup_path.endswith(BACKUP_ZSTD_ARCHIVE_SUFFIX) else 'gzip'
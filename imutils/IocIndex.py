@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import threading
+import configparser
+
+from imutils.IMConfig import (REPOSITORY_PATH, REPOSITORY_INDEX_PATH, REPOSITORY_INDEX_RACY_SECONDS,
+                              IOC_CONFIG_FILE, IOC_STATE_INFO_FILE)
+
+INDEX_FORMAT_VERSION = 1
+
+
+class RepositoryIndex:
+    def __init__(self, dir_path=None, index_path=None, verbose=False):
+        """
+        On-disk index of parsed IOC project files, keyed by mtime and size of those files.
+
+        Each entry keeps the parsed sections of config file, the parsed state info file and the file inventory of
+        "src/" directory, so that IOC projects whose files have not changed are not re-parsed.
+        Index file is read the first time an entry is requested.
+
+        :param dir_path: repository path the index is built for.
+        :param index_path: path of the index file.
+        :param verbose: verbosity.
+        """
+        self.dir_path = os.path.normpath(dir_path if dir_path else REPOSITORY_PATH)
+        self.index_path = index_path if index_path else REPOSITORY_INDEX_PATH
+        self.verbose = verbose
+        self.entries = {}
+        self.modified = False
+        self.loaded = False
+        self.existing_names = None
+        self.lock = threading.Lock()  # entries may be requested from several threads.
+
+    def load(self):
+        self.loaded = True
+        try:
+            with open(self.index_path, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f'RepositoryIndex.load: Failed to read index file "{self.index_path}", {e}. Index will be rebuilt.')
+            self.modified = True
+            return
+        if data.get('version') != INDEX_FORMAT_VERSION or data.get('repository') != self.dir_path:
+            if self.verbose:
+                print(f'RepositoryIndex.load: Index file "{self.index_path}" outdated, index will be rebuilt.')
+            self.modified = True
+            return
+        self.entries = data.get('entries', {})
+        if self.verbose:
+            print(f'RepositoryIndex.load: Load {len(self.entries)} entries from "{self.index_path}".')
+
+    def save(self):
+        if self.existing_names is not None:
+            if not self.loaded:
+                self.load()
+            for name in list(self.entries.keys()):
+                if name not in self.existing_names:
+                    del self.entries[name]
+                    self.modified = True
+            self.existing_names = None
+        if not self.modified:
+            return
+        data = {
+            'version': INDEX_FORMAT_VERSION,
+            'repository': self.dir_path,
+            'entries': self.entries,
+        }
+        temp_path = f'{self.index_path}.{os.getpid()}.tmp'
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(temp_path, self.index_path)
+        except Exception as e:
+            if self.verbose:
+                print(f'RepositoryIndex.save: Failed to write index file "{self.index_path}", {e}.')
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        else:
+            self.modified = False
+            if self.verbose:
+                print(f'RepositoryIndex.save: Save {len(self.entries)} entries to "{self.index_path}".')
+
+    def rebuild(self):
+        self.loaded = True
+        self.entries = {}
+        self.modified = True
+        if self.verbose:
+            print(f'RepositoryIndex.rebuild: Index of "{self.dir_path}" will be rebuilt.')
+
+    def prune(self, names):
+        """
+        Drop entries of IOC projects not in given names when saving.
+        """
+        self.existing_names = set(names)
+
+    def get_entry(self, name):
+        """
+        Return index entry of given IOC project, re-parse its files if they changed since last indexing.
+
+        :param name: name of IOC project directory in repository.
+        :return: dict with keys "stamps", "config", "state" and "src".
+        """
+        with self.lock:
+            if not self.loaded:
+                self.load()
+        ioc_dir = os.path.join(self.dir_path, name)
+        stamps = get_stamps(ioc_dir)
+        entry = self.entries.get(name)
+        if entry and not entry.get('racy') and entry.get('stamps') == stamps:
+            return entry
+        if self.verbose:
+            print(f'RepositoryIndex.get_entry: Parse files of IOC "{name}".')
+        entry = parse_entry(ioc_dir, stamps)
+        self.entries[name] = entry
+        self.modified = True
+        return entry
+
+
+def file_stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def get_stamps(ioc_dir):
+    return {
+        'config': file_stamp(os.path.join(ioc_dir, IOC_CONFIG_FILE)),
+        'state': file_stamp(os.path.join(ioc_dir, IOC_STATE_INFO_FILE)),
+        'src': file_stamp(os.path.join(ioc_dir, 'src')),
+    }
+
+
+def read_ini_sections(file_path, exists=True):
+    """
+    Parse an ini file into a dict of raw values.
+
+    :param file_path: path of ini file.
+    :param exists: whether the file is known to exist.
+    :return: (sections, error) where error is "" on success, "lost" or "unrecognized" on failure.
+    """
+    if not exists:
+        return None, 'lost'
+    conf = configparser.ConfigParser()
+    try:
+        if not conf.read(file_path):
+            return None, 'unrecognized'
+    except configparser.Error:
+        return None, 'unrecognized'
+    sections = {}
+    for section in conf.sections():
+        sections[section] = {option: conf.get(section, option, raw=True) for option in conf.options(section)}
+    return sections, ''
+
+
+def parse_entry(ioc_dir, stamps):
+    config, config_error = read_ini_sections(os.path.join(ioc_dir, IOC_CONFIG_FILE), stamps['config'] is not None)
+    state, state_error = read_ini_sections(os.path.join(ioc_dir, IOC_STATE_INFO_FILE), stamps['state'] is not None)
+    src = None
+    if stamps['src'] is not None:
+        try:
+            src = sorted(os.listdir(os.path.join(ioc_dir, 'src')))
+        except NotADirectoryError:
+            pass
+    # files modified right before parsing may be modified again within the same timestamp granularity,
+    # such entries are not trusted and will be re-parsed next time.
+    now_ns = time.time_ns()
+    racy = any(item and now_ns - item[0] < REPOSITORY_INDEX_RACY_SECONDS * 1e9 for item in stamps.values())
+    return {
+        'stamps': stamps,
+        'config': config,
+        'config_error': config_error,
+        'state': state,
+        'state_error': state_error,
+        'src': src,
+        'racy': racy,
+    }
+
+
+def conf_from_sections(sections):
+    conf = configparser.ConfigParser()
+    conf.read_dict(sections)
+    return conf
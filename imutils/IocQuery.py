@@ -0,0 +1,263 @@
+import re
+import fnmatch
+
+from imutils.IMError import IMValueError
+
+QUERY_OPERATORS = ('!=', '!~', '=', '~')
+QUERY_KEYWORDS = ('AND', 'OR', 'NOT')
+
+CONDITION_PATTERN = re.compile(r'^([A-Za-z_][\w\-]*(?:\.[\w\-]+)?)\s*(!=|!~|=|~)(.*)$', re.S)
+
+
+class Condition:
+    def __init__(self, section, option, operator, value):
+        """
+        A single "key=value" condition of a query.
+
+        Operator "=" matches exact value, or shell-style wildcards if value contains any of "*?[".
+        Operator "~" matches regular expression anywhere in value. "!=" and "!~" are their negations.
+        Option "name" matches IOC name, option "module" of section "IOC" matches each module listed.
+        Options not defined match no value, as the old filter does, so only negations match them.
+
+        :param section: section of option, "STATE" for state info of IOC project.
+        :param option: option name, or "name" for IOC name.
+        :param operator: one of "=", "!=", "~", "!~".
+        :param value: value to match.
+        """
+        self.section = section
+        self.option = option
+        self.negative = operator.startswith('!')
+        self.operator = operator.lstrip('!')
+        self.value = value
+        self.pattern = None
+        if self.operator == '~':
+            try:
+                self.pattern = re.compile(value)
+            except re.error as e:
+                raise IMValueError(f'Invalid regular expression "{value}", {e}.')
+        elif any(c in value for c in '*?['):
+            self.pattern = re.compile(fnmatch.translate(value))
+
+    def __repr__(self):
+        key = self.option if self.option == 'name' else f'{self.section}.{self.option}'
+        return f'{key}{"!" if self.negative else ""}{self.operator}{self.value}'
+
+    @property
+    def is_name(self):
+        return self.option == 'name'
+
+    @property
+    def is_module(self):
+        return self.section == 'IOC' and self.option == 'module'
+
+    def match(self, value):
+        """
+        :param value: value of option, None if option is not defined.
+        """
+        if value is None:
+            res = False
+        elif self.operator == '~':
+            res = bool(self.pattern.search(value))
+        elif self.is_module and self.value:
+            modules = [item.strip().lower() for item in value.split(',') if item.strip()]
+            if self.pattern:
+                res = any(self.pattern.match(item) for item in modules)
+            else:
+                # keep the behavior of old filter, which matches part of module name.
+                res = any(self.value.lower() in item for item in modules)
+        elif self.pattern:
+            res = bool(self.pattern.match(value))
+        elif self.is_name:
+            # keep the behavior of old filter, which matches part of IOC name.
+            res = self.value in value
+        else:
+            res = value == self.value
+        return res
+
+
+def parse_condition(condition, section='IOC'):
+    """
+    Parse a condition string such as "host=swarm", "DEPLOY.labels~test" or "name!=test*".
+
+    :param condition: condition string.
+    :param section: section used for keys without section.
+    :return: Condition object, or None if condition string is not valid.
+    """
+    match = CONDITION_PATTERN.match(condition.strip())
+    if not match:
+        return None
+    key, operator, value = match.group(1), match.group(2), match.group(3).strip()
+    if '.' in key:
+        section, option = key.split('.', maxsplit=1)
+    elif key.lower() == 'name':
+        option = 'name'
+    else:
+        option = key
+    return Condition(section=section.upper(), option=option.lower(), operator=operator, value=value)
+
+
+def parse_query(tokens, section='IOC', verbose=False):
+    """
+    Parse a query from tokens of command line.
+
+    Conditions are joined by "AND", "OR" and "NOT", with "AND" implied between adjacent conditions.
+    "NOT" binds tightest, then "AND", then "OR". Parentheses "(" and ")" group conditions.
+    Invalid conditions are skipped.
+
+    :param tokens: list of tokens such as ["host=swarm", "OR", "NOT", "image~beta"].
+    :param section: section used for keys without section.
+    :param verbose: verbosity.
+    :return: nested tuples of ("AND", [...]), ("OR", [...]), ("NOT", node) and Condition objects,
+        or None if no valid condition given.
+    """
+    items = []
+    for token in tokens:
+        token = token.strip()
+        if token.upper() in QUERY_KEYWORDS:
+            items.append(token.upper())
+        elif token in ('(', ')'):
+            items.append(token)
+        else:
+            condition = parse_condition(token, section=section)
+            if condition:
+                items.append(condition)
+            elif verbose:
+                print(f'Skip invalid condition "{token}".')
+    pos = 0
+
+    def peek():
+        return items[pos] if pos < len(items) else None
+
+    def parse_or():
+        nonlocal pos
+        nodes = [parse_and()]
+        while peek() == 'OR':
+            pos += 1
+            nodes.append(parse_and())
+        nodes = [node for node in nodes if node is not None]
+        if len(nodes) > 1:
+            return 'OR', nodes
+        return nodes[0] if nodes else None
+
+    def parse_and():
+        nonlocal pos
+        nodes = []
+        while peek() is not None and peek() not in ('OR', ')'):
+            if peek() == 'AND':
+                pos += 1
+                continue
+            nodes.append(parse_not())
+        nodes = [node for node in nodes if node is not None]
+        if len(nodes) > 1:
+            return 'AND', nodes
+        return nodes[0] if nodes else None
+
+    def parse_not():
+        nonlocal pos
+        item = peek()
+        if item is None:
+            raise IMValueError('Unexpected end of query.')
+        pos += 1
+        if item == 'NOT':
+            node = parse_not()
+            return ('NOT', node) if node is not None else None
+        elif item == '(':
+            node = parse_or()
+            if peek() != ')':
+                raise IMValueError('Missing ")" in query.')
+            pos += 1
+            return node
+        elif item in QUERY_KEYWORDS or item == ')':
+            raise IMValueError(f'Unexpected "{item}" in query.')
+        return item
+
+    res = parse_or()
+    if pos < len(items):
+        raise IMValueError(f'Unexpected "{items[pos]}" in query.')
+    return res
+
+
+def query_conditions(node):
+    if node is None:
+        return []
+    elif isinstance(node, Condition):
+        return [node]
+    elif node[0] == 'NOT':
+        return query_conditions(node[1])
+    else:
+        return [c for child in node[1] for c in query_conditions(child)]
+
+
+class IocQuery:
+    def __init__(self, ioc_list, load_func=None):
+        """
+        Evaluate parsed queries on a list of IOC objects.
+
+        Results are computed as sets of IOC names. IOC projects are loaded by load_func only when a condition
+        other than name is evaluated on them, and conditions on name are evaluated first to narrow down the
+        IOC projects to load. Unchanged IOC projects are loaded from repository index without parsing files.
+
+        :param ioc_list: list of IOC objects.
+        :param load_func: function to load a list of IOC objects before their configurations are read.
+        """
+        self.iocs = {ioc.name: ioc for ioc in ioc_list}
+        self.load_func = load_func
+        self.loaded = set()
+
+    def ensure_loaded(self, names):
+        names = [name for name in names if name not in self.loaded]
+        if not names:
+            return
+        ioc_list = [self.iocs[name] for name in sorted(names)]
+        if self.load_func:
+            self.load_func(ioc_list)
+        self.loaded.update(ioc.name for ioc in ioc_list)
+
+    def evaluate(self, node, universe=None):
+        """
+        :param node: parsed query.
+        :param universe: set of IOC names the result is limited to, all IOC names if not given.
+        :return: set of IOC names matching the query.
+        """
+        if universe is None:
+            universe = set(self.iocs.keys())
+        if node is None or not universe:
+            return set()
+        elif isinstance(node, Condition):
+            return self.evaluate_condition(node, universe)
+        elif node[0] == 'NOT':
+            return universe - self.evaluate(node[1], universe)
+        elif node[0] == 'AND':
+            # conditions on name cost no file reading, so they are evaluated first to narrow down the universe.
+            for child in sorted(node[1], key=lambda x: not all(c.is_name for c in query_conditions(x))):
+                universe = self.evaluate(child, universe)
+            return universe
+        else:
+            res = set()
+            for child in node[1]:
+                res |= self.evaluate(child, universe - res)
+            return res
+
+    def evaluate_condition(self, condition, universe):
+        if condition.is_name:
+            res = {name for name in universe if condition.match(name)}
+        else:
+            self.ensure_loaded(universe)
+            res = {name for name in universe
+                   if condition.match(get_ioc_value(self.iocs[name], condition.section, condition.option))}
+        if condition.negative:
+            res = universe - res
+        return res
+
+
+def get_ioc_value(ioc, section, option):
+    """
+    :return: value of option, None if option is not defined.
+    """
+    conf = ioc.state_manager.conf if section == 'STATE' else ioc.conf
+    if not conf or not conf.has_section(section):
+        return None
+    if conf.has_option(section, option):
+        return conf.get(section, option)
+    # IOC without module is matched by "module=", as the old filter does.
+    return '' if section == 'IOC' and option == 'module' else None
@@ -1,47 +1,299 @@
 import datetime
 import os
-import subprocess
-import docker
+import sys
+import time
+import yaml
+import shlex
+import shutil
+import asyncio
+import tarfile
 from tabulate import tabulate
 
 from imutils.IMConfig import *
+from imutils.IMError import IMDockerError, IMValueError
+from imutils.IMBackup import open_archive_for_reading, member_path as backup_member_path
+from imutils.IMManifest import human_size
+from imutils.DockerEngine import DockerEngine
 from imutils.IMFunc import relative_and_absolute_path_to_abs, try_makedirs, file_copy, dir_copy
 from imutils.ServiceDefinition import GlobalServicesList, LocalServicesList, CustomServicesList
 
 
+class SwarmStateSnapshot:
+    def __init__(self, verbose=False):
+        """
+        State of services and tasks of the stack, fetched from docker in bulk and shared by SwarmService objects,
+        so that reading properties of many services costs two concurrent API calls instead of some docker
+        commands for each service.
+
+        State is fetched on first access, and fetched again on next access after expire() called.
+
+        :param verbose: verbosity.
+        """
+        self.verbose = verbose
+        self.engine = DockerEngine()
+        self.services = {}  # service name: service object of docker API.
+        self.tasks = {}  # service name: list of task objects of docker API.
+        self.loaded = False
+
+    def load(self):
+        self.loaded = True
+        self.services = {}
+        self.tasks = {}
+        stack_label = f'com.docker.stack.namespace={PREFIX_STACK_NAME}'
+        try:
+            services, tasks = self.engine.run(self.engine.gather(self.engine.services(label=stack_label),
+                                                                 self.engine.tasks(label=stack_label)))
+        except (OSError, IMDockerError, asyncio.TimeoutError) as e:
+            print(f'SwarmStateSnapshot.load: Failed to get state from docker, {e}.')
+            return
+        service_names = {}
+        for item in services:
+            self.services[item['Spec']['Name']] = item
+            service_names[item['ID']] = item['Spec']['Name']
+            self.tasks[item['Spec']['Name']] = []
+        for item in tasks:
+            if item.get('ServiceID') in service_names:
+                self.tasks[service_names[item['ServiceID']]].append(item)
+        if self.verbose:
+            print(f'SwarmStateSnapshot.load: Get {len(self.services)} services and {len(tasks)} tasks from docker.')
+
+    def expire(self):
+        self.loaded = False
+
+    def ensure_loaded(self):
+        if not self.loaded:
+            self.load()
+
+    @property
+    def service_names(self):
+        self.ensure_loaded()
+        return sorted(self.services.keys())
+
+    def is_deployed(self, service_name):
+        self.ensure_loaded()
+        return service_name in self.services
+
+    def current_state(self, service_name):
+        """
+        Return state of the latest running or ready task, in the format of "docker service ps".
+        """
+        self.ensure_loaded()
+        tasks = [item for item in self.tasks.get(service_name, [])
+                 if item.get('DesiredState') in ('running', 'ready')]
+        if not tasks:
+            return 'Unknown'
+        task = max(tasks, key=lambda x: x['Status'].get('Timestamp', ''))
+        return f'{task["Status"]["State"].capitalize()} {human_duration(task["Status"].get("Timestamp", ""))} ago'
+
+    def replicas(self, service_name):
+        """
+        Return running and desired number of tasks, in the format of "docker stack services".
+        """
+        self.ensure_loaded()
+        service = self.services.get(service_name)
+        if not service:
+            return '-/-'
+        running = [item for item in self.tasks.get(service_name, [])
+                   if item.get('DesiredState') == 'running' and item['Status'].get('State') == 'running']
+        mode = service['Spec'].get('Mode', {})
+        if 'Replicated' in mode:
+            desired = mode['Replicated'].get('Replicas', 0)
+        else:
+            desired = len([item for item in self.tasks.get(service_name, []) if item.get('DesiredState') == 'running'])
+        return f'{len(running)}/{desired}'
+
+
+def human_duration(timestamp):
+    """
+    Return time passed since given RFC 3339 timestamp in human-readable format, the same as docker CLI.
+    """
+    try:
+        # docker gives nanoseconds, which are not supported by datetime.
+        temp = timestamp.rstrip('Z').split('.')[0]
+        start = datetime.datetime.strptime(temp, '%Y-%m-%dT%H:%M:%S').replace(tzinfo=datetime.timezone.utc)
+    except ValueError:
+        return 'unknown time'
+    seconds = int((datetime.datetime.now(datetime.timezone.utc) - start).total_seconds())
+    minutes, hours = seconds // 60, seconds // 3600
+    if seconds < 1:
+        return 'Less than a second'
+    elif seconds == 1:
+        return '1 second'
+    elif seconds < 60:
+        return f'{seconds} seconds'
+    elif minutes == 1:
+        return 'About a minute'
+    elif minutes < 60:
+        return f'{minutes} minutes'
+    elif hours == 1:
+        return 'About an hour'
+    elif hours < 48:
+        return f'{hours} hours'
+    elif hours < 24 * 7 * 2:
+        return f'{hours // 24} days'
+    elif hours < 24 * 30 * 2:
+        return f'{hours // 24 // 7} weeks'
+    elif hours < 24 * 365 * 2:
+        return f'{hours // 24 // 30} months'
+    return f'{hours // 24 // 365} years'
+
+
+def task_name(task, service):
+    """
+    Return name of task in the format of "docker service ps", service name with slot or node ID.
+    """
+    name = service['Spec']['Name'] if service else task.get('ServiceID', '')
+    if task.get('Slot'):
+        return f'{name}.{task["Slot"]}'
+    return f'{name}.{task.get("NodeID", "")}'
+
+
+def task_table(tasks, services, nodes, no_trunc=False):
+    """
+    Return rows of tasks in the format of "docker stack ps", the latest task of each slot first.
+    """
+    services_by_id = {item['ID']: item for item in services}
+    hostnames = {item['ID']: item['Description']['Hostname'] for item in nodes}
+    items = sorted(tasks, key=lambda x: x['Status'].get('Timestamp', ''), reverse=True)
+    items.sort(key=lambda x: task_name(x, services_by_id.get(x.get('ServiceID'))))
+    raw_print = [["NAME", "NODE", "DESIRED STATE", "CURRENT STATE", "ERROR", "PORTS"], ]
+    last_name = None
+    for item in items:
+        name = task_name(item, services_by_id.get(item.get('ServiceID')))
+        display_name = name if name != last_name else f' \\_ {name}'
+        last_name = name
+        error = item['Status'].get('Err', '')
+        if error and not no_trunc and len(error) > 30:
+            error = f'{error[:29]}…'
+        error = f'"{error}"' if error else ''
+        ports = ', '.join(f'*:{port.get("PublishedPort")}->{port.get("TargetPort")}/{port.get("Protocol", "tcp")}'
+                          for port in item['Status'].get('PortStatus', {}).get('Ports', []))
+        current_state = (f'{item["Status"].get("State", "").capitalize()} '
+                         f'{human_duration(item["Status"].get("Timestamp", ""))} ago')
+        raw_print.append([display_name, hostnames.get(item.get('NodeID'), ''),
+                          item.get('DesiredState', '').capitalize(), current_state, error, ports])
+    return raw_print
+
+
+def service_pretty(service, networks=None):
+    """
+    Return readable text of service object, similar to "docker service inspect --pretty".
+    """
+    network_names = {item['Id']: item['Name'] for item in networks or []}
+    spec = service['Spec']
+    task_template = spec.get('TaskTemplate', {})
+    container_spec = task_template.get('ContainerSpec', {})
+    lines = [f'ID:\t\t{service["ID"]}', f'Name:\t\t{spec["Name"]}']
+    if spec.get('Labels'):
+        lines.append('Labels:')
+        lines.extend(f' {k}={v}' for k, v in spec['Labels'].items())
+    if 'Replicated' in spec.get('Mode', {}):
+        lines.append('Service Mode:\tReplicated')
+        lines.append(f' Replicas:\t{spec["Mode"]["Replicated"].get("Replicas", 0)}')
+    else:
+        lines.append('Service Mode:\tGlobal')
+    placement = task_template.get('Placement', {})
+    if placement.get('Constraints'):
+        lines.append('Placement:')
+        lines.append(f' Constraints:\t{placement["Constraints"]}')
+    restart_policy = task_template.get('RestartPolicy')
+    if restart_policy:
+        lines.append('RestartPolicy:')
+        lines.append(f' Condition:\t{restart_policy.get("Condition", "")}')
+        if 'MaxAttempts' in restart_policy:
+            lines.append(f' Max Attempts:\t{restart_policy["MaxAttempts"]}')
+    lines.append('ContainerSpec:')
+    lines.append(f' Image:\t\t{container_spec.get("Image", "")}')
+    if container_spec.get('Command'):
+        lines.append(f' Command:\t{" ".join(container_spec["Command"])}')
+    if container_spec.get('Args'):
+        lines.append(f' Args:\t\t{" ".join(container_spec["Args"])}')
+    if container_spec.get('Env'):
+        lines.append(' Env:\t\t' + '\n\t\t'.join(container_spec['Env']))
+    if container_spec.get('Dir'):
+        lines.append(f' Dir:\t\t{container_spec["Dir"]}')
+    if container_spec.get('Mounts'):
+        lines.append('Mounts:')
+        for item in container_spec['Mounts']:
+            lines.append(f' Target:\t{item.get("Target", "")}')
+            lines.append(f'  Source:\t{item.get("Source", "")}')
+            lines.append(f'  ReadOnly:\t{item.get("ReadOnly", False)}')
+            lines.append(f'  Type:\t\t{item.get("Type", "")}')
+    limits = task_template.get('Resources', {}).get('Limits', {})
+    if limits:
+        lines.append('Resources:')
+        lines.append(' Limits:')
+        if limits.get('NanoCPUs'):
+            lines.append(f'  CPU:\t\t{limits["NanoCPUs"] / 1e9:g}')
+        if limits.get('MemoryBytes'):
+            lines.append(f'  Memory:\t{limits["MemoryBytes"] / 1024 ** 3:g}GiB')
+    if task_template.get('Networks'):
+        lines.append('Networks: ' + ' '.join(network_names.get(item['Target'], item['Target'])
+                                              for item in task_template['Networks']))
+    endpoint_spec = spec.get('EndpointSpec', {})
+    lines.append(f'Endpoint Mode:\t{endpoint_spec.get("Mode", "vip")}')
+    if endpoint_spec.get('Ports'):
+        lines.append('Ports:')
+        for item in endpoint_spec['Ports']:
+            lines.append(f' PublishedPort = {item.get("PublishedPort")}')
+            lines.append(f'  Protocol = {item.get("Protocol", "tcp")}')
+            lines.append(f'  TargetPort = {item.get("TargetPort")}')
+            lines.append(f'  PublishMode = {item.get("PublishMode", "ingress")}')
+    return '\n'.join(lines)
+
+
+def execute_command(command_string):
+    """
+    Print and execute a shell command.
+
+    :return: whether the command succeeded.
+    """
+    print(f'Executing command: "{command_string}"...')
+    return os.system(command_string) == 0
+
+
+async def stack_deploy(dir_path, compose_file):
+    """
+    Run "docker stack deploy" with given compose file, deploying compose files is only supported by docker CLI.
+
+    :return: (exit code, output)
+    """
+    process = await asyncio.create_subprocess_exec(
+        'docker', 'stack', 'deploy', '--compose-file', compose_file, PREFIX_STACK_NAME, '--detach',
+        cwd=dir_path, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT)
+    output, _ = await process.communicate()
+    return process.returncode, output.decode(errors='replace')
+
+
 class SwarmManager:
     def __init__(self, verbose=False):
-        self.services = {item: SwarmService(name=item, service_type='ioc') for item in
-                         os.listdir(REPOSITORY_PATH)}
+        self.snapshot = SwarmStateSnapshot(verbose=verbose)
+        self.services = {item: SwarmService(name=item, service_type='ioc', snapshot=self.snapshot) for item in
+                         os.listdir(REPOSITORY_PATH) if not item.startswith('.')}
         for ss in GlobalServicesList:
             if ss in self.services.keys():
                 print(f'SwarmManager: Warning! Service "{ss}" defined in GlobalServicesList '
                       f'has the same name with existing services, skipped.')
                 continue
-            self.services[ss] = SwarmService(name=ss, service_type='global')
+            self.services[ss] = SwarmService(name=ss, service_type='global', snapshot=self.snapshot)
         for ss in LocalServicesList:
             if ss in self.services.keys():
                 print(f'SwarmManager: Warning! Service "{ss}" defined in LocalServicesList '
                       f'has the same name with existing services, skipped.')
                 continue
-            self.services[ss] = SwarmService(name=ss, service_type='local')
+            self.services[ss] = SwarmService(name=ss, service_type='local', snapshot=self.snapshot)
         for ss in CustomServicesList:
             name, compose_file = ss
             if name in self.services.keys():
                 print(f'SwarmManager: Warning! Service "{ss}" defined in CustomServicesList '
                       f'has the same name with existing services, skipped.')
                 continue
-            self.services[name] = SwarmService(name=name, service_type='custom', compose_file=compose_file)
-        self.client = docker.from_env()
-        self.running_services = self.get_services_from_docker()
+            self.services[name] = SwarmService(name=name, service_type='custom', compose_file=compose_file,
+                                               snapshot=self.snapshot)
 
         if verbose:
             print(self.services)
 
-    def get_services_from_docker(self):
-        services = self.client.services.list(filters={'label': f'com.docker.stack.namespace={PREFIX_STACK_NAME}'})
-        return [item for item in services]
-
     def list_managed_services(self):
         res = ''
         for item in self.services.keys():
@@ -49,9 +301,7 @@ class SwarmManager:
         return res.rstrip()
 
     def list_running_services(self):
-        temp_list = [item.name for item in self.running_services]
-        temp_list.sort()
-        for item in temp_list:
+        for item in self.snapshot.service_names:
             print(f'{item}', end=' ')
         else:
             print()
@@ -84,35 +334,23 @@ class SwarmManager:
         print(tabulate(raw_print, headers="firstrow", tablefmt='plain'))
         print('')
 
-    def deploy_global_services(self):
-        for item in self.services.values():
-            if item.service_type == 'global':
-                if item.is_available:
-                    if item.is_deployed:
-                        print(f'SwarmManager: Skipped deploying "{item.service_name}", as it\'s been deployed.')
-                        continue
-                    else:
-                        print(f'SwarmManager: Start to Deploy "{item.service_name}".')
-                        print(f'=================================================================')
-                        item.deploy()
-                else:
-                    print(f'SwarmManager: Failed to deploy "{item.service_name}", as it\'s not available.')
+    def deploy_global_services(self, workers=None, verbose=False):
+        self.operate_services('deploy', [item for item in self.services.values() if item.service_type == 'global'],
+                              workers=workers, verbose=verbose)
 
-    def deploy_all_iocs(self):
-        for item in self.services.values():
-            if item.service_type == 'ioc':
-                if item.is_available:
-                    if item.is_deployed:
-                        print(f'SwarmManager: Skipped deploying "{item.service_name}", as it\'s been deployed.')
-                        continue
-                    else:
-                        print(f'SwarmManager: Start to Deploy "{item.service_name}".')
-                        print(f'=================================================================')
-                        item.deploy()
-                else:
-                    print(f'SwarmManager: Failed to deploy "{item.service_name}", as it\'s not available.')
+    def deploy_all_iocs(self, sharded=False, workers=None, verbose=False):
+        if sharded:
+            shards = SwarmShard.get_all_shards(snapshot=self.snapshot)
+            if not shards:
+                print(f'SwarmManager: No sharded stack file found, '
+                      f'generate them by "exec --gen-swarm-file alliocs --shard-by" first.')
+                return
+            self.operate_services('deploy', shards, workers=workers, verbose=verbose)
+        else:
+            self.operate_services('deploy', [item for item in self.services.values() if item.service_type == 'ioc'],
+                                  workers=workers, verbose=verbose)
 
-    def remove_global_services(self):
+    def remove_global_services(self, workers=None, verbose=False):
         while True:
             ans = input(f'SwarmManager: Remove all deployed global services?!![y|n]:')
             if ans.lower() == 'y' or ans.lower() == 'yes':
@@ -122,13 +360,10 @@ class SwarmManager:
                 return
             else:
                 print(f'SwarmManager: Invalid input, please try again.')
-        for item in self.services.values():
-            if item.service_type == 'global':
-                if item.is_available:
-                    if item.is_deployed:
-                        item.remove()
+        self.operate_services('remove', [item for item in self.services.values() if item.service_type == 'global'],
+                              workers=workers, verbose=verbose)
 
-    def remove_all_iocs(self):
+    def remove_all_iocs(self, workers=None, verbose=False):
         while True:
             ans = input(f'SwarmManager: Remove all deployed IOC projects?!![y|n]:')
             if ans.lower() == 'y' or ans.lower() == 'yes':
@@ -138,13 +373,10 @@ class SwarmManager:
                 return
             else:
                 print(f'SwarmManager: Invalid input, please try again.')
-        for item in self.services.values():
-            if item.service_type == 'ioc':
-                if item.is_available:
-                    if item.is_deployed:
-                        item.remove()
+        self.operate_services('remove', [item for item in self.services.values() if item.service_type == 'ioc'],
+                              workers=workers, verbose=verbose)
 
-    def remove_all_services(self):
+    def remove_all_services(self, workers=None, verbose=False):
         while True:
             ans = input(f'SwarmManager: Remove all deployed services in Swarm?!![y|n]:')
             if ans.lower() == 'y' or ans.lower() == 'yes':
@@ -154,10 +386,81 @@ class SwarmManager:
                 return
             else:
                 print(f'SwarmManager: Invalid input, please try again.')
-        for item in self.services.values():
-            if item.is_available:
-                if item.is_deployed:
-                    item.remove()
+        self.operate_services('remove', list(self.services.values()), workers=workers, verbose=verbose)
+
+    def operate_services(self, operation, services, workers=None, verbose=False):
+        """
+        Deploy or remove given services concurrently, at most "workers" services at once.
+
+        Output of each service is captured rather than interleaved, a progress line is printed as each service
+        finishes, output of failed services (of all services if verbose) is printed in order afterwards,
+        followed by a summary table.
+
+        :param operation: "deploy" or "remove".
+        :param services: list of SwarmService or SwarmShard objects.
+        :param workers: number of services operated at once.
+        :param verbose: show output of all services.
+        :return: list of (service, result, output, elapsed seconds), result is one of
+            "deployed", "removed", "skipped" and "failed".
+        """
+        workers = workers if workers else SWARM_OPERATION_WORKERS
+        services = sorted(services, key=lambda x: x.name)
+        self.snapshot.ensure_loaded()  # state is read inside event loop, so it must be fetched in advance.
+        finished = 0
+
+        async def operate(item):
+            nonlocal finished
+            start = time.perf_counter()
+            output = ''
+            try:
+                if operation == 'deploy':
+                    if not item.is_available:
+                        result, output = 'failed', 'Service is not available.'
+                    elif item.is_deployed:
+                        result, output = 'skipped', 'Service has already been deployed.'
+                    else:
+                        code, output = await item.stack_deploy()
+                        result = 'deployed' if code == 0 else 'failed'
+                else:
+                    if item.is_deployed:
+                        await item.engine.remove_service(item.service_name)
+                        result = 'removed'
+                    else:
+                        result, output = 'skipped', 'Service is not deployed.'
+            except (OSError, IMDockerError, asyncio.TimeoutError) as e:
+                result, output = 'failed', f'{e}'
+            except Exception as e:
+                # any other error, such as a malformed compose file, fails only this service.
+                result, output = 'failed', f'Exception "{type(e).__name__}: {e}" occurs while operating service.'
+            elapsed = time.perf_counter() - start
+            finished += 1
+            print(f'SwarmManager: [{finished}/{len(services)}] {result.capitalize()} "{item.service_name}" '
+                  f'({elapsed:.1f}s).', flush=True)
+            return item, result, output, elapsed
+
+        start_time = time.perf_counter()
+        print(f'SwarmManager: Start to {operation} {len(services)} services, {workers} at once.')
+        res = DockerEngine.run_all([operate(item) for item in services], limit=workers)
+        total_time = time.perf_counter() - start_time
+        self.snapshot.expire()
+
+        for item, result, output, elapsed in res:
+            if output.strip() and (result == 'failed' or verbose):
+                print(f' "{item.service_name}" '.center(70, '='))
+                print(output.rstrip())
+        raw_print = [["Service", "Result", "Time(s)"], ]
+        for item, result, output, elapsed in res:
+            if result != 'skipped' or verbose:
+                raw_print.append([item.service_name, result, f'{elapsed:.1f}'])
+        if len(raw_print) > 1:
+            print('')
+            print(tabulate(raw_print, headers="firstrow", tablefmt='plain'))
+            print('')
+        counts = {key: len([item for item in res if item[1] == key])
+                  for key in ('deployed' if operation == 'deploy' else 'removed', 'skipped', 'failed')}
+        print(f'SwarmManager: Finished in {total_time:.1f}s, '
+              f'{", ".join(f"{value} {key}" for key, value in counts.items())}.')
+        return res
 
     def update_deployed_services(self):
         print(f'Update all deployed services, this will cause all ioc services to be restarted.')
@@ -199,8 +502,9 @@ class SwarmManager:
         top_path = os.path.join(MOUNT_PATH, 'swarm')
 
         # 目前使用硬编码方式，后续可通过 LocalServicesList 变量实现动态添加
+        snapshot = SwarmStateSnapshot()
         # copy registry
-        temp_service = SwarmService('registry', service_type='local')
+        temp_service = SwarmService('registry', service_type='local', snapshot=snapshot)
         if temp_service.is_deployed:  # check whether the directory being mounted.
             print(f'SwarmManager: Failed to create deployment directory for "registry" as it is running.')
         else:
@@ -216,7 +520,7 @@ class SwarmManager:
             print(f'SwarmManager: Create deployment directory for "registry".')
 
         # copy prometheus
-        temp_service = SwarmService('prometheus', service_type='local')
+        temp_service = SwarmService('prometheus', service_type='local', snapshot=snapshot)
         if temp_service.is_deployed:  # check whether the directory being mounted.
             print(f'SwarmManager: Failed to create deployment directory for "prometheus" as it is running.')
         else:
@@ -226,7 +530,7 @@ class SwarmManager:
             print(f'SwarmManager: Create deployment directory for "prometheus".')
 
         # copy alertManager
-        temp_service = SwarmService('alertManager', service_type='local')
+        temp_service = SwarmService('alertManager', service_type='local', snapshot=snapshot)
         if temp_service.is_deployed:  # check whether the directory being mounted.
             print(f'SwarmManager: Failed to create deployment directory for "alertManager" as it is running.')
         else:
@@ -242,82 +546,150 @@ class SwarmManager:
 
     @staticmethod
     def get_deployed_swarm_services():
-        result = subprocess.run(
-            ['docker', 'service', 'ls', '-f', f'label=com.docker.stack.namespace={PREFIX_STACK_NAME}', '--format',
-             '{{.Name}}'],
-            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        output_list = result.stdout.splitlines()
-        return output_list
+        return SwarmStateSnapshot().service_names
 
     @staticmethod
     def show_deployed_services():
-        os.system('docker stack ps -f "desired-state=running" -f "desired-state=ready" -f "desired-state=accepted" '
-                  '--format "table {{.Name}}\t{{.Node}}\t{{.DesiredState}}\t{{.CurrentState}}\t{{.Error}}\t{{.Ports}}" '
-                  + f' {PREFIX_STACK_NAME} ')
+        SwarmManager.show_stack_tasks(desired_state=('running', 'ready', 'accepted'))
 
     @staticmethod
     def show_deployed_services_detail():
-        os.system('docker stack ps '
-                  '--format "table {{.Name}}\t{{.Node}}\t{{.DesiredState}}\t{{.CurrentState}}\t{{.Error}}\t{{.Ports}}" '
-                  '--no-trunc '
-                  + f' {PREFIX_STACK_NAME} ')
+        SwarmManager.show_stack_tasks(no_trunc=True)
+
+    @staticmethod
+    def show_stack_tasks(desired_state=None, no_trunc=False):
+        engine = DockerEngine()
+        stack_label = f'com.docker.stack.namespace={PREFIX_STACK_NAME}'
+        try:
+            services, tasks, nodes = engine.run(engine.gather(engine.services(label=stack_label),
+                                                              engine.tasks(label=stack_label), engine.nodes()))
+        except (OSError, IMDockerError, asyncio.TimeoutError) as e:
+            print(f'SwarmManager.show_stack_tasks: Failed to get tasks from docker, {e}.')
+            return
+        if desired_state:
+            tasks = [item for item in tasks if item.get('DesiredState') in desired_state]
+        print(tabulate(task_table(tasks, services, nodes, no_trunc=no_trunc), headers="firstrow", tablefmt='plain'))
 
     @staticmethod
     def show_deployed_machines(show_detail=False):
-        os.system('docker node ls --format "table {{if .Self}}*{{end}}{{.Hostname}}{{if .Self}}*{{end}}\t'
-                  '{{.Status}}\t{{.Availability}}\t{{.ManagerStatus}}\t{{.TLSStatus}}\t{{.EngineVersion}}"')
+        engine = DockerEngine()
+        try:
+            nodes, info, swarm = engine.run(engine.gather(engine.nodes(), engine.info(), engine.swarm()))
+        except (OSError, IMDockerError, asyncio.TimeoutError) as e:
+            print(f'SwarmManager.show_deployed_machines: Failed to get nodes from docker, {e}.')
+            return
+        self_id = info.get('Swarm', {}).get('NodeID', '')
+        trust_root = swarm.get('ClusterInfo', swarm).get('TLSInfo', {}).get('TrustRoot')
+        raw_print = [["HOSTNAME", "STATUS", "AVAILABILITY", "MANAGER STATUS", "TLS STATUS", "ENGINE VERSION"], ]
+        for item in sorted(nodes, key=lambda x: x['Description']['Hostname']):
+            hostname = item['Description']['Hostname']
+            if item['ID'] == self_id:
+                hostname = f'*{hostname}*'
+            manager_status = item.get('ManagerStatus')
+            if not manager_status:
+                manager_status = ''
+            elif manager_status.get('Leader'):
+                manager_status = 'Leader'
+            else:
+                manager_status = manager_status.get('Reachability', '').capitalize()
+            if trust_root and item['Description'].get('TLSInfo', {}).get('TrustRoot') != trust_root:
+                tls_status = 'Needs Rotation'
+            else:
+                tls_status = 'Ready'
+            raw_print.append([hostname, item['Status'].get('State', '').capitalize(),
+                              item['Spec'].get('Availability', '').capitalize(), manager_status, tls_status,
+                              item['Description'].get('Engine', {}).get('EngineVersion', '')])
+        print(tabulate(raw_print, headers="firstrow", tablefmt='plain'))
         if show_detail:
-            os.system("echo ;"
-                      "echo '------------';"
-                      "echo 'Node Details:';"
-                      "echo '------------';"
-                      "docker node inspect --format "
-                      "'{{.Description.Hostname}}({{.Status.Addr}}):\t{{range $k, $v := .Spec.Labels}}{{$k}}={{$v}} {{else}}{{end}}'"
-                      " $(docker node ls -q) ;"
-                      "echo ;")
+            print('')
+            print('------------')
+            print('Node Details:')
+            print('------------')
+            for item in sorted(nodes, key=lambda x: x['Description']['Hostname']):
+                labels = ' '.join(f'{k}={v}' for k, v in item['Spec'].get('Labels', {}).items())
+                print(f'{item["Description"]["Hostname"]}({item["Status"].get("Addr", "")}):\t{labels}')
+            print('')
 
     @staticmethod
     def show_join_tokens():
-        os.system('docker swarm join-token manager')
-        os.system('docker swarm join-token worker')
+        engine = DockerEngine()
+        try:
+            info, swarm = engine.run(engine.gather(engine.info(), engine.swarm()))
+        except (OSError, IMDockerError, asyncio.TimeoutError) as e:
+            print(f'SwarmManager.show_join_tokens: Failed to get join tokens from docker, {e}.')
+            return
+        addr = ''
+        for item in info.get('Swarm', {}).get('RemoteManagers') or []:
+            if item.get('NodeID') == info['Swarm'].get('NodeID') or not addr:
+                addr = item.get('Addr', '')
+        for role in ('manager', 'worker'):
+            print(f'To add a {role} to this swarm, run the following command:')
+            print('')
+            print(f'    docker swarm join --token {swarm["JoinTokens"][role.capitalize()]} {addr}')
+            print('')
 
     @staticmethod
     def backup_swarm():
-        print(f'Starting swarm backup...')
+        """
+        Back up swarm state of current manager node into "<time>.swarm.tar.gz".
 
-        command_string = f'sudo systemctl stop docker'
-        print(f'Executing command: "{command_string}"...')
-        os.system(f'{command_string}')
+        Docker is stopped only while swarm state is copied into a staging directory on the same filesystem,
+        by reflink if filesystem supports it, then started again right away. The copy is compressed afterwards.
+        """
+        print(f'Starting swarm backup...')
 
         now_time = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-        command_string = f'sudo tar -czvf {now_time}.swarm.tar.gz /var/lib/docker/swarm'
-        print(f'Executing command: "{command_string}"...')
-        os.system(f'{command_string}')
-
         repository_path = os.environ.get("MANAGER_PATH", default='')
-        if repository_path:
-            if not os.path.isdir(repository_path):
-                print(f'backup_swarm: $MANAGER_PATH is not a valid directory, '
-                      f'backup file created at current work path.')
-                return
+        if repository_path and os.path.isdir(repository_path):
+            backup_path = os.path.normpath(os.path.join(repository_path, "..", SWARM_BACKUP_DIR))
+            try_makedirs(backup_path)
         else:
-            print(f'backup_swarm: $MANAGER_PATH is not defined, backup file created at current work path.')
-            return
-        backup_path = os.path.normpath(os.path.join(repository_path, "..", SWARM_BACKUP_DIR))
-        try_makedirs(backup_path)
-
-        command_string = f'sudo mv ./{now_time}.swarm.tar.gz {backup_path}'
-        print(f'Executing command: "{command_string}"...')
-        os.system(f'{command_string}')
+            print(f'backup_swarm: $MANAGER_PATH is {"not a valid directory" if repository_path else "not defined"}, '
+                  f'backup file will be created at current work path.')
+            backup_path = os.getcwd()
+        file_path = os.path.join(backup_path, f'{now_time}.swarm.tar.gz')
+        staging_path = os.path.join(SWARM_STAGING_PATH, now_time)
+        # swarm state is kept in archive by its absolute path without leading "/", as "tar" does.
+        member_path = SWARM_STATE_PATH.strip('/')
+        staged_state_path = os.path.join(staging_path, member_path)
 
-        command_string = f'sudo systemctl start docker'
-        print(f'Executing command: "{command_string}"...')
-        os.system(f'{command_string}')
+        stop_time = time.perf_counter()
+        try:
+            copied = (execute_command('sudo systemctl stop docker') and
+                      execute_command(f'sudo mkdir -p {shlex.quote(os.path.dirname(staged_state_path))}') and
+                      execute_command(f'sudo cp -a --reflink=auto {shlex.quote(SWARM_STATE_PATH)} '
+                                      f'{shlex.quote(staged_state_path)}'))
+        finally:
+            started = execute_command('sudo systemctl start docker')
+            downtime = time.perf_counter() - stop_time
+        print(f'backup_swarm: Docker stopped for {downtime:.1f}s.')
+        if not started:
+            print(f'backup_swarm: Failed to start docker, check it by "sudo systemctl status docker".')
 
-        print(f'Finished swarm backup.')
+        if copied:
+            temp_path = f'{file_path}.tmp'
+            compress_option = '-I pigz' if shutil.which('pigz') else '-z'
+            if (execute_command(f'sudo tar {compress_option} -cf {shlex.quote(temp_path)} '
+                                f'-C {shlex.quote(staging_path)} {shlex.quote(member_path)}') and
+                    execute_command(f'sudo mv {shlex.quote(temp_path)} {shlex.quote(file_path)}')):
+                print(f'backup_swarm: Finished. Backup file "{file_path}" created, '
+                      f'docker stopped for {downtime:.1f}s.')
+            else:
+                print(f'backup_swarm: Failed. Failed to compress swarm state.')
+                execute_command(f'sudo rm -f {shlex.quote(temp_path)}')
+        else:
+            print(f'backup_swarm: Failed. Failed to copy swarm state "{SWARM_STATE_PATH}".')
+        execute_command(f'sudo rm -rf {shlex.quote(staging_path)}')
 
     @staticmethod
     def restore_swarm(backup_file):
+        """
+        Restore swarm state of current node from "<time>.swarm.tar.gz" made by backup_swarm().
+
+        Backup file is read through once to check its layout and size before anything is written, then extracted
+        in one pass into a staging directory on the same filesystem as swarm state, so that swarm state is switched
+        by renaming while docker is stopped.
+        """
         print(f'Restoring swarm...')
 
         extract_path = relative_and_absolute_path_to_abs(backup_file)
@@ -328,41 +700,107 @@ class SwarmManager:
             print(f'restore_swarm: Failed. File "{extract_path}" is not exists.')
             return
 
-        print(f'unpack tar.gz file into swarm directory.')
-        command_string = f'tar -zxvf {extract_path} -C /tmp/'
-        print(f'Executing command: "{command_string}"...')
-        os.system(f'{command_string}')
-
-        if not os.path.isdir(f'/tmp/var/lib/docker/swarm'):
-            print(f'restore_swarm: Failed. Backup file used for restoring is not a valid swarm backup.')
+        print(f'restore_swarm: Checking backup file "{extract_path}".')
+        try:
+            total_size = check_swarm_backup(extract_path)
+        except (OSError, tarfile.TarError, EOFError, IMValueError) as e:
+            print(f'restore_swarm: Failed. Backup file used for restoring is not a valid swarm backup, {e}.')
             return
+        free_size = shutil.disk_usage(existing_parent(SWARM_STAGING_PATH)).free
+        if total_size > free_size:
+            print(f'restore_swarm: Failed. {human_size(total_size)} needed for swarm state in backup file, '
+                  f'but only {human_size(free_size)} free.')
+            return
+
+        staging_path = os.path.join(SWARM_STAGING_PATH, datetime.datetime.now().strftime("%Y%m%d%H%M%S"))
+        member_path = SWARM_STATE_PATH.strip('/')
+        staged_state_path = os.path.join(staging_path, member_path)
+        old_state_path = os.path.join(staging_path, 'swarm.old')
+        try:
+            if not (execute_command(f'sudo mkdir -p {shlex.quote(staging_path)}') and
+                    execute_command(f'sudo tar -xzf {shlex.quote(extract_path)} -C {shlex.quote(staging_path)} '
+                                    f'{shlex.quote(member_path)}')):
+                print(f'restore_swarm: Failed. Failed to extract backup file.')
+                return
+            if os.stat(staging_path).st_dev != os.stat(existing_parent(SWARM_STATE_PATH)).st_dev:
+                print(f'restore_swarm: Warning. "{SWARM_STAGING_PATH}" is not on the same filesystem as '
+                      f'"{SWARM_STATE_PATH}", swarm state will be copied while docker is stopped.')
 
-        command_string = f'sudo systemctl stop docker'
-        print(f'Executing command: "{command_string}"...')
-        os.system(f'{command_string}')
+            print(f'restore_swarm: Current swarm state "{SWARM_STATE_PATH}" will be replaced, '
+                  f'docker will be stopped while replacing.')
+            ans = input(f'Confirm to execute the above operation[y|n]?')
+            if not (ans.lower() == 'y' or ans.lower() == 'yes'):
+                print(f'Operation exit.')
+                return
+
+            stop_time = time.perf_counter()
+            try:
+                replaced = False
+                if execute_command('sudo systemctl stop docker'):
+                    # docker directory is only accessible by root, so existence is checked by sudo.
+                    state_path = shlex.quote(SWARM_STATE_PATH)
+                    had_state = execute_command(f'sudo test -e {state_path} -o -L {state_path}')
+                    # "mv -T" fails instead of moving into swarm state if it is still there.
+                    if not had_state or execute_command(f'sudo mv -T {state_path} {shlex.quote(old_state_path)}'):
+                        replaced = (execute_command(f'sudo mv -T {shlex.quote(staged_state_path)} {state_path}') and
+                                    all(execute_command(f'sudo test -e {state_path}/{shlex.quote(item)}')
+                                        for item in SWARM_STATE_REQUIRED))
+                        if not replaced and had_state:
+                            # swarm state moved in but not complete is dropped for the original one.
+                            execute_command(f'sudo rm -rf {state_path}')
+                            execute_command(f'sudo mv -T {shlex.quote(old_state_path)} {state_path}')
+            finally:
+                started = execute_command('sudo systemctl start docker')
+                downtime = time.perf_counter() - stop_time
+            print(f'restore_swarm: Docker stopped for {downtime:.1f}s.')
+            if not replaced:
+                print(f'restore_swarm: Failed. Failed to replace swarm state, original swarm state kept.')
+                return
+            if not started:
+                print(f'restore_swarm: Failed. Failed to start docker, check it by "sudo systemctl status docker".')
+                return
+
+            execute_command(f'docker swarm init --force-new-cluster')
+            print(f'Restoring finished.')
+        finally:
+            execute_command(f'sudo rm -rf {shlex.quote(staging_path)}')
 
-        command_string = f'sudo rm -rf /var/lib/docker/swarm'
-        print(f'Executing command: "{command_string}"...')
-        ans = input(f'Confirm to execute the above operation[y|n]?')
-        if ans.lower() == 'y' or ans.lower() == 'yes':
-            os.system(f'{command_string}')
-        else:
-            print(f'Operation exit.')
-            return
 
-        command_string = f'sudo mv -f /tmp/var/lib/docker/swarm /var/lib/docker/swarm'
-        print(f'Executing command: "{command_string}"...')
-        os.system(f'{command_string}')
+def existing_parent(path):
+    """
+    Return the nearest existing directory of given path, which is path itself if it exists.
+    """
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        path = os.path.dirname(path)
+    return path
 
-        command_string = f'sudo systemctl start docker'
-        print(f'Executing command: "{command_string}"...')
-        os.system(f'{command_string}')
 
-        command_string = f'docker swarm init --force-new-cluster'
-        print(f'Executing command: "{command_string}"...')
-        os.system(f'{command_string}')
+def check_swarm_backup(file_path):
+    """
+    Read through a swarm backup file to check that it contains swarm state only, in the layout written by
+    SwarmManager.backup_swarm(). Raise IMValueError if not.
 
-        print(f'Restoring finished.')
+    :return: total size of files in backup file.
+    """
+    prefix = SWARM_STATE_PATH.strip('/').split('/')
+    total_size = 0
+    found = set()
+    with open_archive_for_reading(file_path) as tar:
+        for member in tar:
+            parts = backup_member_path(member.name)
+            if parts[:len(prefix)] != prefix:
+                raise IMValueError(f'member "{member.name}" out of "{"/".join(prefix)}"')
+            if not (member.isreg() or member.isdir() or member.issym()):
+                raise IMValueError(f'unexpected member "{member.name}" of type {member.type}')
+            if member.issym() and (member.linkname.startswith('/') or '..' in member.linkname.split('/')):
+                raise IMValueError(f'symlink "{member.name}" pointing to "{member.linkname}"')
+            found.update(parts[len(prefix):len(prefix) + 1])
+            total_size += member.size
+    lost = [item for item in SWARM_STATE_REQUIRED if item not in found]
+    if lost:
+        raise IMValueError(f'{", ".join(lost)} not found in "{"/".join(prefix)}"')
+    return total_size
 
 
 class SwarmService:
@@ -374,8 +812,13 @@ class SwarmService:
             "global"(services that should run on each node), or
             "local"(services of swarm infrastructures), or
             "custom"(other services that also should run in this system)
+        :param kwargs:
+            "compose_file" to give compose file path of "custom" service.
+            "snapshot" to share a SwarmStateSnapshot between services, a new one is used if not given.
         """
         self.name = name
+        self.snapshot = kwargs.get('snapshot') or SwarmStateSnapshot()
+        self.engine = self.snapshot.engine
         self.service_type = None
         self.service_name = f'{PREFIX_STACK_NAME}_srv-{name}'
         if service_type == 'ioc':
@@ -425,22 +868,12 @@ class SwarmService:
 
     @property
     def is_deployed(self):
-        if self.service_name in SwarmManager.get_deployed_swarm_services():
-            return True
-        else:
-            return False
+        return self.snapshot.is_deployed(self.service_name)
 
     @property
     def current_state(self):
         if self.is_deployed:
-            result = subprocess.run(
-                ['docker', 'service', 'ps', '-f', f'desired-state=Running', '-f', f'desired-state=Ready', '--format',
-                 '{{.CurrentState}}',
-                 self.service_name],
-                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            if not result.stdout.splitlines():
-                return 'Unknown'
-            return result.stdout.splitlines()[0]
+            return self.snapshot.current_state(self.service_name)
         else:
             if self.is_available:
                 return 'Available. Not deployed'
@@ -450,11 +883,7 @@ class SwarmService:
     @property
     def replicas(self):
         if self.is_deployed:
-            result = subprocess.run(
-                ['docker', 'stack', 'services', PREFIX_STACK_NAME, '-f', f'name={self.service_name}', '--format',
-                 '{{.Replicas}}', ],
-                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            return f'{result.stdout}{result.stderr}'
+            return self.snapshot.replicas(self.service_name)
         else:
             return '-/-'
 
@@ -465,16 +894,29 @@ class SwarmService:
                 print(f'SwarmService("{self.name}").deploy_service: Service has already been deployed.')
             else:
                 print(f'SwarmService("{self.name}").deploy_service: Service deploying ... ')
-                command = (f'cd {self.dir_path}; '
-                           f'docker stack deploy --compose-file {self.service_file} {PREFIX_STACK_NAME} --detach')
-                os.system(command)
+                try:
+                    code, output = self.engine.run(self.stack_deploy())
+                except OSError as e:
+                    print(f'SwarmService("{self.name}").deploy_service: Failed to deploy, {e}.')
+                else:
+                    print(output, end='')
+                self.snapshot.expire()
         else:
             print(f'SwarmService("{self.name}").deploy_service: Failed to deploy, service is not available.')
 
+    async def stack_deploy(self):
+        return await stack_deploy(self.dir_path, self.service_file)
+
     def remove(self, remove_file=False):
         if self.is_deployed:
             print(f'SwarmService("{self.name}").remove_service: Removing this service.')
-            os.system(f'docker service rm {self.service_name}')
+            try:
+                self.engine.run(self.engine.remove_service(self.service_name))
+            except (OSError, IMDockerError, asyncio.TimeoutError) as e:
+                print(f'SwarmService("{self.name}").remove_service: Failed to remove, {e}.')
+            else:
+                print(self.service_name)
+            self.snapshot.expire()
             if remove_file:
                 if os.path.isfile(os.path.join(self.dir_path, self.service_file)):
                     try:
@@ -488,36 +930,123 @@ class SwarmService:
 
     def show_info(self):
         if self.is_deployed:
-            os.system(f'docker service inspect {self.service_name} --pretty')
+            try:
+                service, networks = self.engine.run(self.engine.gather(self.engine.inspect_service(self.service_name),
+                                                                       self.engine.networks()))
+            except (OSError, IMDockerError, asyncio.TimeoutError) as e:
+                print(f'SwarmService("{self.name}").show_info: Failed to inspect service, {e}.')
+                return
+            print(service_pretty(service, networks))
         else:
             print(f'No information for "{self.name}" as it has not been deployed.')
 
     def show_ps(self):
         if self.is_deployed:
-            os.system(f'docker service ps --no-trunc {self.service_name}')
+            try:
+                service, tasks, nodes = self.engine.run(
+                    self.engine.gather(self.engine.inspect_service(self.service_name),
+                                       self.engine.tasks(service=self.service_name), self.engine.nodes()))
+            except (OSError, IMDockerError, asyncio.TimeoutError) as e:
+                print(f'SwarmService("{self.name}").show_ps: Failed to get tasks, {e}.')
+                return
+            tasks = [item for item in tasks if item.get('ServiceID') == service['ID']]
+            print(tabulate(task_table(tasks, [service], nodes, no_trunc=True), headers="firstrow", tablefmt='plain'))
         else:
             print(f'No information for "{self.name}" as it has not been deployed.')
 
-    def show_logs(self):
+    def show_logs(self, follow=True, tail=1000):
         print(self)
         if self.is_deployed:
-            if self.service_type == 'ioc' or 'iocLogServer' in self.service_name:
-                os.system(f'docker service logs --follow --tail=1000 --raw {self.service_name}')
-            else:
-                os.system(f'docker service logs --follow --tail=1000 {self.service_name}')
+            raw = self.service_type == 'ioc' or 'iocLogServer' in self.service_name
+            try:
+                self.engine.run(self.print_logs(raw=raw, follow=follow, tail=tail))
+            except KeyboardInterrupt:
+                pass
+            except (OSError, IMDockerError, asyncio.TimeoutError) as e:
+                print(f'SwarmService("{self.name}").show_logs: Failed to get logs, {e}.')
         else:
             print(f'No logs for "{self.name}" as it has not been deployed yet.')
 
+    async def print_logs(self, raw=False, follow=True, tail=1000):
+        task_names = {}
+        if not raw:
+            # logs are prefixed with task name and node, the same as "docker service logs".
+            service, tasks, nodes = await self.engine.gather(self.engine.inspect_service(self.service_name),
+                                                             self.engine.tasks(service=self.service_name),
+                                                             self.engine.nodes())
+            hostnames = {item['ID']: item['Description']['Hostname'] for item in nodes}
+            for item in tasks:
+                task_names[item['ID']] = (f'{task_name(item, service)}.{item["ID"][:12]}'
+                                          f'@{hostnames.get(item.get("NodeID"), item.get("NodeID", ""))}')
+        async for stream_type, line in self.engine.service_logs(self.service_name, follow=follow, tail=tail,
+                                                                details=not raw):
+            if not raw:
+                details, _, line = line.partition(' ')
+                details = dict(item.split('=', maxsplit=1) for item in details.split(',') if '=' in item)
+                task_id = details.get('com.docker.swarm.task.id', '')
+                line = f'{task_names.get(task_id, task_id)}    | {line}'
+            print(line, file=sys.stderr if stream_type == 2 else sys.stdout, flush=True)
+
     def update(self):
         print(self)
         if self.is_deployed:
-            command = (f'cd {self.dir_path}; '
-                       f'docker stack deploy --compose-file {self.service_file} {PREFIX_STACK_NAME} --detach')
-            os.system(command)
+            try:
+                code, output = self.engine.run(self.stack_deploy())
+            except OSError as e:
+                print(f'Failed to update "{self.name}", {e}.')
+            else:
+                print(output, end='')
+            self.snapshot.expire()
         else:
             print(f'Failed to update "{self.name}" as it has not been deployed yet.')
 
 
+class SwarmShard:
+    def __init__(self, name, snapshot=None):
+        """
+        Sharded stack file with multiple IOC services, generated by "exec --gen-swarm-file alliocs --shard-by".
+        A shard is deployed by one "docker stack deploy", while its services are still named and managed as
+        services of each IOC project.
+
+        :param name: name of sharded stack file without extension.
+        :param snapshot: SwarmStateSnapshot shared with other services.
+        """
+        self.name = name
+        self.service_name = name
+        self.dir_path = os.path.join(MOUNT_PATH, SWARM_DIR, SWARM_SHARD_DIR)
+        self.service_file = f'{name}.yaml'
+        self.snapshot = snapshot if snapshot else SwarmStateSnapshot()
+        self.engine = self.snapshot.engine
+
+    def __repr__(self):
+        return f'SwarmShard("{self.name}")'
+
+    @staticmethod
+    def get_all_shards(snapshot=None):
+        shard_path = os.path.join(MOUNT_PATH, SWARM_DIR, SWARM_SHARD_DIR)
+        if not os.path.isdir(shard_path):
+            return []
+        return [SwarmShard(item[:-len('.yaml')], snapshot=snapshot) for item in sorted(os.listdir(shard_path))
+                if item.endswith('.yaml')]
+
+    @property
+    def is_available(self):
+        return os.path.isfile(os.path.join(self.dir_path, self.service_file))
+
+    @property
+    def services(self):
+        with open(os.path.join(self.dir_path, self.service_file)) as f:
+            yaml_data = yaml.safe_load(f)
+        return [f'{PREFIX_STACK_NAME}_{item}' for item in yaml_data.get('services', {})]
+
+    @property
+    def is_deployed(self):
+        return all(self.snapshot.is_deployed(item) for item in self.services)
+
+    async def stack_deploy(self):
+        return await stack_deploy(self.dir_path, self.service_file)
+
+
 if __name__ == '__main__':
     # SwarmManager.show_deployed_services()
     # SwarmManager.show_join_tokens()
@@ -530,7 +1059,7 @@ if __name__ == '__main__':
     # s.show_info()
     # print(s.current_state)
     # SwarmManager().show_info()
-    # print(SwarmManager().get_services_from_docker())
+    # print(SwarmManager().snapshot.service_names)
     # SwarmManager().list_running_services()
     # SwarmManager.backup_swarm()
     print(SwarmManager.get_deployed_swarm_services())
@@ -0,0 +1,136 @@
+#!/usr/bin/python3
+
+# Test of restoring IOC projects from full backups and incremental backups, in a temporary manager directory.
+# A repository of a few IOC projects is backed up, changed and backed up again, then IOC projects are restored
+# selectively by "only" and by point in time "at", and files restored are compared with the ones backed up.
+#
+# run "./tests/backup-restore-test.py" to test.
+
+import io
+import os
+import sys
+import time
+import shutil
+import tempfile
+import contextlib
+
+tests_dir = os.path.dirname(os.path.abspath(__file__))
+
+temp_dir = tempfile.mkdtemp(prefix='backup_restore_test_')
+os.makedirs(os.path.join(temp_dir, 'imtools'))
+os.environ['MANAGER_PATH'] = temp_dir
+os.environ['MOUNT_PATH'] = os.path.join(temp_dir, 'mount')
+sys.path.insert(0, os.path.dirname(tests_dir))
+
+from imutils.IMConfig import REPOSITORY_PATH, IOC_CONFIG_FILE, RESTORE_STAGING_DIR  # noqa: E402
+from imutils.IMBackup import open_backup_iocs, list_backups, find_backup  # noqa: E402
+from imutils.IocClass import repository_backup, restore_backup, get_all_ioc  # noqa: E402
+
+backup_dir = os.path.join(temp_dir, 'backup')
+ioc_names = ('ioc_a', 'ioc_b', 'ioc_c')
+
+
+def make_repository(version):
+    for name in ioc_names:
+        src_path = os.path.join(REPOSITORY_PATH, name, 'src', 'db')
+        os.makedirs(src_path, exist_ok=True)
+        with open(os.path.join(REPOSITORY_PATH, name, IOC_CONFIG_FILE), 'w') as f:
+            f.write(f'[IOC]\nname = {name}\nhost = swarm\nimage = image.dals/ioc\nbin = ST-IOC\nmodule = autosave\n')
+        with open(os.path.join(src_path, f'{name}.db'), 'w') as f:
+            f.write(f'record(ai, "{name}:{version}") {{}}\n')
+    os.symlink(f'{ioc_names[0]}.db', os.path.join(REPOSITORY_PATH, ioc_names[0], 'src', 'db', 'link.db'))
+
+
+def read_tree(path):
+    res = {}
+    for root, dirs, files in os.walk(path):
+        for item in files:
+            file_path = os.path.join(root, item)
+            rel_path = os.path.relpath(file_path, path)
+            if rel_path.startswith('.'):
+                continue
+            if os.path.islink(file_path):
+                res[rel_path] = f'-> {os.readlink(file_path)}'
+            else:
+                with open(file_path) as f:
+                    res[rel_path] = f.read()
+    return res
+
+
+def src_of(name):
+    return read_tree(os.path.join(REPOSITORY_PATH, name, 'src'))
+
+
+def quiet(func, *args, **kwargs):
+    with io.StringIO() as buf, contextlib.redirect_stdout(buf):
+        return func(*args, **kwargs)
+
+
+def check(title, condition):
+    print(f'{title:<60} {"OK" if condition else "FAILED"}')
+    assert condition, title
+
+
+if __name__ == '__main__':
+    try:
+        make_repository('v1')
+        v1 = {name: src_of(name) for name in ioc_names}
+        check('full backup created', quiet(repository_backup, 'src', backup_dir))
+        check('incremental backup created', quiet(repository_backup, 'src', backup_dir, incremental=True))
+        time.sleep(1.1)  # backups are named by time in seconds.
+        shutil.rmtree(REPOSITORY_PATH)
+        make_repository('v2')
+        v2 = {name: src_of(name) for name in ioc_names}
+        check('incremental backup of changes created', quiet(repository_backup, 'src', backup_dir,
+                                                             incremental=True))
+        backups = list_backups(backup_dir)
+        check('backups listed in order', len(backups) == 3 and backups == sorted(backups))
+        archive_path = [path for time_str, path in backups if path.endswith('.tar.gz')][0]
+        manifest_path = [path for time_str, path in backups if path.endswith('.json')][0]
+
+        for time_str, path in backups:
+            with open_backup_iocs(path) as backup_iocs:
+                names = []
+                for backup_name, ioc_item, extract in backup_iocs:
+                    names.append(ioc_item)
+                    if ioc_item == 'ioc_b':
+                        dest_dir = os.path.join(temp_dir, 'extract', time_str)
+                        extract(dest_dir)
+            kind = 'manifest' if path.endswith('.json') else 'archive'
+            check(f'IOC projects of {kind} read in one pass', names == sorted(ioc_names))
+            check(f'files of one IOC project extracted from {kind}', read_tree(os.path.join(dest_dir, 'src')) ==
+                  (v2 if path == backups[-1][1] else v1)['ioc_b'])
+
+        check('latest backup found', find_backup(backup_dir) == backups[-1][1])
+        check('backup at given time found', find_backup(backup_dir, at=backups[1][0]) == backups[1][1])
+        check('no backup before the first one', find_backup(backup_dir, at='20000101') is None)
+
+        # restore "ioc_b" of the earlier backups only, the others keep their changes.
+        res = quiet(restore_backup, backup_dir, force_overwrite=True, at=backups[0][0], only=['ioc_b'])
+        check('IOC project given by "only" restored', res and src_of('ioc_b') == v1['ioc_b'])
+        check('IOC projects not given by "only" untouched',
+              src_of('ioc_a') == v2['ioc_a'] and src_of('ioc_c') == v2['ioc_c'])
+        check('staging directory removed', not os.path.exists(os.path.join(REPOSITORY_PATH, RESTORE_STAGING_DIR)))
+
+        res = quiet(restore_backup, backup_dir, force_overwrite=True, only=['ioc_a', 'ioc_x'])
+        check('failed if IOC project given by "only" not in backup', res is False and src_of('ioc_a') == v2['ioc_a'])
+
+        # restore everything into an empty repository.
+        for path in (archive_path, manifest_path):
+            kind = 'manifest' if path.endswith('.json') else 'archive'
+            shutil.rmtree(REPOSITORY_PATH)
+            res = quiet(restore_backup, path, force_overwrite=False)
+            check(f'all IOC projects restored from {kind} into new repository',
+                  res and all(src_of(name) == v1[name] for name in ioc_names))
+            check(f'symlink restored from {kind}', src_of('ioc_a')['db/link.db'] == '-> ioc_a.db')
+            check(f'restored IOC projects from {kind} listed and marked',
+                  [(item.name, item.state_manager.get_config('status')) for item in get_all_ioc(read_mode=True)] ==
+                  [(name, 'restored') for name in ioc_names])
+        check('failed if no backup at given time', quiet(restore_backup, backup_dir, False, at='2000') is False)
+        # staging directory left by an interrupted restoring is not taken as an IOC project.
+        shutil.copytree(os.path.join(REPOSITORY_PATH, 'ioc_a'), os.path.join(REPOSITORY_PATH, RESTORE_STAGING_DIR,
+                                                                             'ioc_a'))
+        check('staging directory not listed', [item.name for item in get_all_ioc()] == list(ioc_names))
+        print('OK')
+    finally:
+        shutil.rmtree(temp_dir)
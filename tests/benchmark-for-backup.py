@@ -0,0 +1,107 @@
+#!/usr/bin/python3
+
+# Benchmark of backup throughput by repository_backup() in "all" mode, compressed by one thread and several threads.
+# A synthetic repository with log files in running dir is created in a temporary directory, the real repository
+# is not touched. Archives are checked to be readable by gzip module, as "tar -xzf" and restore_backup() read them.
+#
+# run "./tests/benchmark-for-backup.py" to benchmark with 20 IOC projects each with 20MB of logs.
+# run "./tests/benchmark-for-backup.py 50 10 8" to benchmark with 50 IOC projects, 10MB of logs and 8 threads.
+
+import io
+import os
+import sys
+import gzip
+import time
+import random
+import shutil
+import tarfile
+import tempfile
+import contextlib
+
+ioc_num = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+log_size = int(float(sys.argv[2]) * 1024 * 1024) if len(sys.argv) > 2 else 20 * 1024 * 1024
+workers = int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count() or 4
+
+temp_dir = tempfile.mkdtemp(prefix='benchmark_backup_')
+os.makedirs(os.path.join(temp_dir, 'imtools'))
+os.environ['MANAGER_PATH'] = temp_dir
+os.environ['MOUNT_PATH'] = os.path.join(temp_dir, 'mount')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from imutils.IMConfig import REPOSITORY_PATH, MOUNT_PATH, IOC_CONFIG_FILE, IOC_STATE_INFO_FILE  # noqa: E402
+from imutils.IocClass import repository_backup  # noqa: E402
+
+
+def make_repository():
+    random.seed(0)
+    words = [f'{random.choice(["PV", "ERR", "INFO", "caput"])}:{i}' for i in range(2000)]
+    for i in range(ioc_num):
+        name = f'bench_{i:04d}'
+        ioc_path = os.path.join(REPOSITORY_PATH, name)
+        os.makedirs(os.path.join(ioc_path, 'src'))
+        os.makedirs(os.path.join(ioc_path, 'project', 'startup'))
+        with open(os.path.join(ioc_path, IOC_CONFIG_FILE), 'w') as f:
+            f.write(f'[IOC]\nname = {name}\nhost = swarm\nimage = image.dals/ioc-exec:beta\nbin = ST-IOC\n'
+                    f'module = autosave, caputlog\ndescription = \n\n[SRC]\ndb_file = ramper.db\n\n'
+                    f'[DB]\nload = ramper.db, name={name}\n')
+        with open(os.path.join(ioc_path, IOC_STATE_INFO_FILE), 'w') as f:
+            f.write('[STATE]\nstate = normal\nstate_info = \nstatus = exported\nsnapshot = tracked\n'
+                    'is_exported = true\n')
+        with open(os.path.join(ioc_path, 'src', 'ramper.db'), 'w') as f:
+            f.write('record(calc, "$(name):ramper") {}\n')
+        # logs of IOC are text with timestamps, compressed to about 1/4 as real ones.
+        log_path = os.path.join(MOUNT_PATH, 'swarm', name, 'log')
+        os.makedirs(log_path)
+        with open(os.path.join(log_path, f'{name}.log'), 'w') as f:
+            written = 0
+            while written < log_size:
+                line = f'2024-01-02 10:{random.randrange(60):02d}:{random.random() * 60:06.3f} ' \
+                       f'{" ".join(random.choices(words, k=8))}\n'
+                written += f.write(line)
+
+
+def timed_backup(backup_dir, backup_workers):
+    start = time.perf_counter()
+    with io.StringIO() as buf, contextlib.redirect_stdout(buf):
+        repository_backup('all', backup_dir, workers=backup_workers)
+        output = buf.getvalue()
+    elapsed = time.perf_counter() - start
+    archives = [item for item in os.listdir(backup_dir) if item.endswith('.ioc.tar.gz')]
+    assert len(archives) == 1, output
+    return elapsed, os.path.join(backup_dir, archives[0])
+
+
+def check_archive(file_path):
+    with gzip.open(file_path, 'rb') as f, tarfile.open(fileobj=f, mode='r|') as tar:
+        return sum(item.size for item in tar if item.isreg())
+
+
+def legacy_backup(backup_dir):
+    # single-threaded "w:gz" mode of tarfile with default level 9, as backups were written before.
+    os.makedirs(backup_dir)
+    start = time.perf_counter()
+    file_path = os.path.join(backup_dir, 'legacy.ioc.tar.gz')
+    with tarfile.open(file_path, 'w:gz') as tar:
+        tar.add(REPOSITORY_PATH, arcname='repository')
+        tar.add(MOUNT_PATH, arcname='mount')
+    return time.perf_counter() - start, file_path
+
+
+if __name__ == '__main__':
+    try:
+        make_repository()
+        total = ioc_num * log_size
+        results = []
+        legacy_time, legacy_path = legacy_backup(os.path.join(temp_dir, 'legacy'))
+        results.append(('tarfile "w:gz" level 9', legacy_time, os.path.getsize(legacy_path)))
+        for backup_workers in sorted({1, workers}):
+            backup_dir = os.path.join(temp_dir, f'backup_{backup_workers}')
+            elapsed, file_path = timed_backup(backup_dir, backup_workers)
+            assert check_archive(file_path) >= total
+            results.append((f'parallel gzip, {backup_workers:>2} threads', elapsed, os.path.getsize(file_path)))
+        print(f'IOC projects: {ioc_num}, logs: {ioc_num} x {log_size / 1024 / 1024:.1f}MB, CPUs: {os.cpu_count()}')
+        for title, elapsed, size in results:
+            print(f'{title:<28} {elapsed:7.3f}s, {total / elapsed / 1024 / 1024:7.1f}MB/s, '
+                  f'compressed to {size / total * 100:5.1f}%, speedup {legacy_time / elapsed:.2f}x')
+    finally:
+        shutil.rmtree(temp_dir)
@@ -0,0 +1,86 @@
+#!/usr/bin/python3
+
+# Benchmark of loading IOC projects by get_all_ioc() one by one and concurrently.
+# A synthetic repository is created in a temporary directory, the real repository is not touched.
+#
+# run "./tests/benchmark-for-get-all-ioc.py" to benchmark with 1000 IOC projects.
+# run "./tests/benchmark-for-get-all-ioc.py 300 16" to benchmark with 300 IOC projects and 16 threads.
+# run "./tests/benchmark-for-get-all-ioc.py 1000 8 2" to add 2ms latency to each file system call, as on NFS.
+
+import os
+import sys
+import time
+import shutil
+import builtins
+import tempfile
+
+ioc_num = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+workers = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+latency = float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0
+
+temp_dir = tempfile.mkdtemp(prefix='benchmark_get_all_ioc_')
+os.makedirs(os.path.join(temp_dir, 'imtools'))
+os.environ['MANAGER_PATH'] = temp_dir
+os.environ['MOUNT_PATH'] = os.path.join(temp_dir, 'mount')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from imutils.IMConfig import REPOSITORY_PATH, IOC_CONFIG_FILE, IOC_STATE_INFO_FILE  # noqa: E402
+from imutils.IocClass import get_all_ioc  # noqa: E402
+
+
+def make_repository():
+    for i in range(ioc_num):
+        name = f'bench_{i:04d}'
+        ioc_path = os.path.join(REPOSITORY_PATH, name)
+        os.makedirs(os.path.join(ioc_path, 'src'))
+        with open(os.path.join(ioc_path, IOC_CONFIG_FILE), 'w') as f:
+            f.write(f'[IOC]\nname = {name}\nhost = swarm\nimage = image.dals/ioc-exec:beta\nbin = ST-IOC\n'
+                    f'module = autosave, caputlog\ndescription = \n\n'
+                    f'[SRC]\ndb_file = ramper.db\nprotocol_file = \nothers_file = \n\n'
+                    f'[DB]\nload = ramper.db, name={name}\n\n'
+                    f'[DEPLOY]\nlabels = test=true\ncpu-limit = 1\nmemory-limit = 1G\n')
+        with open(os.path.join(ioc_path, IOC_STATE_INFO_FILE), 'w') as f:
+            f.write('[STATE]\nstate = normal\nstate_info = \nstatus = created\nsnapshot = untracked\n'
+                    'is_exported = false\n')
+        with open(os.path.join(ioc_path, 'src', 'ramper.db'), 'w') as f:
+            f.write('record(calc, "$(name):ramper") {}\n')
+
+
+def add_latency():
+    def delayed(func):
+        def wrapper(*args, **kwargs):
+            time.sleep(latency)
+            return func(*args, **kwargs)
+
+        return wrapper
+
+    builtins.open = delayed(builtins.open)
+    os.stat = delayed(os.stat)
+    os.listdir = delayed(os.listdir)
+
+
+def timed_load(load_workers):
+    start = time.perf_counter()
+    # rebuild index so that every IOC project is parsed again, as on a cold repository.
+    ioc_list = get_all_ioc(read_mode=True, rebuild_index=True, workers=load_workers)
+    return time.perf_counter() - start, len(ioc_list)
+
+
+if __name__ == '__main__':
+    try:
+        make_repository()
+        if latency:
+            add_latency()
+        timed_load(1)  # warm up file system cache.
+        serial_time, serial_num = timed_load(1)
+        parallel_time, parallel_num = timed_load(workers)
+        assert serial_num == parallel_num == ioc_num
+        start = time.perf_counter()
+        get_all_ioc(read_mode=True, workers=workers)
+        index_time = time.perf_counter() - start
+        print(f'IOC projects: {ioc_num}, file system latency: {latency * 1000:.1f}ms')
+        print(f'serial load:             {serial_time:.3f}s')
+        print(f'parallel load({workers:>2} threads): {parallel_time:.3f}s, speedup {serial_time / parallel_time:.2f}x')
+        print(f'indexed load:            {index_time:.3f}s')
+    finally:
+        shutil.rmtree(temp_dir)
@@ -0,0 +1,157 @@
+#!/usr/bin/python3
+
+# Test of docker related functions against fake Docker Engine API server, no docker daemon needed.
+# Fake server "tests/fake-docker-engine.py" is started on a temporary unix socket with recorded responses.
+#
+# run "./tests/docker-engine-test.py" to test.
+
+import io
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+import contextlib
+
+delay = 0.2  # seconds to delay each response of fake server, to check requests are sent concurrently.
+tests_dir = os.path.dirname(os.path.abspath(__file__))
+
+temp_dir = tempfile.mkdtemp(prefix='docker_engine_test_')
+socket_path = os.path.join(temp_dir, 'docker.sock')
+manager_path = os.path.join(temp_dir, 'manager')
+os.makedirs(os.path.join(manager_path, 'imtools'))
+os.environ['MANAGER_PATH'] = manager_path
+os.environ['MOUNT_PATH'] = os.path.join(temp_dir, 'ioc-for-docker')
+os.environ['DOCKER_SOCKET_PATH'] = socket_path
+os.environ['PATH'] = f'{os.path.join(temp_dir, "bin")}{os.pathsep}{os.environ["PATH"]}'
+sys.path.insert(0, os.path.dirname(tests_dir))
+
+from imutils.IMConfig import REPOSITORY_PATH, MOUNT_PATH, IOC_SERVICE_FILE  # noqa: E402
+from imutils.IMError import IMDockerError  # noqa: E402
+from imutils.DockerEngine import DockerEngine  # noqa: E402
+from imutils.SwarmClass import SwarmManager, SwarmService, SwarmStateSnapshot  # noqa: E402
+
+
+def start_server():
+    server = subprocess.Popen([sys.executable, os.path.join(tests_dir, 'fake-docker-engine.py'), socket_path,
+                               os.path.join(tests_dir, 'docker-engine-records.json'), str(delay)],
+                              stdout=subprocess.DEVNULL)
+    for i in range(100):
+        if os.path.exists(socket_path):
+            break
+        time.sleep(0.05)
+    else:
+        server.kill()
+        raise RuntimeError('fake Docker Engine API server not started.')
+    return server
+
+
+def make_services():
+    # ioc1 and ioc2 are deployed in recorded responses, ioc6 has no compose file.
+    for i in range(1, 7):
+        os.makedirs(os.path.join(REPOSITORY_PATH, f'ioc{i}'))
+        if i != 6:
+            os.makedirs(os.path.join(MOUNT_PATH, 'swarm', f'ioc{i}'))
+            with open(os.path.join(MOUNT_PATH, 'swarm', f'ioc{i}', IOC_SERVICE_FILE), 'w') as f:
+                f.write(f'services:\n  srv-ioc{i}:\n    image: image.dals/ioc-exec:beta\n')
+    # docker CLI is only used for "docker stack deploy", which fails for ioc5.
+    os.makedirs(os.path.join(temp_dir, 'bin'))
+    with open(os.path.join(temp_dir, 'bin', 'docker'), 'w') as f:
+        f.write(f'#!/bin/sh\nsleep {delay}\n'
+                f'if [ "$(basename $(pwd))" = "ioc5" ]; then echo "failed to create service" >&2; exit 1; fi\n'
+                f'echo "Creating service dals_srv-$(basename $(pwd))"\n')
+    os.chmod(os.path.join(temp_dir, 'bin', 'docker'), 0o755)
+
+
+def output_of(func, *args, **kwargs):
+    with io.StringIO() as buf, contextlib.redirect_stdout(buf), contextlib.redirect_stderr(buf):
+        func(*args, **kwargs)
+        return buf.getvalue()
+
+
+def received_requests():
+    return DockerEngine().run(DockerEngine(api_version='_fake').request('GET', '/requests'))
+
+
+def check(title, condition):
+    print(f'{title:<60} {"OK" if condition else "FAILED"}')
+    assert condition, title
+
+
+if __name__ == '__main__':
+    fake_server = start_server()
+    try:
+        make_services()
+        engine = DockerEngine()
+
+        start = time.perf_counter()
+        snapshot = SwarmStateSnapshot()
+        names = snapshot.service_names
+        check('snapshot lists services of stack', names == ['dals_srv-ioc1', 'dals_srv-ioc2', 'dals_srv-iocLogServer'])
+        check('snapshot fetches services and tasks concurrently', time.perf_counter() - start < 2 * delay)
+        check('replicas of replicated service', snapshot.replicas('dals_srv-ioc2') == '1/1')
+        check('replicas of global service', snapshot.replicas('dals_srv-iocLogServer') == '2/2')
+        check('state of latest task', snapshot.current_state('dals_srv-ioc2').startswith('Running '))
+        check('service not deployed', not SwarmService('ioc3', service_type='ioc', snapshot=snapshot).is_deployed)
+
+        start = time.perf_counter()
+        res = engine.run_all([engine.inspect_service(name) for name in names * 4])
+        check('12 inspect requests run concurrently', time.perf_counter() - start < 4 * delay)
+        check('inspect results kept in order', [item['Spec']['Name'] for item in res] == names * 4)
+        res = engine.run_all([engine.inspect_service('dals_srv-ioc3')])
+        check('error response raised as IMDockerError', isinstance(res[0], IMDockerError) and '404' in str(res[0]))
+
+        out = output_of(SwarmManager.show_deployed_services)
+        check('stack ps shows running tasks', 'dals_srv-ioc1.1' in out and 'worker1' in out)
+        check('stack ps hides shutdown tasks', 'non-zero exit' not in out)
+        out = output_of(SwarmManager.show_deployed_services_detail)
+        check('stack ps detail shows task history', '\\_ dals_srv-ioc2.1' in out and 'non-zero exit (1)' in out)
+        out = output_of(SwarmManager.show_deployed_machines, show_detail=True)
+        check('node ls marks current node and leader', '*manager1*' in out and 'Leader' in out)
+        check('node details show labels', 'worker1(192.168.1.11):\tioc-host=true worker=1' in out)
+        out = output_of(SwarmManager.show_join_tokens)
+        check('join tokens shown', 'SWMTKN-1-' in out and '192.168.1.10:2377' in out)
+
+        service = SwarmService('ioc1', service_type='ioc')
+        out = output_of(service.show_info)
+        check('service inspect shows image and network name',
+              'image.dals/ioc-exec:beta' in out and 'Networks: dals_default' in out)
+        out = output_of(service.show_ps)
+        check('service ps shows tasks of service only', 'dals_srv-ioc1.1' in out and 'dals_srv-ioc2' not in out)
+        out = output_of(service.show_logs, follow=False)
+        check('raw logs of IOC demultiplexed', 'iocInit: All initialization complete\n' in out and
+              'Warning: IOC is booting' in out and out.rstrip().endswith('epics>'))
+        log_server = SwarmService('iocLogServer', service_type='global')
+        out = output_of(engine.run, log_server.print_logs(raw=False, follow=False))
+        check('logs prefixed with task and node', 'dals_srv-iocLogServer.' in out and '@manager1    | ' in out)
+        output_of(service.remove)
+        check('service removed by API', {'method': 'DELETE', 'path': '/services/dals_srv-ioc1', 'query': ''}
+              in received_requests())
+
+        manager = SwarmManager()
+        start = time.perf_counter()
+        out = output_of(manager.deploy_all_iocs, workers=4)
+        check('deploy of 3 IOC services runs concurrently', time.perf_counter() - start < 3.5 * delay)
+        lines = out.splitlines()
+        check('progress line for each service', len([line for line in lines if line.startswith('SwarmManager: [')]) == 6)
+        check('output of failed service captured', ' "dals_srv-ioc5" '.center(70, '=') in lines and
+              'failed to create service' in out and 'Creating service dals_srv-ioc3' not in out)
+        check('summary of deploying', 'Finished' in lines[-1] and '2 deployed, 2 skipped, 2 failed' in lines[-1])
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            res = manager.operate_services('remove', [manager.services['ioc1'], manager.services['ioc3']])
+        check('remove skips services not deployed', [item[1] for item in res] == ['removed', 'skipped'])
+
+        async def broken_deploy():
+            raise KeyError('image')
+
+        manager.services['ioc3'].stack_deploy = broken_deploy
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            res = manager.operate_services('deploy', [manager.services['ioc1'], manager.services['ioc3']])
+        check('unexpected error fails only its service', [item[1] for item in res] == ['skipped', 'failed'] and
+              'KeyError' in res[1][2])
+        print('OK')
+    finally:
+        fake_server.terminate()
+        fake_server.wait()
+        shutil.rmtree(temp_dir)
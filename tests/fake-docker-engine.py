@@ -0,0 +1,96 @@
+#!/usr/bin/python3
+
+# Fake Docker Engine API server, which plays back recorded responses of a swarm over unix socket.
+# Used for testing docker related functions without a docker daemon.
+#
+# run "./tests/fake-docker-engine.py /tmp/fake-docker.sock" to serve "tests/docker-engine-records.json".
+# run "./tests/fake-docker-engine.py /tmp/fake-docker.sock records.json 0.1" to delay each response for 0.1s.
+#
+# records file is a JSON list of {"method", "path", "status", "body"} or {"method", "path", "status", "stream"},
+# "path" is API path without version prefix, "stream" is a list of [stream type, text] sent as multiplexed frames.
+# requests received are listed by "GET /_fake/requests".
+
+import os
+import re
+import sys
+import json
+import asyncio
+from urllib.parse import urlsplit, unquote
+
+socket_path = sys.argv[1] if len(sys.argv) > 1 else '/tmp/fake-docker.sock'
+records_path = sys.argv[2] if len(sys.argv) > 2 else os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                   'docker-engine-records.json')
+delay = float(sys.argv[3]) if len(sys.argv) > 3 else 0
+
+received = []
+
+
+def find_record(records, method, path):
+    for item in records:
+        if item['method'] == method and item['path'] == path:
+            return item
+    return None
+
+
+def chunk(data):
+    return f'{len(data):x}\r\n'.encode() + data + b'\r\n'
+
+
+async def handle(reader, writer, records):
+    request_line = (await reader.readline()).decode().split()
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        key, _, value = line.decode().partition(':')
+        headers[key.strip().lower()] = value.strip()
+    if int(headers.get('content-length', 0)):
+        await reader.readexactly(int(headers['content-length']))
+    if len(request_line) < 2:
+        writer.close()
+        return
+    method, target = request_line[0], request_line[1]
+    url = urlsplit(target)
+    path = re.sub(r'^/v[\d.]+', '', unquote(url.path))
+    received.append({'method': method, 'path': path, 'query': url.query})
+    if delay:
+        await asyncio.sleep(delay)
+    if path == '/_fake/requests':
+        record = {'status': 200, 'body': received}
+    else:
+        record = find_record(records, method, path) or {'status': 404, 'body': {'message': 'page not found'}}
+    writer.write(f'HTTP/1.1 {record["status"]} OK\r\nServer: fake-docker-engine\r\nConnection: close\r\n'.encode())
+    if 'stream' in record:
+        writer.write(b'Content-Type: application/vnd.docker.raw-stream\r\nTransfer-Encoding: chunked\r\n\r\n')
+        for stream_type, text in record['stream']:
+            data = text.encode()
+            writer.write(chunk(bytes([stream_type, 0, 0, 0]) + len(data).to_bytes(4, 'big') + data))
+            await writer.drain()
+        writer.write(b'0\r\n\r\n')
+    else:
+        data = json.dumps(record['body']).encode() if record.get('body') is not None else b''
+        writer.write(f'Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n'.encode() + data)
+    await writer.drain()
+    writer.close()
+
+
+async def main():
+    with open(records_path) as f:
+        records = json.load(f)
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    server = await asyncio.start_unix_server(lambda r, w: handle(r, w, records), path=socket_path)
+    print(f'fake-docker-engine: Serving "{records_path}" on "{socket_path}".', flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
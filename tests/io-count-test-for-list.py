@@ -0,0 +1,91 @@
+#!/usr/bin/python3
+
+# Test of how many file system calls "IocManager list" makes on a synthetic repository.
+# A synthetic repository is created in a temporary directory, the real repository is not touched.
+#
+# run "./tests/io-count-test-for-list.py" to test with 200 IOC projects.
+
+import os
+import sys
+import shutil
+import builtins
+import tempfile
+import contextlib
+
+ioc_num = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+temp_dir = tempfile.mkdtemp(prefix='io_count_test_')
+os.makedirs(os.path.join(temp_dir, 'imtools'))
+os.environ['MANAGER_PATH'] = temp_dir
+os.environ['MOUNT_PATH'] = os.path.join(temp_dir, 'mount')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from imutils.IMConfig import REPOSITORY_PATH, IOC_CONFIG_FILE, IOC_STATE_INFO_FILE  # noqa: E402
+from imutils.IMUtil import get_filtered_ioc  # noqa: E402
+
+counter = {'open': 0, 'stat': 0, 'listdir': 0}
+
+
+def make_repository():
+    for i in range(ioc_num):
+        name = f'test_{i:04d}'
+        ioc_path = os.path.join(REPOSITORY_PATH, name)
+        os.makedirs(os.path.join(ioc_path, 'src'))
+        with open(os.path.join(ioc_path, IOC_CONFIG_FILE), 'w') as f:
+            f.write(f'[IOC]\nname = {name}\nhost = {"swarm" if i % 2 else "worker"}\nimage = image.dals/ioc\n'
+                    f'bin = ST-IOC\nmodule = autosave\n')
+        with open(os.path.join(ioc_path, IOC_STATE_INFO_FILE), 'w') as f:
+            f.write('[STATE]\nstate = normal\nstate_info = \nstatus = created\nsnapshot = untracked\n')
+    # files modified recently are not trusted by repository index.
+    for root, dirs, files in os.walk(REPOSITORY_PATH):
+        for item in dirs + files:
+            os.utime(os.path.join(root, item), (1, 1))
+
+
+def add_counter():
+    def counted(func, key):
+        def wrapper(path, *args, **kwargs):
+            if str(path).startswith(temp_dir):
+                counter[key] += 1
+            return func(path, *args, **kwargs)
+
+        return wrapper
+
+    builtins.open = counted(builtins.open, 'open')
+    os.stat = counted(os.stat, 'stat')
+    os.listdir = counted(os.listdir, 'listdir')
+    os.scandir = counted(os.scandir, 'listdir')
+
+
+def run_list(condition, **kwargs):
+    for key in counter:
+        counter[key] = 0
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        get_filtered_ioc(condition, **kwargs)
+    return dict(counter)
+
+
+def check(title, res, open_num, stat_max):
+    print(f'{title:<40} open={res["open"]:<6} stat={res["stat"]:<6} listdir={res["listdir"]:<6}')
+    assert res['open'] == open_num, f'{title}: expect {open_num} files opened, got {res["open"]}.'
+    assert res['stat'] <= stat_max, f'{title}: expect at most {stat_max} stat calls, got {res["stat"]}.'
+
+
+if __name__ == '__main__':
+    try:
+        make_repository()
+        add_counter()
+        # index file written once, config file and state info file read for each IOC project.
+        check('list host=swarm (cold index)', run_list(['host=swarm'], rebuild_index=True),
+              open_num=2 * ioc_num + 1, stat_max=5 * ioc_num + 1)
+        # only index file read.
+        check('list host=swarm (warm index)', run_list(['host=swarm']), open_num=1, stat_max=5 * ioc_num + 1)
+        # no file read, only directory of each IOC project checked.
+        check('list', run_list([]), open_num=0, stat_max=ioc_num + 1)
+        check('list name=test_0001', run_list(['name=test_0001']), open_num=0, stat_max=ioc_num + 1)
+        # only index file read, and files of one IOC project checked.
+        check('list name=test_0001 -i', run_list(['name=test_0001'], show_info=True), open_num=1,
+              stat_max=ioc_num + 5)
+        print('OK')
+    finally:
+        shutil.rmtree(temp_dir)
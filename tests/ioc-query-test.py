@@ -0,0 +1,100 @@
+#!/usr/bin/python3
+
+# Test of query language used by "IocManager list" to filter IOC projects, on IOC objects made in memory.
+# Queries are parsed and evaluated, and results are compared with the IOC names expected.
+#
+# run "./tests/ioc-query-test.py" to test.
+
+import os
+import sys
+import configparser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from imutils.IMError import IMValueError  # noqa: E402
+from imutils.IocQuery import IocQuery, Condition, parse_query  # noqa: E402
+
+
+class FakeStateManager:
+    def __init__(self, status):
+        self.conf = configparser.ConfigParser()
+        self.conf.read_string(f'[STATE]\nstatus = {status}\n')
+
+
+class FakeIoc:
+    def __init__(self, name, config, status='created'):
+        self.name = name
+        self.conf = configparser.ConfigParser()
+        self.conf.read_string(config)
+        self.state_manager = FakeStateManager(status)
+
+
+iocs = [
+    FakeIoc('ioc_motor1', '[IOC]\nhost = swarm\nimage = image.dals/ioc:beta\nmodule = autosave, caputlog\n'
+                          '[DEPLOY]\nlabels = test, motor\n'),
+    FakeIoc('ioc_motor2', '[IOC]\nhost = worker1\nimage = image.dals/ioc:1.0\nmodule = autosave\n',
+            status='exported'),
+    FakeIoc('ioc_vac', '[IOC]\nhost = swarm\nimage = image.dals/ioc:1.0\n[DEPLOY]\nlabels = vacuum\n'),
+    FakeIoc('vac_gauge', '[IOC]\nimage = image.dals/ioc:beta\nmodule = stream\n', status='exported'),
+]
+
+
+def query(text):
+    loaded = []
+    res = IocQuery(iocs, load_func=lambda ioc_list: loaded.extend(item.name for item in ioc_list)).evaluate(
+        parse_query(text.split()))
+    return sorted(res), sorted(loaded)
+
+
+def check(title, condition):
+    print(f'{title:<60} {"OK" if condition else "FAILED"}')
+    assert condition, title
+
+
+if __name__ == '__main__':
+    cases = [
+        ('host=swarm', ['ioc_motor1', 'ioc_vac']),
+        ('host=swarm image=image.dals/ioc:1.0', ['ioc_vac']),
+        ('host=swarm AND image=image.dals/ioc:1.0', ['ioc_vac']),
+        ('host=worker1 OR host=swarm image~beta', ['ioc_motor1', 'ioc_motor2']),
+        ('( host=worker1 OR host=swarm ) image~beta', ['ioc_motor1']),
+        ('NOT host=swarm', ['ioc_motor2', 'vac_gauge']),
+        ('NOT NOT host=swarm', ['ioc_motor1', 'ioc_vac']),
+        ('NOT ( host=swarm OR STATE.status=exported )', []),
+        ('status=exported', []),
+        ('host!=swarm', ['ioc_motor2', 'vac_gauge']),
+        ('image=*:beta', ['ioc_motor1', 'vac_gauge']),
+        ('image!~beta$', ['ioc_motor2', 'ioc_vac']),
+        ('host=work?r[0-9]', ['ioc_motor2']),
+        ('name=motor', ['ioc_motor1', 'ioc_motor2']),
+        ('name=vac_*', ['vac_gauge']),
+        ('module=auto', ['ioc_motor1', 'ioc_motor2']),
+        ('module=caput*', ['ioc_motor1']),
+        ('module=', ['ioc_vac']),
+        ('DEPLOY.labels~test', ['ioc_motor1']),
+        ('deploy.labels=vacuum', ['ioc_vac']),
+        ('STATE.status=exported', ['ioc_motor2', 'vac_gauge']),
+        ('host=', []),
+        ('DEPLOY.labels!=vacuum', ['ioc_motor1', 'ioc_motor2', 'vac_gauge']),
+    ]
+    for text, expected in cases:
+        check(f'query "{text}"', query(text)[0] == expected)
+
+    node = parse_query('a=1 OR b=2 c=3 OR NOT d=4'.split())
+    check('AND binds tighter than OR', node[0] == 'OR' and len(node[1]) == 3 and node[1][1][0] == 'AND')
+    check('NOT binds tightest', node[1][2][0] == 'NOT' and isinstance(node[1][2][1], Condition))
+    check('invalid conditions skipped', parse_query(['novalue', 'host=swarm']).option == 'host')
+    check('no valid condition gives no query', parse_query(['novalue']) is None)
+    check('empty operand of "OR" ignored', query('host=swarm OR')[0] == query('host=swarm')[0])
+    for text in ('( host=swarm', 'host=swarm )', 'NOT', 'image~[beta'):
+        try:
+            parse_query(text.split())
+        except IMValueError:
+            check(f'invalid query "{text}" rejected', True)
+        else:
+            check(f'invalid query "{text}" rejected', False)
+
+    check('name conditions narrow down IOC projects loaded',
+          query('name=vac host=swarm') == (['ioc_vac'], ['ioc_vac', 'vac_gauge']))
+    check('nothing loaded by name conditions only', query('name=motor OR name=gauge')[1] == [])
+    print('OK')
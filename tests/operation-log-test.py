@@ -0,0 +1,118 @@
+#!/usr/bin/python3
+
+# Test of operation log, entries are written into a temporary manager directory and read back by filters.
+# Entries of 30 days of history are written, queries by time range are checked to give the same results as
+# reading the whole log, while starting from the offset found in time index. Operation log of old versions is
+# migrated, and rotated log files are checked to be read in order with their own time index.
+#
+# run "./tests/operation-log-test.py" to test.
+
+import os
+import sys
+import json
+import time
+import shutil
+import datetime
+import tempfile
+
+tests_dir = os.path.dirname(os.path.abspath(__file__))
+
+temp_dir = tempfile.mkdtemp(prefix='operation_log_test_')
+os.makedirs(os.path.join(temp_dir, 'imtools'))
+os.environ['MANAGER_PATH'] = temp_dir
+sys.path.insert(0, os.path.dirname(tests_dir))
+
+from imutils.IMConfig import (OPERATION_LOG_PATH, OPERATION_LOG_INDEX_PATH, OPERATION_LOG_TIME_FORMAT,  # noqa: E402
+                              OPERATION_LOG_LEGACY_PATH)
+from imutils import IMFunc  # noqa: E402
+from imutils.IMFunc import (OperationLogEntry, append_operation_log, read_operation_log,  # noqa: E402
+                            operation_log_files, time_bound)
+
+
+def make_history(days=30, per_hour=20, start=datetime.datetime(2024, 1, 1)):
+    entries = []
+    for i in range(days * 24 * per_hour):
+        begin = start + datetime.timedelta(seconds=i * 3600 // per_hour)
+        entry = {'start': begin.strftime(OPERATION_LOG_TIME_FORMAT),
+                 'end': (begin + datetime.timedelta(seconds=5)).strftime(OPERATION_LOG_TIME_FORMAT),
+                 'duration': 5.0, 'user': ['alice', 'bob'][i % 2], 'host': 'manager1', 'subcommand': 'exec',
+                 'command': f'IocManager.py exec ioc{i % 50} --gen-startup-file', 'iocs': [f'ioc{i % 50}'],
+                 'outcome': 'success', 'exit_code': 0}
+        append_operation_log(entry)
+        entries.append(entry)
+    return entries
+
+
+def index_valid():
+    for log_path, index_path in operation_log_files():
+        if not os.path.isfile(index_path):
+            continue
+        with open(log_path, 'rb') as log, open(index_path) as index:
+            for line in index:
+                log.seek(int(line.split()[1]) - 1)
+                if log.read(1) != b'\n':
+                    return False
+    return True
+
+
+def check(title, condition):
+    print(f'{title:<60} {"OK" if condition else "FAILED"}')
+    assert condition, title
+
+
+if __name__ == '__main__':
+    try:
+        with open(OPERATION_LOG_LEGACY_PATH, 'w') as f:
+            f.write('2023.12.30 10:00:00\talice@manager1\t./IocManager.py exec ioc1 --gen-startup-file\n\n'
+                    '2023.12.31 11:00:00\tbob@manager1\t./IocManager.py list host=swarm\n\n')
+        history = make_history()
+        res = list(read_operation_log(until='2023-12-31'))
+        check('operation log of old version migrated', [(item['start'], item['user'], item['subcommand'])
+                                                        for item in res] == [('2023-12-30 10:00:00', 'alice', 'exec'),
+                                                                             ('2023-12-31 11:00:00', 'bob', 'list')])
+        check('old operation log kept aside', not os.path.exists(OPERATION_LOG_LEGACY_PATH) and
+              os.path.exists(f'{OPERATION_LOG_LEGACY_PATH}.migrated'))
+        with open(OPERATION_LOG_INDEX_PATH) as f:
+            index = [line.split() for line in f]
+        check('time index is small and in order', 0 < len(index) < len(history) / 50 and
+              index == sorted(index, key=lambda item: (item[0], int(item[1]))))
+
+        queries = [{'since': '2024-01-20'}, {'since': '2024-01-29 23:30', 'user': 'bob'},
+                   {'since': '20240110', 'until': '20240110'}, {'ioc': 'ioc7', 'until': '2024-01-02 10'},
+                   {'since': '2024-02'}]
+        for query in queries:
+            since = time_bound(query['since']) if 'since' in query else '0'
+            until = time_bound(query['until'], end=True) if 'until' in query else '9'
+            expected = [item for item in history if since <= time_bound(item['start']) <= until and
+                        query.get('user', item['user']) == item['user'] and
+                        query.get('ioc', item['iocs'][0]) in item['iocs']]
+            check(f'query {query}', list(read_operation_log(**query)) == expected)
+
+        start = time.perf_counter()
+        res = list(read_operation_log(since='2024-01-30 23:00'))
+        elapsed = time.perf_counter() - start
+        check(f'last hour of {len(history)} entries read in {elapsed * 1000:.1f}ms', len(res) == 20)
+
+        operation = OperationLogEntry('IocManager.py exec alliocs --gen-startup-file', 'exec', ['alliocs', 'ioc1'])
+        operation.add_iocs(['ioc2', 'ioc1'])
+        operation.finish(1)
+        operation.finish(0)
+        res = list(read_operation_log(since='2024-02'))
+        check('entry of operation written once', len(res) == 1 and res[0]['outcome'] == 'failed')
+        check('IOC projects touched recorded', res[0]['iocs'] == ['ioc1', 'ioc2'])
+        with open(OPERATION_LOG_PATH) as f:
+            check('log file is JSON lines', all(json.loads(line) for line in f))
+
+        IMFunc.OPERATION_LOG_MAX_SIZE = 256 * 1024
+        later = make_history(days=3, start=datetime.datetime(2024, 3, 1))
+        res = list(read_operation_log(since='2024-03'))
+        check('log rotated and kept in bounded size', os.path.exists(f'{OPERATION_LOG_PATH}.1') and
+              os.path.getsize(OPERATION_LOG_PATH) <= 256 * 1024 and
+              os.path.getsize(f'{OPERATION_LOG_PATH}.1') <= 257 * 1024)
+        check('entries of rotated and current log read in order', len(res) > 800 and res == later[-len(res):])
+        check('offsets in time index valid after rotating', index_valid())
+        check('query on rotated log', list(read_operation_log(since=res[400]['start'], user='bob')) ==
+              [item for item in res if item['start'] >= res[400]['start'] and item['user'] == 'bob'])
+        print('OK')
+    finally:
+        shutil.rmtree(temp_dir)
@@ -0,0 +1,167 @@
+#!/usr/bin/python3
+
+# Test of swarm backup and restore against a fake swarm state directory, no docker daemon or root privilege needed.
+# "sudo", "systemctl", "tar" and "docker" are replaced by scripts in a temporary directory, which record the order
+# of commands executed, so that docker is checked to be stopped only while swarm state is copied or switched.
+#
+# run "./tests/swarm-backup-test.py" to test.
+
+import io
+import os
+import sys
+import gzip
+import shutil
+import tarfile
+import tempfile
+import contextlib
+
+tests_dir = os.path.dirname(os.path.abspath(__file__))
+
+temp_dir = tempfile.mkdtemp(prefix='swarm_backup_test_')
+manager_path = os.path.join(temp_dir, 'manager')
+bin_path = os.path.join(temp_dir, 'bin')
+log_path = os.path.join(temp_dir, 'commands.log')
+os.makedirs(os.path.join(manager_path, 'imtools'))
+os.environ['MANAGER_PATH'] = manager_path
+os.environ['MOUNT_PATH'] = os.path.join(temp_dir, 'ioc-for-docker')
+os.environ['SWARM_STATE_PATH'] = os.path.join(temp_dir, 'var', 'lib', 'docker', 'swarm')
+os.environ['SWARM_STAGING_PATH'] = os.path.join(temp_dir, 'var', 'lib', '.swarm-staging')
+os.environ['PATH'] = f'{bin_path}{os.pathsep}{os.environ["PATH"]}'
+sys.path.insert(0, os.path.dirname(tests_dir))
+
+from imutils.IMConfig import SWARM_STATE_PATH, SWARM_STAGING_PATH, SWARM_BACKUP_DIR  # noqa: E402
+from imutils.SwarmClass import SwarmManager  # noqa: E402
+
+
+def make_fake_commands():
+    os.makedirs(bin_path)
+    real_tar = shutil.which('tar')
+    scripts = {
+        'sudo': '#!/bin/sh\nexec "$@"\n',
+        'systemctl': f'#!/bin/sh\necho "systemctl $1" >> {log_path}\n',
+        'tar': f'#!/bin/sh\necho "tar" >> {log_path}\nexec {real_tar} "$@"\n',
+        'docker': f'#!/bin/sh\necho "docker $2" >> {log_path}\n',
+    }
+    for name, content in scripts.items():
+        with open(os.path.join(bin_path, name), 'w') as f:
+            f.write(content)
+        os.chmod(os.path.join(bin_path, name), 0o755)
+
+
+def make_swarm_state():
+    for sub_dir in ('certificates', 'raft/snap-v3-encrypted', 'raft/wal-v3-encrypted'):
+        os.makedirs(os.path.join(SWARM_STATE_PATH, sub_dir))
+    files = {'state.json': '[{"node_id":"abc","addr":"192.168.1.10:2377"}]', 'docker-state.json': '{}',
+             'certificates/swarm-node.crt': 'CERT', 'raft/wal-v3-encrypted/0000000000000000-0000000000000000.wal':
+             'WAL' * 1000}
+    for rel_path, content in files.items():
+        with open(os.path.join(SWARM_STATE_PATH, rel_path), 'w') as f:
+            f.write(content)
+    return files
+
+
+def output_of(func, *args, answer='y', **kwargs):
+    with io.StringIO() as buf, contextlib.redirect_stdout(buf), \
+            contextlib.redirect_stderr(buf), io.StringIO(f'{answer}\n') as stdin:
+        sys.stdin = stdin
+        try:
+            func(*args, **kwargs)
+        finally:
+            sys.stdin = sys.__stdin__
+        return buf.getvalue()
+
+
+def read_commands():
+    if not os.path.exists(log_path):
+        return []
+    with open(log_path) as f:
+        commands = f.read().split()
+    os.remove(log_path)
+    return commands
+
+
+def make_archive(file_path, members):
+    with gzip.open(file_path, 'wb') as f, tarfile.open(fileobj=f, mode='w|') as tar:
+        for name, content in members.items():
+            info = tarfile.TarInfo(name)
+            if content is None:
+                info.type = tarfile.DIRTYPE
+                tar.addfile(info)
+            else:
+                info.size = len(content)
+                tar.addfile(info, io.BytesIO(content.encode()))
+
+
+def check(title, condition):
+    print(f'{title:<60} {"OK" if condition else "FAILED"}')
+    assert condition, title
+
+
+if __name__ == '__main__':
+    try:
+        make_fake_commands()
+        state_files = make_swarm_state()
+
+        out = output_of(SwarmManager.backup_swarm)
+        backup_path = os.path.join(temp_dir, SWARM_BACKUP_DIR)
+        archives = [item for item in os.listdir(backup_path) if item.endswith('.swarm.tar.gz')]
+        check('backup file created in backup directory', len(archives) == 1)
+        check('docker started before compressing',
+              read_commands() == ['systemctl', 'stop', 'systemctl', 'start', 'tar'])
+        check('downtime reported', 'backup_swarm: Docker stopped for ' in out and 'backup_swarm: Finished.' in out)
+        with tarfile.open(os.path.join(backup_path, archives[0])) as tar:
+            names = tar.getnames()
+            member_path = SWARM_STATE_PATH.strip('/')
+            check('archive keeps absolute layout of swarm state', all(name.startswith(member_path) for name in names))
+            check('all files of swarm state in archive', all(
+                tar.extractfile(f'{member_path}/{rel_path}').read().decode() == content
+                for rel_path, content in state_files.items()))
+        check('staging directory removed', not os.listdir(SWARM_STAGING_PATH))
+
+        read_commands()
+        os.rename(SWARM_STATE_PATH, f'{SWARM_STATE_PATH}.lost')
+        out = output_of(SwarmManager.backup_swarm)
+        check('docker started again when copying failed',
+              read_commands() == ['systemctl', 'stop', 'systemctl', 'start'])
+        check('failure of copying reported', 'backup_swarm: Failed. Failed to copy swarm state' in out)
+        os.rename(f'{SWARM_STATE_PATH}.lost', SWARM_STATE_PATH)
+
+        # swarm state changed after backup is replaced by the one in backup file.
+        with open(os.path.join(SWARM_STATE_PATH, 'state.json'), 'w') as f:
+            f.write('[]')
+        archive_path = os.path.join(backup_path, archives[0])
+        out = output_of(SwarmManager.restore_swarm, archive_path)
+        check('docker stopped only for switching swarm state',
+              read_commands() == ['tar', 'systemctl', 'stop', 'systemctl', 'start', 'docker', 'init'])
+        check('downtime of restoring reported', 'restore_swarm: Docker stopped for ' in out and
+              'Restoring finished.' in out)
+        with open(os.path.join(SWARM_STATE_PATH, 'state.json')) as f:
+            check('swarm state restored', f.read() == state_files['state.json'])
+        check('swarm state replaced instead of nested', not os.path.exists(
+            os.path.join(SWARM_STATE_PATH, os.path.basename(SWARM_STATE_PATH))))
+        check('staging directory removed after restoring', not os.listdir(SWARM_STAGING_PATH))
+
+        out = output_of(SwarmManager.restore_swarm, archive_path, answer='n')
+        check('nothing stopped if not confirmed', read_commands() == ['tar'] and 'Operation exit.' in out)
+
+        member_path = SWARM_STATE_PATH.strip('/')
+        invalid_archives = {
+            'member out of swarm state': {f'{member_path}/state.json': '[]', 'etc/passwd': 'root'},
+            'unsafe member': {f'{member_path}/../../../../etc/passwd': 'root'},
+            'swarm state incomplete': {f'{member_path}': None, f'{member_path}/state.json': '[]'},
+        }
+        for title, members in invalid_archives.items():
+            invalid_path = os.path.join(temp_dir, 'invalid.swarm.tar.gz')
+            make_archive(invalid_path, members)
+            out = output_of(SwarmManager.restore_swarm, invalid_path)
+            check(f'{title} rejected before extracting', read_commands() == [] and 'not a valid swarm backup' in out)
+        with open(invalid_path, 'wb') as f, open(archive_path, 'rb') as archive:
+            f.write(archive.read()[:-100])
+        out = output_of(SwarmManager.restore_swarm, invalid_path)
+        check('truncated backup file rejected before extracting', read_commands() == [] and
+              'not a valid swarm backup' in out)
+        with open(os.path.join(SWARM_STATE_PATH, 'state.json')) as f:
+            check('swarm state not touched by invalid backup files', f.read() == state_files['state.json'])
+        print('OK')
+    finally:
+        shutil.rmtree(temp_dir)